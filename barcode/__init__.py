@@ -0,0 +1 @@
+"""Slot barcode labels: Code 128 encoding, label sheets and the barcode_gen command line tool."""
@@ -1,24 +1,57 @@
+"""Generate slot barcodes, or printable sheets of their labels, for racks of slots.
 
+    python -m barcode.barcode_gen G 20 4 16                        # barcodes.txt, one barcode per line
+    python -m barcode.barcode_gen G 20 4 16 --pdf labels.pdf       # label sheets as one PDF
+    python -m barcode.barcode_gen G 20 4 16 --svg labels-%03d.svg  # label sheets, one SVG per page
+    python -m barcode.barcode_gen G 20 4 16 --first-rack 21 -f new_racks.txt
+
+Barcodes come from golden_trays.barcodes, the codec the app uses, so the labels match the slots the app creates.
+Labels for the slots already in the database are printed with the slot_labels management command.
+"""
 import argparse
+import os
+import sys
 
+if __package__ in (None, ""):
+    # Run as a script: make the repository importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-if __name__ == "__main__":
-    parser  = argparse.ArgumentParser()
-    parser.add_argument('prefix')
-    parser.add_argument('racks')
-    parser.add_argument('rows')
-    parser.add_argument('trays')
-    parser.add_argument('-f', '--file_name')
+from barcode.labels import write_pdf, write_svg_pages
+from golden_trays.barcodes import iter_barcodes
+
+
+def write_barcodes(barcodes, file):
+    """Write one barcode per line to file and return how many were written."""
+    count = 0
+    for barcode in barcodes:
+        file.write(barcode + "\n")
+        count += 1
+    return count
 
-    args = parser.parse_args()
 
-    if args.file_name is not None:
-        filename = args.file_name
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate slot barcodes or label sheets for racks of slots.")
+    parser.add_argument('prefix', help="Phase letter, e.g. G")
+    parser.add_argument('racks', type=int)
+    parser.add_argument('rows', type=int)
+    parser.add_argument('trays', type=int, help="Slots per row")
+    parser.add_argument('--first-rack', type=int, default=1)
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument('-f', '--file_name', default='barcodes.txt', help="Text file of barcodes (the default)")
+    output.add_argument('--pdf', help="PDF file of label sheets")
+    output.add_argument('--svg', help="SVG file name pattern for label sheets, e.g. labels-%%03d.svg")
+    args = parser.parse_args(argv)
+
+    barcodes = iter_barcodes(args.prefix, args.racks, args.rows, args.trays, args.first_rack)
+    if args.pdf:
+        with open(args.pdf, 'wb') as file:
+            print("Wrote %d bytes to %s" % (write_pdf(barcodes, file), args.pdf))
+    elif args.svg:
+        print("Wrote %d pages" % len(write_svg_pages(barcodes, args.svg)))
     else:
-        filename = 'barcodes.txt'
+        with open(args.file_name, 'w+') as file:
+            print("Wrote %d barcodes to %s" % (write_barcodes(barcodes, file), args.file_name))
+
 
-    with open(filename, 'w+') as f:
-        for r in range(1,int(args.racks) + 1):
-            for s in range(1,int(args.rows) + 1):
-                for t in range(1,int(args.trays) + 1):
-                    f.write(args.prefix + str(r).zfill(3) + str(s).zfill(2) + str(t).zfill(2) + "\n")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Code 128 symbol encoding.
+
+Text is encoded in code set B, switching to code set C (two digits per symbol) for runs of four or more digits, which
+is what most slot barcodes are. The result is the list of bar and space widths in modules, starting with a bar.
+"""
+
+# Widths of the bars and spaces of each symbol value, bar first
+PATTERNS = (
+    "212222", "222122", "222221", "121223", "121322", "131222", "122213", "122312", "132212", "221213",
+    "221312", "231212", "112232", "122132", "122231", "113222", "123122", "123221", "223211", "221132",
+    "221231", "213212", "223112", "312131", "311222", "321122", "321221", "312212", "322112", "322211",
+    "212123", "212321", "232121", "111323", "131123", "131321", "112313", "132113", "132311", "211313",
+    "231113", "231311", "112133", "112331", "132131", "113123", "113321", "133121", "313121", "211331",
+    "231131", "213113", "213311", "213131", "311123", "311321", "331121", "312113", "312311", "332111",
+    "314111", "221411", "431111", "111224", "111422", "121124", "121421", "141122", "141221", "112214",
+    "112412", "122114", "122411", "142112", "142211", "241211", "221114", "413111", "241112", "134111",
+    "111242", "121142", "121241", "114212", "124112", "124211", "411212", "421112", "421211", "212141",
+    "214121", "412121", "111143", "111341", "131141", "114113", "114311", "411113", "411311", "113141",
+    "114131", "311141", "411131", "211412", "211214", "211232", "2331112",
+)
+CODE_C = 99
+CODE_B = 100
+START_B = 104
+START_C = 105
+STOP = 106
+# Shortest run of digits worth switching to code set C for
+MIN_DIGIT_RUN = 4
+QUIET_ZONE = 10  # Modules of space needed on either side
+
+
+def digit_run(text, start):
+    """Return the number of consecutive ASCII digits in text from start."""
+    end = start
+    while end < len(text) and text[end] in "0123456789":
+        end += 1
+    return end - start
+
+
+def symbols(text):
+    """Return the symbol values of text, from the start symbol to the check symbol (without the stop symbol)."""
+    if not text or any(not 32 <= ord(char) < 127 for char in text):
+        raise ValueError("Code 128 labels hold printable ASCII text, not %r" % (text,))
+    values = []
+    code_set = None
+
+    def use(new_set):
+        nonlocal code_set
+        if code_set != new_set:
+            if code_set is None:
+                values.append(START_C if new_set == 'C' else START_B)
+            else:
+                values.append(CODE_C if new_set == 'C' else CODE_B)
+            code_set = new_set
+
+    i = 0
+    while i < len(text):
+        run = digit_run(text, i)
+        if run >= MIN_DIGIT_RUN:
+            if run % 2:
+                # Code set C takes digits in pairs, so an odd run starts with a digit in code set B
+                use('B')
+                values.append(ord(text[i]) - 32)
+                i += 1
+                run -= 1
+            use('C')
+            values.extend(int(text[pair:pair + 2]) for pair in range(i, i + run, 2))
+            i += run
+        else:
+            use('B')
+            values.append(ord(text[i]) - 32)
+            i += 1
+    values.append((values[0] + sum(position * value for position, value in enumerate(values[1:], 1))) % 103)
+    return values
+
+
+def widths(text):
+    """Return the widths in modules of the bars and spaces of the Code 128 symbol of text, bar first, stop included."""
+    return [int(width) for value in symbols(text) + [STOP] for width in PATTERNS[value]]
+
+
+def bars(text):
+    """Return the (offset, width) in modules of each bar of the Code 128 symbol of text."""
+    result = []
+    offset = 0
+    for index, width in enumerate(widths(text)):
+        if index % 2 == 0:
+            result.append((offset, width))
+        offset += width
+    return result
+
+
+def module_count(text):
+    """Return the width in modules of the symbol of text, without quiet zones."""
+    return sum(widths(text))
@@ -0,0 +1,159 @@
+"""Printable sheets of Code 128 slot labels, as SVG or PDF pages.
+
+Barcodes are read lazily, one page's worth at a time, and each page is rendered and handed on before the next one is
+read, so printing every slot in the greenhouse takes the memory of a single page. The PDF is written front to back:
+pages go out as they're rendered and the page tree and cross-reference table, which only hold a few numbers per
+page, come last.
+"""
+from array import array
+from collections import namedtuple
+from itertools import islice
+from xml.sax.saxutils import escape
+import zlib
+from barcode import code128
+
+# A sheet of equally sized labels, measured in points from the top left corner
+LabelSheet = namedtuple('LabelSheet', ['width', 'height', 'columns', 'rows', 'left', 'top', 'label_width',
+                                       'label_height', 'column_pitch', 'row_pitch'])
+
+# Letter paper with 3 x 10 labels of 2 5/8" x 1" (Avery 5160 and compatibles)
+LETTER_30 = LabelSheet(width=612, height=792, columns=3, rows=10, left=13.5, top=36, label_width=189,
+                       label_height=72, column_pitch=198, row_pitch=72)
+
+FONT_SIZE = 9
+# Height of the bars as a share of the label's height, the rest is for the text
+BAR_HEIGHT = 0.6
+MAX_MODULE_WIDTH = 1.5
+
+
+def labels_per_page(sheet):
+    return sheet.columns * sheet.rows
+
+
+def iter_pages(barcodes, sheet=LETTER_30):
+    """Yield the barcodes in lists of one page's worth, reading them only as each page is needed."""
+    barcodes = iter(barcodes)
+    while True:
+        page = list(islice(barcodes, labels_per_page(sheet)))
+        if not page:
+            return
+        yield page
+
+
+def label_layout(barcode, sheet, index):
+    """Return where the index-th label of a page is and how to draw barcode on it: (x, y, [(x, width) of each bar],
+    bar top, bar height, text baseline), all in points from the sheet's top left."""
+    column, row = index % sheet.columns, index // sheet.columns
+    x = sheet.left + column * sheet.column_pitch
+    y = sheet.top + row * sheet.row_pitch
+    modules = code128.module_count(barcode) + 2 * code128.QUIET_ZONE
+    module = min(sheet.label_width / modules, MAX_MODULE_WIDTH)
+    # Centre the symbol, quiet zones included, on the label
+    start = x + (sheet.label_width - modules * module) / 2 + code128.QUIET_ZONE * module
+    bars = [(start + offset * module, width * module) for offset, width in code128.bars(barcode)]
+    bar_height = sheet.label_height * BAR_HEIGHT
+    bar_top = y + (sheet.label_height - bar_height - FONT_SIZE * 1.5) / 2
+    return x, y, bars, bar_top, bar_height, bar_top + bar_height + FONT_SIZE * 1.2
+
+
+def svg_page(barcodes, sheet=LETTER_30):
+    """Return one page of labels as an SVG document."""
+    parts = ['<svg xmlns="http://www.w3.org/2000/svg" width="%gpt" height="%gpt" viewBox="0 0 %g %g">'
+             % (sheet.width, sheet.height, sheet.width, sheet.height),
+             '<rect width="100%" height="100%" fill="white"/>']
+    for index, barcode in enumerate(barcodes):
+        x, y, bars, bar_top, bar_height, baseline = label_layout(barcode, sheet, index)
+        path = "".join("M%.2f %.2fh%.2fv%.2fh-%.2fz" % (bar_x, bar_top, width, bar_height, width)
+                       for bar_x, width in bars)
+        parts.append('<path d="%s"/>' % path)
+        parts.append('<text x="%.2f" y="%.2f" font-family="Helvetica, Arial, sans-serif" font-size="%d" '
+                     'text-anchor="middle">%s</text>' % (x + sheet.label_width / 2, baseline, FONT_SIZE,
+                                                         escape(barcode)))
+    parts.append('</svg>\n')
+    return "\n".join(parts)
+
+
+def iter_svg_pages(barcodes, sheet=LETTER_30):
+    """Yield each page of labels as an SVG document."""
+    for page in iter_pages(barcodes, sheet):
+        yield svg_page(page, sheet)
+
+
+def pdf_string(text):
+    return "(" + text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+
+def pdf_page_content(barcodes, sheet=LETTER_30):
+    """Return the content stream drawing one page of labels. PDF measures from the bottom left, so y is flipped."""
+    commands = []
+    for index, barcode in enumerate(barcodes):
+        x, y, bars, bar_top, bar_height, baseline = label_layout(barcode, sheet, index)
+        bottom = sheet.height - bar_top - bar_height
+        commands.extend("%.2f %.2f %.2f %.2f re" % (bar_x, bottom, width, bar_height) for bar_x, width in bars)
+        commands.append("f")
+        text_width = len(barcode) * FONT_SIZE * 0.6  # Close enough to centre Helvetica digits and capitals
+        commands.append("BT /F1 %d Tf %.2f %.2f Td %s Tj ET" % (
+            FONT_SIZE, x + (sheet.label_width - text_width) / 2, sheet.height - baseline, pdf_string(barcode)))
+    return "\n".join(commands).encode('ascii')
+
+
+def iter_pdf(barcodes, sheet=LETTER_30):
+    """Yield a PDF document of labels in chunks of bytes, a page at a time."""
+    # Byte offset of each object, by object number - 1, for the cross-reference table
+    offsets = array('Q', [0, 0, 0])
+    position = 0
+
+    def emit(number, body):
+        nonlocal position
+        if number <= len(offsets):
+            offsets[number - 1] = position
+        else:
+            offsets.append(position)  # Pages are numbered in the order they're written
+        chunk = b"%d 0 obj\n" % number + body + b"\nendobj\n"
+        position += len(chunk)
+        return chunk
+
+    header = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+    position = len(header)
+    yield header
+    # 1 is the catalog, 2 the page tree (written last, once every page is known) and 3 the font. Each page is then
+    # a page object and its content stream, so the pages are objects 4, 6, 8...
+    yield emit(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+    yield emit(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    number = 4
+    for page in iter_pages(barcodes, sheet):
+        content = zlib.compress(pdf_page_content(page, sheet))
+        page_object = (b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources << /Font << /F1 3 0 R >> >> "
+                       b"/Contents %d 0 R >>" % (sheet.width, sheet.height, number + 1))
+        chunk = emit(number, page_object)
+        chunk += emit(number + 1, b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(content) + content
+                      + b"\nendstream")
+        number += 2
+        yield chunk
+    kids = b" ".join(b"%d 0 R" % page for page in range(4, number, 2))
+    yield emit(2, b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % ((number - 4) // 2))
+
+    yield b"xref\n0 %d\n0000000000 65535 f \n" % number
+    yield b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    yield b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (number, position)
+
+
+def write_pdf(barcodes, file, sheet=LETTER_30):
+    """Write a PDF of labels to the binary file file and return its number of bytes."""
+    size = 0
+    for chunk in iter_pdf(barcodes, sheet):
+        file.write(chunk)
+        size += len(chunk)
+    return size
+
+
+def write_svg_pages(barcodes, path_pattern, sheet=LETTER_30):
+    """Write each page of labels to its own SVG file, named path_pattern % page number (from 1), and return the
+    paths written."""
+    paths = []
+    for number, page in enumerate(iter_svg_pages(barcodes, sheet), 1):
+        path = path_pattern % number
+        with open(path, 'w') as file:
+            file.write(page)
+        paths.append(path)
+    return paths
@@ -0,0 +1 @@
+default_app_config = 'golden_trays.apps.GoldenTraysConfig'
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class GoldenTraysConfig(AppConfig):
     name = 'golden_trays'
+
+    def ready(self):
+        import golden_trays.signals  # noqa: F401 (connects the signal receivers)
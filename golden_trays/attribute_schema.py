@@ -0,0 +1,39 @@
+"""The crop attributes and their options, as the crop forms need them.
+
+NewCropForm and EditCropForm have a select for every CropAttribute. The list of attributes and options is built with
+one query and cached until an attribute or option is added, changed or deleted (from the attribute pages or the
+admin, see golden_trays.signals), so building either form doesn't query them at all.
+"""
+from django.core.cache import cache
+from golden_trays.models import CropAttribute
+from grow_app.caching import invalidate, versioned_key
+
+ATTRIBUTE_SCHEMA_NAMESPACE = 'crop-attributes'
+
+
+def invalidate_attribute_schema():
+    invalidate(ATTRIBUTE_SCHEMA_NAMESPACE)
+
+
+def build_attribute_schema():
+    """Return [(attribute name, ((option name, option name), ...)), ...] for every attribute, in creation order."""
+    rows = CropAttribute.objects.order_by('id', 'options__id').values_list('id', 'name', 'options__name')
+    schema = []
+    last_id = None
+    for attribute_id, name, option in rows:
+        if attribute_id != last_id:
+            schema.append((name, []))
+            last_id = attribute_id
+        if option is not None:
+            schema[-1][1].append((option, option))
+    return [(name, tuple(choices)) for name, choices in schema]
+
+
+def attribute_schema():
+    """Return build_attribute_schema(), cached until the attributes or their options change."""
+    key = versioned_key(ATTRIBUTE_SCHEMA_NAMESPACE, 'schema')
+    schema = cache.get(key)
+    if schema is None:
+        schema = build_attribute_schema()
+        cache.set(key, schema)
+    return schema
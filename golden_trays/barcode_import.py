@@ -0,0 +1,96 @@
+"""Assigning barcodes to many slots at once, from a barcodes.txt file or pasted text.
+
+Each line is either a slot id and its barcode (separated by a comma, tab or spaces), or just a barcode, in which case
+the barcodes go to the slots in id order, like the list on the page. Every barcode is checked against the others in
+the import and against the database with a single query, and only slots whose barcode actually changes are written,
+with one bulk UPDATE.
+"""
+from collections import Counter
+from django.db import transaction
+from django.db.models import Q
+from golden_trays.barcodes import MAX_LENGTH, InvalidBarcode, validate_scan
+from golden_trays.models import Slot
+from golden_trays.rack_map import invalidate_rack_map
+from golden_trays.slot_lookup import invalidate_slot_barcodes
+
+BATCH_SIZE = 500
+
+
+class BarcodeImportError(ValueError):
+    """Raised with every problem found in an import; nothing is written."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("; ".join(errors))
+
+
+def parse_assignments(text, slot_ids):
+    """Return {slot id: barcode} from the lines of text, giving bare barcodes to slot_ids in order."""
+    lines = [line.replace(",", " ").split() for line in text.splitlines()]
+    lines = [fields for fields in lines if fields]
+    errors = ["Line %d: the barcode is longer than %d characters." % (number, MAX_LENGTH)
+              for number, fields in enumerate(lines, 1) if len(fields[-1]) > MAX_LENGTH]
+    if all(len(fields) == 1 for fields in lines):
+        if len(lines) > len(slot_ids):
+            errors.append("There are %d barcodes but only %d slots." % (len(lines), len(slot_ids)))
+        if errors:
+            raise BarcodeImportError(errors)
+        return {slot_id: fields[0] for slot_id, fields in zip(slot_ids, lines)}
+    assignments = {}
+    for number, fields in enumerate(lines, 1):
+        if len(fields) != 2 or not fields[0].isdigit():
+            errors.append("Line %d should be a slot id and a barcode, or every line just a barcode." % number)
+        elif int(fields[0]) in assignments:
+            errors.append("Line %d: slot %s is listed twice." % (number, fields[0]))
+        else:
+            assignments[int(fields[0])] = fields[1]
+    if errors:
+        raise BarcodeImportError(errors)
+    return assignments
+
+
+def assign_barcodes(assignments):
+    """Give each slot id in assignments its barcode and return the slots that changed. Raises BarcodeImportError if a
+    slot doesn't exist or a barcode is too long, couldn't be scanned (see validate_scan), is repeated or belongs to a
+    slot that keeps it."""
+    repeated = [barcode for barcode, count in Counter(assignments.values()).items() if count > 1]
+    errors = ["Barcode %s is given to more than one slot." % barcode for barcode in sorted(repeated)]
+    for slot_id, barcode in assignments.items():
+        if not barcode:
+            errors.append("Slot %d needs a barcode." % slot_id)
+        elif len(barcode) > MAX_LENGTH:
+            errors.append("Slot %d: the barcode is longer than %d characters." % (slot_id, MAX_LENGTH))
+        else:
+            try:
+                validate_scan(barcode)
+            except InvalidBarcode as error:
+                errors.append("Slot %d: %s" % (slot_id, error))
+    if errors:
+        raise BarcodeImportError(errors)
+    with transaction.atomic():
+        # The slots being relabelled and the slots that hold any of the new barcodes, in one query
+        slots = {slot.id: slot for slot in Slot.objects.select_for_update()
+                 .filter(Q(id__in=list(assignments)) | Q(barcode__in=list(assignments.values())))}
+        wanted = set(assignments.values())
+        errors = ["There is no slot %d." % slot_id for slot_id in sorted(assignments) if slot_id not in slots]
+        errors += ["Barcode %s already belongs to slot %d." % (slot.barcode, slot.id) for slot in slots.values()
+                   if slot.id not in assignments and slot.barcode in wanted]
+        if errors:
+            raise BarcodeImportError(errors)
+        changed = [slots[slot_id] for slot_id, barcode in assignments.items() if slots[slot_id].barcode != barcode]
+        # A slot taking a barcode another relabelled slot still has would break the unique index half way through
+        # the UPDATE, so the slots giving up a wanted barcode get a placeholder (unique, as it holds the id) first
+        releasing = [slot for slot in changed if slot.barcode in wanted]
+        if releasing:
+            for slot in releasing:
+                slot.barcode = "~%d" % slot.id
+            Slot.objects.bulk_update(releasing, ['barcode'], batch_size=BATCH_SIZE)
+        for slot in changed:
+            slot.barcode = assignments[slot.id]
+            slot.set_location()
+        Slot.objects.bulk_update(changed, ['barcode', 'rack', 'row', 'position'], batch_size=BATCH_SIZE)
+        if changed:
+            # bulk_update doesn't send the signals that keep these caches up to date
+            invalidate_rack_map()
+            invalidate_slot_barcodes()
+    return changed
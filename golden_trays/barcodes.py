@@ -0,0 +1,86 @@
+"""Slot barcode format.
+
+A slot barcode is the phase letter followed by the zero padded rack (3 digits), row (2 digits) and position in the
+row (2 digits) and a check digit, e.g. G00102038 for rack 1, row 2, position 3 in grow. The check digit is the Luhn
+digit of the seven location digits, so a misread digit or two swapped neighbours make the barcode invalid instead of
+the address of another slot.
+
+Older labels have no check digit (G0010203), or have the slot id appended instead (G001020315, always at least two
+digits, so never the length of a barcode with a check digit); both still decode.
+
+This module doesn't import Django, so it can be used by scripts that generate barcodes outside of the app.
+"""
+from collections import namedtuple
+
+PHASES = ('G',)
+RACK_DIGITS = 3
+ROW_DIGITS = 2
+POSITION_DIGITS = 2
+# Length of a barcode without a check digit
+LENGTH = 1 + RACK_DIGITS + ROW_DIGITS + POSITION_DIGITS
+CHECKED_LENGTH = LENGTH + 1
+# Longest barcode a slot can have (Slot.barcode's max_length)
+MAX_LENGTH = 50
+
+SlotAddress = namedtuple('SlotAddress', ['phase', 'rack', 'row', 'position'])
+
+
+class InvalidBarcode(ValueError):
+    """Raised when text isn't a slot barcode."""
+
+
+def check_digit(digits):
+    """Return the Luhn check digit of a string of digits."""
+    total = 0
+    for index, digit in enumerate(reversed(digits)):
+        value = int(digit) * (2 if index % 2 == 0 else 1)
+        total += value - 9 if value > 9 else value
+    return str(-total % 10)
+
+
+def encode(phase, rack, row, position):
+    """Return the barcode of the slot at rack, row and position in phase."""
+    if phase not in PHASES:
+        raise InvalidBarcode("Unknown phase: %r" % (phase,))
+    for value, digits in ((rack, RACK_DIGITS), (row, ROW_DIGITS), (position, POSITION_DIGITS)):
+        if not 0 < value < 10 ** digits:
+            raise InvalidBarcode("%d doesn't fit in %d digits" % (value, digits))
+    digits = str(rack).zfill(RACK_DIGITS) + str(row).zfill(ROW_DIGITS) + str(position).zfill(POSITION_DIGITS)
+    return phase + digits + check_digit(digits)
+
+
+def looks_like_slot_barcode(text):
+    """Return whether text has the form of a slot barcode: a phase letter followed by ASCII digits."""
+    return len(text) > 1 and text[0] in PHASES and text[1:].isdigit() and text.isascii()
+
+
+def decode(barcode):
+    """Return the SlotAddress a barcode encodes. Raises InvalidBarcode if it isn't a slot barcode or its check digit
+    is wrong."""
+    if len(barcode) < LENGTH or not looks_like_slot_barcode(barcode):
+        raise InvalidBarcode("Not a slot barcode: %r" % (barcode,))
+    if len(barcode) == CHECKED_LENGTH and barcode[-1] != check_digit(barcode[1:LENGTH]):
+        raise InvalidBarcode("Wrong check digit: %r" % (barcode,))
+    row_start = 1 + RACK_DIGITS
+    position_start = row_start + ROW_DIGITS
+    return SlotAddress(barcode[0], int(barcode[1:row_start]), int(barcode[row_start:position_start]),
+                       int(barcode[position_start:LENGTH]))
+
+
+def validate_scan(text):
+    """Raise InvalidBarcode if text can't be the barcode of any slot: it's empty, too long, holds whitespace or
+    non-printable characters, or has the form of a slot barcode but doesn't decode (a misread check digit, a
+    truncated scan). Text of any other form may still be a barcode given to a slot by hand, so it passes."""
+    if not 0 < len(text) <= MAX_LENGTH or not text.isascii() or not text.isprintable() or " " in text:
+        raise InvalidBarcode("Not a barcode: %r" % (text,))
+    if looks_like_slot_barcode(text):
+        decode(text)
+
+
+def iter_barcodes(phase, racks, rows, positions, first_rack=1):
+    """Yield the barcodes of every slot of racks racks, from first_rack on, each of rows rows of positions slots, in
+    rack, row and position order."""
+    for rack in range(first_rack, first_rack + racks):
+        for row in range(1, rows + 1):
+            for position in range(1, positions + 1):
+                yield encode(phase, rack, row, position)
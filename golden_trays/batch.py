@@ -0,0 +1,109 @@
+"""Scan actions applied to many slots at once.
+
+The operator scans a whole rack in batch mode and the action is applied to every scanned slot in one transaction:
+one query to lock and load the slots, one bulk insert of CropRecords and, for trash and harvest, one UPDATE of the
+crops and one of the slots, however many slots were scanned. Scans queued by a tablet that was offline are applied
+the same way, in the order they were scanned.
+"""
+from collections import namedtuple
+from datetime import date
+from django.db import transaction
+from django.db.models import TextField, Value
+from django.db.models.functions import Coalesce, Concat
+from golden_trays.barcodes import InvalidBarcode, validate_scan
+from golden_trays.models import Crop, CropRecord, Slot
+from golden_trays.rack_map import invalidate_racks
+
+# The record type each batch action writes, in the order they're offered
+BATCH_ACTIONS = ('WATER', 'TRASH', 'HARVEST')
+# Actions that take the crop out of its slot
+REMOVAL_ACTIONS = ('TRASH', 'HARVEST')
+
+# A scan action on the crop in the slot labelled barcode, recorded on date
+Scan = namedtuple('Scan', ['barcode', 'action', 'date', 'reason'])
+Scan.__new__.__defaults__ = ("",)
+
+# Outcomes of a scan
+APPLIED = 'applied'
+EMPTY = 'empty'
+UNKNOWN = 'unknown'
+
+ScanOutcome = namedtuple('ScanOutcome', ['outcome', 'slot', 'crop_id'])
+
+BatchResult = namedtuple('BatchResult', ['action', 'slots', 'empty', 'unknown'])
+BatchResult.__doc__ = """The outcome of a batch action: the slots it was applied to (with their crops, as they were
+before the action), and the scanned barcodes of empty slots and of no slot at all, which were skipped."""
+
+
+def split_barcodes(text):
+    """Return the barcodes in text (one per line or separated by spaces), in scan order without repeats."""
+    return list(dict.fromkeys(text.split()))
+
+
+def scannable(barcodes):
+    """Return the barcodes that could belong to a slot, leaving out misread scans."""
+    valid = []
+    for barcode in barcodes:
+        try:
+            validate_scan(barcode)
+            valid.append(barcode)
+        except InvalidBarcode:
+            pass
+    return valid
+
+
+def apply_scans(scans):
+    """Apply each Scan in order to the crop in its slot, emptying the slot after a TRASH or HARVEST (so a later scan
+    of the slot finds it empty), and return a ScanOutcome per scan. Misread barcodes are UNKNOWN without being
+    looked up. A TRASH scan's reason is appended to the crop's notes as the single slot action does."""
+    with transaction.atomic():
+        slots = (Slot.objects.select_for_update(of=('self',)).select_related('current_crop__variety')
+                 .filter(barcode__in=scannable({scan.barcode for scan in scans})))
+        by_barcode = {slot.barcode: slot for slot in slots}
+        crop_in_slot = {slot.id: slot.current_crop_id for slot in by_barcode.values()}
+        outcomes, records, trash_reasons, harvested, emptied = [], [], {}, [], []
+        for scan in scans:
+            if scan.action not in BATCH_ACTIONS:
+                raise ValueError("Unknown batch action: %r" % (scan.action,))
+            slot = by_barcode.get(scan.barcode)
+            if slot is None:
+                outcomes.append(ScanOutcome(UNKNOWN, None, None))
+                continue
+            crop_id = crop_in_slot[slot.id]
+            if crop_id is None:
+                outcomes.append(ScanOutcome(EMPTY, slot, None))
+                continue
+            records.append(CropRecord(crop_id=crop_id, record_type=scan.action, date=scan.date))
+            if scan.action in REMOVAL_ACTIONS:
+                crop_in_slot[slot.id] = None
+                emptied.append(slot)
+                if scan.action == 'TRASH':
+                    trash_reasons.setdefault(scan.reason, []).append(crop_id)
+                else:
+                    harvested.append(crop_id)
+            outcomes.append(ScanOutcome(APPLIED, slot, crop_id))
+
+        CropRecord.objects.bulk_create(records)
+        for reason, crop_ids in trash_reasons.items():
+            Crop.objects.filter(id__in=crop_ids).update(
+                notes=Concat(Coalesce('notes', Value("")), Value(" TRASHED: " + reason), output_field=TextField()))
+        if harvested:
+            # bulk_create skips CropRecord.save, which keeps the lifecycle dates up to date
+            Crop.objects.filter(id__in=harvested).update(harvest_date=Crop.lifecycle_dates()['harvest_date'])
+        if emptied:
+            Slot.objects.filter(id__in=[slot.id for slot in emptied]).update(current_crop=None)
+            # Neither update sends signals, so the rack map has to be told
+            invalidate_racks(*[slot.barcode for slot in emptied])
+    return outcomes
+
+
+def apply_batch_action(action, barcodes, reason="", today=None):
+    """Record action on the crop in each slot in barcodes and, for TRASH and HARVEST, empty the slots. Returns a
+    BatchResult."""
+    barcodes = list(dict.fromkeys(barcodes))
+    today = today or date.today()
+    outcomes = apply_scans([Scan(barcode, action, today, reason) for barcode in barcodes])
+    return BatchResult(action,
+                       [outcome.slot for outcome in outcomes if outcome.outcome == APPLIED],
+                       [barcode for barcode, outcome in zip(barcodes, outcomes) if outcome.outcome == EMPTY],
+                       [barcode for barcode, outcome in zip(barcodes, outcomes) if outcome.outcome == UNKNOWN])
@@ -1,3 +1,5 @@
+from golden_trays.attribute_schema import attribute_schema
+from golden_trays.batch import BATCH_ACTIONS
 from golden_trays.models import Crop, CropAttribute, CropAttributeOption, Slot, Variety, CropRecord
 from django import forms
 from django.forms import ModelForm, Textarea, TextInput
@@ -49,17 +51,8 @@ class AddAttributeOptionsForm(ModelForm):
 
 
 def generate_attributes():
-    attributes = CropAttribute.objects.all()
-    crop_attributes_list = []
-    for attr in attributes:
-        attribute_name = attr.name
-        attribute_options = attr.options.all()
-        choices_tuple = ()
-        for option in attribute_options:
-            choices_tuple += ((option.name, option.name),)
-        select_tuple = (attribute_name, choices_tuple)
-        crop_attributes_list.append(select_tuple)
-    return crop_attributes_list
+    """Return the crop attributes and the choices of each, from the cache when possible."""
+    return attribute_schema()
 
 
 class NewCropForm(forms.Form):
@@ -113,18 +106,32 @@ class HarvestCropForm(forms.Form):
     leaf_wingspan = forms.IntegerField(widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Enter the leaf wingspan in cm'}))
 
 
-class AddBarcodesForm(forms.Form):
-    def __init__(self, *args, **kwargs):
-        super(AddBarcodesForm, self).__init__(*args, **kwargs)
-        for slot in Slot.objects.all():
-            field = forms.CharField(widget=forms.TextInput(attrs={'class': 'form-control'}), required=False)
-            self.fields["Slot " + str(slot.id)] = field
-
-    def clean_barcode(self):
-        for field_name in self.cleaned_data:
-            # Check for duplicate barcode
-            barcode = self.cleaned_data[field_name]
-            slot_id = int(field_name.lstrip("Slot "))  # Isolate the current slot id
-            if Slot.objects.filter(barcode=barcode).exclude(id=slot_id).exists():
-                raise ValidationError(field_name+': A slot with barcode ' + barcode + ' already exists.', code="non-unique")
-        return self.cleaned_data
+class ImportBarcodesForm(forms.Form):
+    barcodes_file = forms.FileField(required=False, widget=forms.ClearableFileInput(
+        attrs={'class': 'form-control-file', 'id': "form-import-barcodes-file", 'accept': ".txt,.csv,text/plain"}))
+    barcodes = forms.CharField(required=False, widget=forms.Textarea(
+        attrs={'class': 'form-control', 'id': "form-import-barcodes", 'rows': 10,
+               'placeholder': "One barcode per line, or a slot id and its barcode per line"}))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('barcodes_file'):
+            try:
+                cleaned_data['text'] = cleaned_data['barcodes_file'].read().decode('utf-8-sig')
+            except UnicodeDecodeError:
+                raise ValidationError("The barcodes file must be a text file.", code="not-text")
+        else:
+            cleaned_data['text'] = cleaned_data.get('barcodes', "")
+        if not cleaned_data['text'].strip():
+            raise ValidationError("Choose a barcodes file or paste barcodes.", code="empty")
+        return cleaned_data
+
+
+class BatchActionForm(forms.Form):
+    action = forms.ChoiceField(choices=[(record_type, name) for record_type, name in CropRecord.RECORD_TYPES
+                                        if record_type in BATCH_ACTIONS],
+                               widget=forms.Select(attrs={'class': 'form-control', 'id': "form-batch-action"}))
+    barcodes = forms.CharField(widget=forms.Textarea(attrs={'class': 'form-control', 'id': "form-batch-barcodes",
+                                                            'rows': 10, 'placeholder': "Scan each tray"}))
+    reason = forms.CharField(required=False, widget=forms.TextInput(
+        attrs={'class': 'form-control', 'id': "form-batch-reason", 'placeholder': "Reason for trashing"}))
@@ -0,0 +1,55 @@
+"""Lookups of empty slots that never load the full list of them.
+
+Every query is a range over the partial index of empty slots' locations (free_slot_location_idx) or the barcode
+index. The nearest slots are found rack by rack outwards from the slot, each next rack with empty slots found with a
+single index seek, reading the rows around the slot's row before the rest of a rack, so their cost depends on the
+number of slots returned and the size of the racks they're in rather than on the size of the greenhouse.
+"""
+from golden_trays.models import Slot
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+
+def free_slots():
+    """Return the empty slots, in rack, row and position order."""
+    return Slot.objects.filter(current_crop__isnull=True).order_by('rack', 'row', 'position', 'barcode')
+
+
+def nearest_free_slots(slot, limit=DEFAULT_LIMIT):
+    """Return up to limit empty slots nearest slot: in the same rack first, then the nearest rows, then the nearest
+    positions. If slot is None or has no location, the first empty slots in location order are returned."""
+    if slot is None or slot.rack is None:
+        return free_slots()[:limit]
+    slots = free_slots().exclude(pk=slot.pk)
+    found = []
+    # The nearest racks below and above the ones searched so far that have empty slots
+    lower = upper = slot.rack
+    while lower is not None or upper is not None:
+        distance = min(abs(rack - slot.rack) for rack in (lower, upper) if rack is not None)
+        racks = sorted({rack for rack in (lower, upper) if rack is not None and abs(rack - slot.rack) == distance})
+        found += nearest_in_racks(slots, racks, slot, limit - len(found))
+        if len(found) >= limit:
+            break
+        if lower in racks:
+            lower = slots.filter(rack__lt=lower).order_by('-rack').values_list('rack', flat=True).first()
+        if upper in racks:
+            upper = slots.filter(rack__gt=upper).order_by('rack').values_list('rack', flat=True).first()
+    return found
+
+
+def nearest_in_racks(slots, racks, slot, limit):
+    """Return up to limit of slots in racks nearest slot, nearest rows then nearest positions first. Only slot's row
+    and the rows either side of it are read unless they hold fewer than limit slots, as every slot in them is nearer
+    than every slot outside them; then the rest of the racks is."""
+    window = list(slots.filter(rack__in=racks, row__range=(slot.row - 1, slot.row + 1)).order_by())
+    if len(window) < limit:
+        window = list(slots.filter(rack__in=racks).order_by())
+    window.sort(key=lambda free: (abs(free.rack - slot.rack), abs(free.row - slot.row),
+                                  abs(free.position - slot.position), free.rack, free.row, free.position))
+    return window[:limit]
+
+
+def matching_free_slots(prefix, limit=DEFAULT_LIMIT):
+    """Return up to limit empty slots whose barcode starts with prefix, for typeahead."""
+    return Slot.objects.filter(current_crop__isnull=True, barcode__startswith=prefix).order_by('barcode')[:limit]
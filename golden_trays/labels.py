@@ -0,0 +1,14 @@
+"""Label sheets for the slots in the database (the sheets themselves are drawn by barcode.labels)."""
+from golden_trays.models import Slot
+
+CHUNK_SIZE = 2000
+
+
+def slot_barcodes(racks=None):
+    """Return an iterator over the barcodes of the labelled slots (in racks, if given), in rack, row and position
+    order, fetched from the database CHUNK_SIZE at a time."""
+    slots = Slot.objects.exclude(barcode="")
+    if racks:
+        slots = slots.filter(rack__in=racks)
+    return (slots.order_by('rack', 'row', 'position', 'barcode').values_list('barcode', flat=True)
+            .iterator(chunk_size=CHUNK_SIZE))
@@ -0,0 +1,42 @@
+from time import perf_counter
+import tracemalloc
+from django.core.management.base import BaseCommand
+from barcode.labels import iter_pdf, iter_svg_pages
+from golden_trays.barcodes import iter_barcodes
+
+
+class Command(BaseCommand):
+    help = "Time label sheet generation for synthetic racks of slots and check its memory doesn't grow with the " \
+           "number of labels (no database access)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--labels', type=int, default=20000, help="Number of labels (rounded up to whole racks).")
+        parser.add_argument('--repeat', type=int, default=3, help="Number of timed runs.")
+
+    def handle(self, *args, **options):
+        rows, positions = 4, 16
+        racks = -(-options['labels'] // (rows * positions))
+
+        def barcodes(rack_count):
+            return iter_barcodes('G', rack_count, rows, positions)
+
+        for name, render in [("pdf", iter_pdf), ("svg", iter_svg_pages)]:
+            timings = []
+            for _ in range(options['repeat']):
+                start = perf_counter()
+                size = sum(len(chunk) for chunk in render(barcodes(racks)))
+                timings.append(perf_counter() - start)
+            labels = racks * rows * positions
+            self.stdout.write("%s, %d labels: best %.2f s (%d labels/s), %.1f MB" % (
+                name, labels, min(timings), labels / min(timings), size / 1e6))
+
+            # Peak memory for a tenth of the labels and for all of them should be about the same
+            peaks = []
+            for rack_count in (max(racks // 10, 1), racks):
+                tracemalloc.start()
+                for _ in render(barcodes(rack_count)):
+                    pass
+                peaks.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+            self.stdout.write("%s, peak memory: %.0f KB for %d labels, %.0f KB for %d labels" % (
+                name, peaks[0] / 1024, max(racks // 10, 1) * rows * positions, peaks[1] / 1024, labels))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from barcode.labels import write_pdf, write_svg_pages
+from golden_trays.labels import slot_barcodes
+
+
+class Command(BaseCommand):
+    help = "Print label sheets for the slots in the database, as one PDF or one SVG file per page."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rack', type=int, action='append', help="Only label this rack (may be repeated).")
+        parser.add_argument('--pdf', help="PDF file to write.")
+        parser.add_argument('--svg', help="SVG file name pattern to write, e.g. labels-%%03d.svg.")
+
+    def handle(self, *args, **options):
+        barcodes = slot_barcodes(options['rack'])
+        if options['pdf']:
+            with open(options['pdf'], 'wb') as file:
+                size = write_pdf(barcodes, file)
+            self.stdout.write(self.style.SUCCESS("Wrote %d bytes to %s." % (size, options['pdf'])))
+        elif options['svg']:
+            pages = write_svg_pages(barcodes, options['svg'])
+            self.stdout.write(self.style.SUCCESS("Wrote %d pages." % len(pages)))
+        else:
+            raise CommandError("Give --pdf or --svg.")
@@ -0,0 +1,71 @@
+# Generated by Django 2.2.28 on 2026-10-18 08:58
+
+from django.db import migrations, models
+
+BACKFILL_CHUNK_SIZE = 1000
+LIFECYCLE_RECORD_TYPES = {'germ_date': 'GERM', 'grow_date': 'GROW', 'harvest_date': 'HARVEST'}
+
+
+def backfill_lifecycle_dates(apps, schema_editor):
+    """Set the lifecycle dates of existing crops from their latest GERM, GROW and HARVEST records, one UPDATE per
+    chunk of crop ids so a large table isn't rewritten in a single statement."""
+    Crop = apps.get_model('golden_trays', 'Crop')
+    CropRecord = apps.get_model('golden_trays', 'CropRecord')
+    dates = {}
+    for field, record_type in LIFECYCLE_RECORD_TYPES.items():
+        records = CropRecord.objects.filter(crop=models.OuterRef('pk'), record_type=record_type)
+        dates[field] = models.Subquery(records.order_by('-date').values('date')[:1])
+    ids = list(Crop.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(ids), BACKFILL_CHUNK_SIZE):
+        chunk = ids[start:start + BACKFILL_CHUNK_SIZE]
+        Crop.objects.filter(pk__gte=chunk[0], pk__lte=chunk[-1]).update(**dates)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('golden_trays', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crop',
+            name='germ_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='crop',
+            name='grow_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='crop',
+            name='harvest_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_lifecycle_dates, migrations.RunPython.noop),
+        # The tables already have their default names (the initial migration's explicit names only differ in case
+        # for Slot), so only the migration state changes
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterModelTable(
+                name='crop',
+                table=None,
+            ),
+            migrations.AlterModelTable(
+                name='cropattribute',
+                table=None,
+            ),
+            migrations.AlterModelTable(
+                name='cropattributeoption',
+                table=None,
+            ),
+            migrations.AlterModelTable(
+                name='croprecord',
+                table=None,
+            ),
+            migrations.AlterModelTable(
+                name='slot',
+                table=None,
+            ),
+        ]),
+    ]
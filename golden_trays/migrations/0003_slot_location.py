@@ -0,0 +1,58 @@
+# Generated by Django 2.2.28 on 2026-10-18 09:01
+
+from django.db import migrations, models
+from golden_trays.barcodes import InvalidBarcode, decode
+
+BACKFILL_CHUNK_SIZE = 1000
+
+
+def backfill_locations(apps, schema_editor):
+    """Parse the location of existing slots from their barcodes, one bulk update per chunk of slots."""
+    Slot = apps.get_model('golden_trays', 'Slot')
+    slots = Slot.objects.order_by('pk').only('pk', 'barcode')
+    last_pk = 0
+    while True:
+        chunk = list(slots.filter(pk__gt=last_pk)[:BACKFILL_CHUNK_SIZE])
+        if not chunk:
+            return
+        for slot in chunk:
+            try:
+                slot.rack, slot.row, slot.position = decode(slot.barcode)[1:]
+            except InvalidBarcode:
+                pass
+        Slot.objects.bulk_update(chunk, ['rack', 'row', 'position'])
+        last_pk = chunk[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('golden_trays', '0002_crop_lifecycle_dates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='slot',
+            name='position',
+            field=models.PositiveSmallIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='slot',
+            name='rack',
+            field=models.PositiveSmallIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='slot',
+            name='row',
+            field=models.PositiveSmallIntegerField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='slot',
+            index=models.Index(fields=['rack', 'row', 'position'], name='slot_location_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='slot',
+            index=models.Index(condition=models.Q(current_crop__isnull=True), fields=['rack', 'row', 'position'], name='free_slot_location_idx'),
+        ),
+        migrations.RunPython(backfill_locations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.28 on 2026-10-18 09:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('golden_trays', '0003_slot_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('barcode', models.CharField(max_length=50)),
+                ('action', models.CharField(choices=[('GERM', 'Started Germination Phase'), ('GROW', 'Started Grow Phase'), ('WATER', 'Watered'), ('HARVEST', 'Harvested'), ('TRASH', 'Trashed')], max_length=10)),
+                ('scanned_at', models.DateTimeField()),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('batch', models.CharField(max_length=32)),
+                ('outcome', models.CharField(blank=True, choices=[('applied', 'Applied'), ('empty', 'Slot was empty'), ('unknown', 'No slot has the barcode')], max_length=10)),
+                ('crop', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='scan_events', to='golden_trays.Crop')),
+            ],
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.utils import timezone
+from golden_trays.barcodes import MAX_LENGTH, InvalidBarcode, decode
 from inventory.models import Variety
 
 
@@ -22,6 +23,10 @@ class CropAttributeOption(models.Model):
         return self.name
 
 
+# Crop lifecycle date fields and the CropRecord type that sets each of them
+LIFECYCLE_RECORD_TYPES = {'germ_date': 'GERM', 'grow_date': 'GROW', 'harvest_date': 'HARVEST'}
+
+
 class Crop(models.Model):
     """Represents a single attempt to grow a tray of Microgreens at a given time. Maintains a history of growth data
     in the form of sensor data, lifecycle advancements, tray movements, grower actions, and free-form notes.
@@ -35,6 +40,10 @@ class Crop(models.Model):
     seeding_density = models.FloatField(null=True, blank=True)  # measured in g/tray
     attributes = models.ManyToManyField(CropAttributeOption, related_name='crops')
     notes = models.TextField(null=True, blank=True)
+    # Dates of the latest GERM, GROW and HARVEST CropRecords, kept up to date as records are saved and deleted
+    germ_date = models.DateField(null=True, blank=True, editable=False)
+    grow_date = models.DateField(null=True, blank=True, editable=False)
+    harvest_date = models.DateField(null=True, blank=True, editable=False)
 
     def save(self, *args, **kwargs):
         # check that the crop has all the crop attributes that we have created
@@ -42,52 +51,50 @@ class Crop(models.Model):
         if not self.pk:
             # loops through all the crop attributes to make sure it has a value for each
             pass
+        # The lifecycle dates are only written by CropRecord saves and deletes and by batch updates, so saving a crop
+        # loaded before one of those doesn't put its old dates back
+        if not self._state.adding and not args and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in LIFECYCLE_RECORD_TYPES]
         super().save(*args, **kwargs)  # Call the "real" save() method.
 
     def days_in_germ(self):
         # If germ_date exists, but grow_date does not => it has not been taken out of germ
-        if self.germ_date() is not None and self.grow_date() is None:
-            days_in_germ = timezone.now().date() - self.germ_date()
+        if self.germ_date is not None and self.grow_date is None:
+            days_in_germ = timezone.now().date() - self.germ_date
             return days_in_germ.days
         # If both dates exist, get the difference between them
-        elif self.germ_date() is not None and self.grow_date() is not None:
-            delta = self.grow_date() - self.germ_date()
+        elif self.germ_date is not None and self.grow_date is not None:
+            delta = self.grow_date - self.germ_date
             return delta.days
         else:
             return 0
 
     def days_in_grow(self):
         # If grow_date exists, but harvest_date does not => it has not been harvested
-        if self.grow_date() is not None and self.harvest_date() is None:
-            days_in_grow = timezone.now().date() - self.grow_date()
+        if self.grow_date is not None and self.harvest_date is None:
+            days_in_grow = timezone.now().date() - self.grow_date
             return days_in_grow.days
         # If both dates exist, get the difference between them
-        elif self.harvest_date() is not None and self.grow_date() is not None:
-            delta = self.harvest_date() - self.grow_date()
+        elif self.harvest_date is not None and self.grow_date is not None:
+            delta = self.harvest_date - self.grow_date
             return delta.days
         else:
             return 0
 
-    def germ_date(self):
-        try:
-            germ_record = self.crop_records.get(record_type='GERM')
-            return germ_record.date
-        except:
-            return None
+    @staticmethod
+    def lifecycle_dates():
+        """Return the expressions that compute each lifecycle date field from the crop's CropRecords (the latest
+        record of its type), for use in Crop.objects.update()."""
+        def latest(record_type):
+            records = CropRecord.objects.filter(crop=models.OuterRef('pk'), record_type=record_type)
+            return models.Subquery(records.order_by('-date').values('date')[:1])
+        return {field: latest(record_type) for field, record_type in LIFECYCLE_RECORD_TYPES.items()}
 
-    def grow_date(self):
-        try:
-            grow_record = self.crop_records.get(record_type='GROW')
-            return grow_record.date
-        except:
-            return None
-
-    def harvest_date(self):
-        try:
-            harvest_record = self.crop_records.get(record_type='HARVEST')
-            return harvest_record.date
-        except:
-            return None
+    def update_lifecycle_dates(self):
+        """Recompute the crop's lifecycle dates from its CropRecords with a single UPDATE and reload them."""
+        Crop.objects.filter(pk=self.pk).update(**Crop.lifecycle_dates())
+        self.refresh_from_db(fields=list(LIFECYCLE_RECORD_TYPES))
 
 
 class CropRecord(models.Model):
@@ -104,10 +111,63 @@ class CropRecord(models.Model):
     date = models.DateField(default=timezone.now)
     record_type = models.CharField(max_length=10, choices=RECORD_TYPES)
 
+    def save(self, *args, **kwargs):
+        # A new WATER or TRASH record can't change the crop's lifecycle dates, an edited record might
+        changes_dates = not self._state.adding or self.record_type in LIFECYCLE_RECORD_TYPES.values()
+        super().save(*args, **kwargs)
+        if changes_dates:
+            self.crop.update_lifecycle_dates()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self.crop.update_lifecycle_dates()
+        return result
+
 
 class Slot(models.Model):
     """Represents an address on a grow rack for a single Crop. Has a barcode and links to a Crop object"""
-    barcode = models.CharField(max_length=50, blank=True, unique=True)
+    barcode = models.CharField(max_length=MAX_LENGTH, blank=True, unique=True)
     current_crop = models.OneToOneField(Crop, on_delete=models.DO_NOTHING, related_name='current_slot', blank=True, null=True)
+    # Location parsed from the barcode on save, null if the barcode isn't a location barcode
+    rack = models.PositiveSmallIntegerField(null=True, editable=False)
+    row = models.PositiveSmallIntegerField(null=True, editable=False)
+    position = models.PositiveSmallIntegerField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['rack', 'row', 'position'], name='slot_location_idx'),
+            # Free slot lookups only ever read empty slots
+            models.Index(fields=['rack', 'row', 'position'], condition=models.Q(current_crop__isnull=True),
+                         name='free_slot_location_idx'),
+        ]
+
+    def set_location(self):
+        """Set rack, row and position from the barcode."""
+        try:
+            self.rack, self.row, self.position = decode(self.barcode)[1:]
+        except InvalidBarcode:
+            self.rack = self.row = self.position = None
 
-
+    def save(self, *args, **kwargs):
+        self.set_location()
+        super().save(*args, **kwargs)
+
+
+class ScanEvent(models.Model):
+    """A scan action sent by a scanner tablet, possibly long after it was scanned if the tablet was offline. The
+    tablet gives every scan a unique key and resends the scans it doesn't hear back about, so the key's unique index
+    is what stops a scan from being applied twice."""
+    OUTCOMES = (
+        ('applied', 'Applied'),
+        ('empty', 'Slot was empty'),
+        ('unknown', 'No slot has the barcode'),
+    )
+    key = models.CharField(max_length=64, unique=True)
+    barcode = models.CharField(max_length=50)
+    action = models.CharField(max_length=10, choices=CropRecord.RECORD_TYPES)
+    scanned_at = models.DateTimeField()  # The tablet's clock
+    received_at = models.DateTimeField(auto_now_add=True)
+    # Identifies the request that stored the event, to tell which events in a batch were new
+    batch = models.CharField(max_length=32)
+    outcome = models.CharField(max_length=10, choices=OUTCOMES, blank=True)
+    crop = models.ForeignKey(Crop, on_delete=models.SET_NULL, null=True, blank=True, related_name='scan_events')
@@ -0,0 +1,51 @@
+"""Adding racks of slots.
+
+New slots get the barcode of their location (see golden_trays.barcodes), so no slot has to be saved twice to learn
+its id, and a whole set of racks is inserted with a few chunked INSERTs in one transaction.
+"""
+from django.db import transaction
+from django.db.models import Max
+from golden_trays.barcodes import iter_barcodes
+from golden_trays.models import Slot
+from golden_trays.rack_map import invalidate_rack_map
+from golden_trays.slot_lookup import invalidate_slot_barcodes
+
+CHUNK_SIZE = 500
+
+
+class SlotCollision(ValueError):
+    """Raised when slots to be added are already labelled, or their racks are already in use."""
+
+    def __init__(self, barcodes):
+        self.barcodes = barcodes
+        super().__init__("Slots already exist: " + ", ".join(barcodes[:10]) + (", ..." if len(barcodes) > 10 else ""))
+
+
+def next_rack():
+    """Return the number of the rack after the last one in use."""
+    return (Slot.objects.aggregate(last=Max('rack'))['last'] or 0) + 1
+
+
+def provision_slots(racks, rows, positions, first_rack=None, phase='G'):
+    """Add racks new racks (after the last one in use, unless first_rack is given) and return their slots' barcodes.
+    Raises SlotCollision, adding nothing, if any slot in those racks already exists (with whatever barcode suffix),
+    and InvalidBarcode if the racks, rows or positions don't fit in a barcode."""
+    with transaction.atomic():
+        first_rack = first_rack or next_rack()
+        barcodes = list(iter_barcodes(phase, racks, rows, positions, first_rack))
+        if not barcodes:
+            return []
+        # One range scan of the location index finds every existing slot in the new racks, including slots whose
+        # barcode has the old id suffix
+        taken = list(Slot.objects.filter(rack__gte=first_rack, rack__lt=first_rack + racks)
+                     .order_by('barcode').values_list('barcode', flat=True))
+        if taken:
+            raise SlotCollision(taken)
+        slots = [Slot(barcode=barcode) for barcode in barcodes]
+        for slot in slots:
+            slot.set_location()
+        # bulk_create doesn't send the signals that keep these caches up to date
+        Slot.objects.bulk_create(slots, batch_size=CHUNK_SIZE)
+        invalidate_rack_map()
+        invalidate_slot_barcodes()
+    return barcodes
@@ -0,0 +1,111 @@
+"""Rack map: every slot in the greenhouse laid out by rack, row and position.
+
+Each rack is rendered as a cached template fragment keyed by the rack's cache version, which is bumped whenever a
+slot in that rack (or the crop in one of its slots) changes, and by the date, since days in phase change daily. The
+slots are only queried, once for the whole greenhouse, if some rack's fragment isn't cached, so a warm page doesn't
+touch the slot table at all.
+"""
+from collections import namedtuple
+from datetime import date
+from django.core.cache import cache
+from golden_trays.barcodes import InvalidBarcode, decode
+from golden_trays.models import Slot
+from grow_app.caching import invalidate, versioned_key, versions
+
+# Bumped when slots are added, removed or change rack, or when a variety is renamed: invalidates every rack
+RACK_MAP_NAMESPACE = 'rack-map'
+
+SlotCell = namedtuple('SlotCell', ['slot_id', 'barcode', 'position', 'crop_id', 'variety', 'phase', 'days_in_phase'])
+
+
+def rack_namespace(rack):
+    """Return the cache namespace of one rack's fragment."""
+    return RACK_MAP_NAMESPACE + '-' + str(rack)
+
+
+def slot_rack(barcode):
+    """Return the rack a slot barcode belongs to, or None if it isn't a slot barcode."""
+    try:
+        return decode(barcode).rack
+    except InvalidBarcode:
+        return None
+
+
+def invalidate_racks(*barcodes):
+    """Invalidate the cached fragments of the racks of the given slot barcodes."""
+    racks = {slot_rack(barcode) for barcode in barcodes} - {None}
+    invalidate(*[rack_namespace(rack) for rack in racks])
+
+
+def invalidate_rack_map():
+    """Invalidate the list of racks and every rack's fragment."""
+    invalidate(RACK_MAP_NAMESPACE)
+
+
+def crop_phase(germ_date, grow_date, harvest_date, today):
+    """Return the (phase, days in phase) of a crop from its lifecycle dates."""
+    if harvest_date is not None:
+        return 'Harvested', (today - harvest_date).days
+    if grow_date is not None:
+        return 'Grow', (today - grow_date).days
+    if germ_date is not None:
+        return 'Germ', (today - germ_date).days
+    return None, None
+
+
+def slot_grid(today):
+    """Return every addressable slot as {rack: {row: [SlotCell, ...]}}, in position order, from one query."""
+    rows = (Slot.objects.filter(rack__isnull=False).order_by('rack', 'row', 'position')
+            .values_list('id', 'barcode', 'rack', 'row', 'position', 'current_crop_id', 'current_crop__variety__name',
+                         'current_crop__germ_date', 'current_crop__grow_date', 'current_crop__harvest_date'))
+    grid = {}
+    for slot_id, barcode, rack, row, position, crop_id, variety, germ_date, grow_date, harvest_date in rows:
+        phase, days = crop_phase(germ_date, grow_date, harvest_date, today) if crop_id else (None, None)
+        grid.setdefault(rack, {}).setdefault(row, []).append(
+            SlotCell(slot_id, barcode, position, crop_id, variety, phase, days))
+    return grid
+
+
+def rack_numbers():
+    """Return the sorted rack numbers, cached until slots are added, removed or renamed."""
+    key = versioned_key(RACK_MAP_NAMESPACE, 'racks')
+    racks = cache.get(key)
+    if racks is None:
+        racks = list(Slot.objects.filter(rack__isnull=False).order_by('rack').values_list('rack', flat=True)
+                     .distinct())
+        cache.set(key, racks)
+    return racks
+
+
+class RackMap:
+    """The racks to render, each with the cache key of its fragment. The slot grid is loaded on first use, when the
+    template finds a rack whose fragment isn't cached."""
+
+    def __init__(self, today=None):
+        self.today = today or date.today()
+        self._grid = None
+        numbers = rack_numbers()
+        rack_versions = versions([RACK_MAP_NAMESPACE] + [rack_namespace(rack) for rack in numbers])
+        self.racks = [Rack(self, number, "%s.%s.%s" % (rack_versions[RACK_MAP_NAMESPACE],
+                                                       rack_versions[rack_namespace(number)], self.today.isoformat()))
+                      for number in numbers]
+
+    @property
+    def grid(self):
+        if self._grid is None:
+            self._grid = slot_grid(self.today)
+        return self._grid
+
+
+class Rack:
+    """One rack of a RackMap. cache_key identifies the version of its fragment; rows is only computed when the
+    fragment is rendered."""
+
+    def __init__(self, rack_map, number, cache_key):
+        self.rack_map = rack_map
+        self.number = number
+        self.cache_key = cache_key
+
+    def rows(self):
+        """Return the rack's rows as (row number, [SlotCell, ...]) pairs in order."""
+        return sorted(self.rack_map.grid.get(self.number, {}).items())
@@ -0,0 +1,85 @@
+"""Ingest of the scans a tablet queued while it was offline.
+
+Each event carries a key the tablet made up when the scan happened. The events are inserted ignoring conflicts on
+the key's unique index, tagged with a token unique to the request, so the events that come back with that token are
+exactly the ones no earlier (or concurrent) request has stored. Only those are applied, all together and in the
+order they were scanned, and every event in the request gets an outcome so the tablet knows it can drop it.
+"""
+from collections import namedtuple
+from uuid import uuid4
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from golden_trays.barcodes import InvalidBarcode, validate_scan
+from golden_trays.batch import BATCH_ACTIONS, Scan, apply_scans
+from golden_trays.models import ScanEvent
+
+MAX_EVENTS = 1000
+
+# Outcomes of events that weren't applied in this request, on top of those of golden_trays.batch
+DUPLICATE = 'duplicate'
+INVALID = 'invalid'
+
+QueuedScan = namedtuple('QueuedScan', ['key', 'barcode', 'action', 'scanned_at', 'reason'])
+
+
+class InvalidScanEvent(ValueError):
+    """Raised when a queued event is missing a field or has a bad one."""
+
+
+def parse_event(event):
+    """Return the QueuedScan in the JSON object event. Raises InvalidScanEvent."""
+    try:
+        key, barcode, action = str(event['key']), str(event['barcode']), event['action']
+        scanned_at = parse_datetime(event['scanned_at'])
+        reason = str(event.get('reason', ""))
+    except (KeyError, TypeError, ValueError):
+        raise InvalidScanEvent("Scan events need a key, barcode, action and scanned_at")
+    if not 0 < len(key) <= 64:
+        raise InvalidScanEvent("Bad key")
+    try:
+        validate_scan(barcode)
+    except InvalidBarcode as error:
+        raise InvalidScanEvent(str(error))
+    if action not in BATCH_ACTIONS:
+        raise InvalidScanEvent("Unknown action: %r" % (action,))
+    if scanned_at is None:
+        raise InvalidScanEvent("scanned_at isn't an ISO 8601 date and time")
+    if timezone.is_naive(scanned_at):
+        scanned_at = timezone.make_aware(scanned_at)
+    return QueuedScan(key, barcode, action, scanned_at, reason)
+
+
+def ingest_scan_events(events):
+    """Store and apply the events not seen before and return {'key': key, 'outcome': outcome} for every event, in
+    order. Events already stored are 'duplicate' and events that can't be parsed are 'invalid'."""
+    parsed = []
+    for event in events:
+        try:
+            parsed.append(parse_event(event))
+        except InvalidScanEvent:
+            parsed.append(None)
+    # The first of several events with the same key is the one that counts
+    first = {}
+    for scan in parsed:
+        if scan is not None:
+            first.setdefault(scan.key, scan)
+
+    batch = uuid4().hex
+    with transaction.atomic():
+        ScanEvent.objects.bulk_create([ScanEvent(key=scan.key, barcode=scan.barcode, action=scan.action,
+                                                 scanned_at=scan.scanned_at, batch=batch)
+                                       for scan in first.values()], ignore_conflicts=True)
+        new_events = sorted(ScanEvent.objects.filter(key__in=list(first), batch=batch),
+                            key=lambda event: (event.scanned_at, event.id))
+        outcomes = apply_scans([Scan(event.barcode, event.action, timezone.localdate(event.scanned_at),
+                                     first[event.key].reason) for event in new_events])
+        for event, outcome in zip(new_events, outcomes):
+            event.outcome = outcome.outcome
+            event.crop_id = outcome.crop_id
+        ScanEvent.objects.bulk_update(new_events, ['outcome', 'crop'])
+
+    applied = {event.key: event.outcome for event in new_events}
+    return [{'key': scan.key, 'outcome': applied.pop(scan.key, DUPLICATE)} if scan is not None
+            else {'key': event.get('key') if isinstance(event, dict) else None, 'outcome': INVALID}
+            for event, scan in zip(events, parsed)]
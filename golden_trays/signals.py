@@ -0,0 +1,68 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from golden_trays.attribute_schema import invalidate_attribute_schema
+from golden_trays.models import LIFECYCLE_RECORD_TYPES, Crop, CropAttribute, CropAttributeOption, CropRecord, Slot
+from golden_trays.rack_map import invalidate_rack_map, invalidate_racks
+from golden_trays.slot_lookup import invalidate_slot_barcodes
+from inventory.models import Variety
+
+
+@receiver(post_init, sender=Slot)
+def remember_barcode(sender, instance, **kwargs):
+    """Remember the barcode a slot was loaded with, so a save can tell if the slot moved to another rack."""
+    instance.saved_barcode = instance.barcode
+
+
+@receiver(post_save, sender=Slot)
+def slot_saved(sender, instance, created, **kwargs):
+    """Invalidate the rack map fragment of the slot's rack, or the whole map and the cached barcodes if a slot was
+    added or relabelled."""
+    if created or instance.barcode != instance.saved_barcode:
+        invalidate_rack_map()
+        invalidate_slot_barcodes()
+    else:
+        invalidate_racks(instance.barcode)
+    instance.saved_barcode = instance.barcode
+
+
+@receiver(post_delete, sender=Slot)
+def slot_deleted(sender, instance, **kwargs):
+    invalidate_rack_map()
+    invalidate_slot_barcodes()
+
+
+def invalidate_crop_rack(crop_id):
+    """Invalidate the rack map fragment of the rack the crop is in."""
+    invalidate_racks(*Slot.objects.filter(current_crop_id=crop_id).values_list('barcode', flat=True))
+
+
+@receiver(post_save, sender=Crop)
+def crop_saved(sender, instance, **kwargs):
+    invalidate_crop_rack(instance.id)
+
+
+@receiver(post_save, sender=CropRecord)
+def crop_record_saved(sender, instance, created, **kwargs):
+    """Only records that may have changed the crop's phase affect the rack map."""
+    if not created or instance.record_type in LIFECYCLE_RECORD_TYPES.values():
+        invalidate_crop_rack(instance.crop_id)
+
+
+@receiver(post_delete, sender=CropRecord)
+def crop_record_deleted(sender, instance, **kwargs):
+    invalidate_crop_rack(instance.crop_id)
+
+
+@receiver(post_save, sender=Variety)
+def variety_saved(sender, **kwargs):
+    """Variety names are shown on every rack."""
+    invalidate_rack_map()
+
+
+@receiver(post_save, sender=CropAttribute)
+@receiver(post_delete, sender=CropAttribute)
+@receiver(post_save, sender=CropAttributeOption)
+@receiver(post_delete, sender=CropAttributeOption)
+def crop_attributes_changed(sender, **kwargs):
+    """The crop forms are built from the cached attributes and options."""
+    invalidate_attribute_schema()
@@ -0,0 +1,53 @@
+"""Barcode to slot resolution for the scanner.
+
+The slot id of each scanned barcode is kept in the cache (the CACHES backend, bounded by its MAX_ENTRIES and shared
+between processes when that backend is), including barcodes that don't belong to any slot, so a repeated scan of a
+junk barcode doesn't touch the database either, and scans that can't be any slot's barcode (see
+golden_trays.barcodes.validate_scan) are turned away before the cache or the database are asked. The whole namespace
+is invalidated whenever a slot is added, deleted or relabelled, which is rare next to the number of scans.
+"""
+from hashlib import md5
+from django.core.cache import cache
+from golden_trays.barcodes import validate_scan
+from golden_trays.models import Slot
+from grow_app.caching import invalidate, versioned_key
+
+SLOT_BARCODE_NAMESPACE = 'slot-barcodes'
+
+# Cached for barcodes without a slot, since None can't be told apart from a miss
+NO_SLOT = 0
+
+
+def invalidate_slot_barcodes():
+    """Forget every cached barcode, after slots are added, deleted or get new barcodes."""
+    invalidate(SLOT_BARCODE_NAMESPACE)
+
+
+def barcode_key(barcode):
+    """Return the cache key of barcode. Scanned text can hold anything, so it's hashed unless it is plain ASCII
+    letters and digits, which every cache backend accepts in keys."""
+    if not (barcode.isascii() and barcode.isalnum()):
+        barcode = md5(barcode.encode()).hexdigest()
+    return versioned_key(SLOT_BARCODE_NAMESPACE, barcode)
+
+
+def slots_for_display():
+    """Return the slots with the crop and variety the slot page shows."""
+    return Slot.objects.select_related('current_crop__variety')
+
+
+def slot_for_barcode(barcode):
+    """Return the slot labelled barcode (with its crop and variety), or None, with at most one query. Raises
+    InvalidBarcode, without a query, if barcode is a misread scan."""
+    validate_scan(barcode)
+    key = barcode_key(barcode)
+    slot_id = cache.get(key)
+    if slot_id == NO_SLOT:
+        return None
+    if slot_id is not None:
+        slot = slots_for_display().filter(pk=slot_id).first()
+        if slot is not None and slot.barcode == barcode:
+            return slot
+    slot = slots_for_display().filter(barcode=barcode).first()
+    cache.set(key, slot.id if slot else NO_SLOT)
+    return slot
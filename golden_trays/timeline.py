@@ -0,0 +1,63 @@
+"""A crop's history as a compact timeline, built from one ordered CropRecord query."""
+from golden_trays.models import CropRecord
+
+
+class CropTimeline:
+    """The CropRecords of one crop in date order, with the latest record and the number of records of each type.
+
+    Everything the crop and slot pages and the Google Sheets upload need from a crop's history is read from here,
+    so each crop costs a single records query wherever it appears."""
+    __slots__ = ('history', 'latest_records', 'counts')
+
+    def __init__(self, records):
+        self.history = list(records)
+        self.latest_records = {}
+        self.counts = {}
+        for record in self.history:
+            # Records are in date order, so later ones replace earlier ones
+            self.latest_records[record.record_type] = record
+            self.counts[record.record_type] = self.counts.get(record.record_type, 0) + 1
+
+    @classmethod
+    def for_crop(cls, crop):
+        """Return the timeline of crop (empty, without a query, if crop is None)."""
+        if crop is None:
+            return cls([])
+        return cls(CropRecord.objects.filter(crop=crop).order_by('date', 'id'))
+
+    def latest(self, record_type):
+        """Return the latest record of record_type, or None."""
+        return self.latest_records.get(record_type)
+
+    def latest_date(self, record_type):
+        """Return the date of the latest record of record_type, or None."""
+        record = self.latest(record_type)
+        return record.date if record else None
+
+    def count(self, record_type):
+        """Return the number of records of record_type."""
+        return self.counts.get(record_type, 0)
+
+    def dates(self, record_type):
+        """Return the dates of every record of record_type, oldest first."""
+        return [record.date for record in self.history if record.record_type == record_type]
+
+    @property
+    def germ_date(self):
+        return self.latest_date('GERM')
+
+    @property
+    def grow_date(self):
+        return self.latest_date('GROW')
+
+    @property
+    def harvest_date(self):
+        return self.latest_date('HARVEST')
+
+    @property
+    def trash_date(self):
+        return self.latest_date('TRASH')
+
+    @property
+    def last_watered(self):
+        return self.latest_date('WATER')
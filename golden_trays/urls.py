@@ -4,6 +4,8 @@ from golden_trays import views
 urlpatterns = [
     path('golden_trays/add_barcodes', views.add_barcodes, name="add_barcodes"),
     path('golden_trays/', views.golden_trays_home, name="golden_trays_home"),
+    path('golden_trays/labels.pdf', views.slot_labels, name="slot_labels"),
+    path('golden_trays/rack_map', views.rack_map, name="rack_map"),
     path('golden_trays/search_crop', views.search_crop, name="search_crop"),
     path('crop/new/', views.create_crop, name="create_crop"),
     path('crop/<int:crop_id>/record_notes', views.record_notes, name="record_notes"),
@@ -13,11 +15,15 @@ urlpatterns = [
     path('crop/add_attributes/', views.add_crop_attributes, name="add_crop_attributes"),
     path('crop/add_attribute', views.add_crop_attribute, name="add_crop_attribute"),
     path('crop/add_option', views.add_attribute_option, name="add_attribute_option"),
+    path('slot/batch', views.batch_action, name="batch_action"),
+    path('slot/free', views.free_slot_lookup, name="free_slot_lookup"),
     path('slot/<int:slot_id>/', views.slot_detail, name="slot_detail"),
     path('slot/<int:slot_id>/action/trash', views.trash_crop, name="trash_crop"),
     path('slot/<int:slot_id>/action/harvest', views.harvest_crop, name="harvest_crop"),
     path('slot/<int:slot_id>/action/water', views.water_crop, name="water_crop"),
     path('barcode/<str:barcode_text>/', views.parse_barcode, name="parse_barcode"),
+    path('scan/ingest', views.ingest_scans, name="ingest_scans"),
+    path('scan/<str:barcode_text>/', views.scan_barcode, name="scan_barcode"),
     path('record/<int:record_id>/edit', views.update_crop_record, name="update_crop_record"),
     path('record/<int:record_id>/delete', views.delete_record, name="delete_record"),
 ]
\ No newline at end of file
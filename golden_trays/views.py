@@ -1,15 +1,27 @@
-from django.http import HttpResponseBadRequest, HttpResponseRedirect, JsonResponse
+from django.http import Http404, HttpResponseBadRequest, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.core.paginator import Paginator
 from django.shortcuts import redirect, render
-from golden_trays.models import Crop, CropAttribute, CropAttributeOption, CropRecord, Slot, Variety
+from golden_trays.models import Crop, CropAttribute, CropAttributeOption, CropRecord, ScanEvent, Slot, Variety
 from golden_trays.forms import *
 from datetime import date, datetime, timedelta
 from dateutil import parser
-from google_sheets.upload_to_sheet import upload_data_to_sheets
+from golden_trays.barcodes import InvalidBarcode
+from golden_trays.barcode_import import BarcodeImportError, assign_barcodes, parse_assignments
+from golden_trays.batch import APPLIED, REMOVAL_ACTIONS, apply_batch_action, split_barcodes
+from golden_trays.free_slots import DEFAULT_LIMIT, MAX_LIMIT, matching_free_slots, nearest_free_slots
+from golden_trays.labels import slot_barcodes
+from golden_trays.rack_map import RackMap
+from golden_trays.scan_ingest import MAX_EVENTS, ingest_scan_events
+from golden_trays.slot_lookup import slot_for_barcode, slots_for_display
+from golden_trays.timeline import CropTimeline
+from barcode.labels import iter_pdf
+from google_sheets.upload_to_sheet import upload_crops_to_sheets, upload_data_to_sheets
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404
 import os
 import json
 
+SLOTS_PER_PAGE = 100
 
 
 @login_required
@@ -18,6 +30,30 @@ def golden_trays_home(request):
     return render(request, "golden_trays/golden_trays_home.html")
 
 
+@login_required
+def free_slot_lookup(request):
+    """GET: Return empty slots as JSON, either those whose barcode starts with 'q' (for typeahead) or those nearest
+    the slot with id 'near'. 'limit' caps the number of slots returned."""
+    try:
+        limit = min(max(int(request.GET.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+        near = int(request.GET['near']) if request.GET.get('near') else None
+    except ValueError:
+        return HttpResponseBadRequest("'limit' and 'near' must be numbers.")
+    if request.GET.get('q'):
+        slots = matching_free_slots(request.GET['q'], limit)
+    else:
+        slots = nearest_free_slots(get_object_or_404(Slot, id=near) if near else None, limit)
+    return JsonResponse({'slots': [{'id': slot.id, 'barcode': slot.barcode, 'rack': slot.rack, 'row': slot.row,
+                                    'position': slot.position} for slot in slots]})
+
+
+@login_required
+def rack_map(request):
+    """GET: Display every slot in the greenhouse in a rack/row grid with the variety, phase and days in phase of the
+    crop it holds."""
+    return render(request, "golden_trays/rack_map.html", context={"rack_map": RackMap()})
+
+
 @login_required
 def record_notes(request, crop_id):
     """POST: Adds or updates notes for a given crop"""
@@ -102,7 +138,6 @@ def edit_crop(request, crop_id):
     if request.method == 'GET':
         current_crop = get_object_or_404(Crop, id=crop_id)
         variety_list = Variety.objects.all()
-        empty_slot_list = Slot.objects.filter(current_crop=None)
         # Try to find the slot holding this crop
         try:
             current_slot = Slot.objects.get(current_crop=current_crop)
@@ -113,7 +148,7 @@ def edit_crop(request, crop_id):
 
         initial_dict = {}
 
-        initial_dict['date_seeded'] = current_crop.germ_date()
+        initial_dict['date_seeded'] = current_crop.germ_date
         initial_dict['variety'] = current_crop.variety
         initial_dict['days_germinated'] = current_crop.days_in_germ()
         initial_dict['seeding_density'] = current_crop.seeding_density
@@ -130,7 +165,8 @@ def edit_crop(request, crop_id):
         form = EditCropForm(initial=initial_dict)
 
         return render(request, "golden_trays/edit_crop.html",
-                      context={"variety_list": variety_list, "barcode": barcode, "slot_list": empty_slot_list, "edit_crop_form": form})
+                      context={"variety_list": variety_list, "barcode": barcode,
+                               "slot_list": nearest_free_slots(current_slot), "edit_crop_form": form})
 
     if request.method == 'POST':
         crop = get_object_or_404(Crop, id=crop_id)
@@ -221,21 +257,12 @@ def crop_detail(request, crop_id):
     edit = request.GET.get('edit', False)
     record_id = int(request.GET.get('id', -1))
 
-    all_records = CropRecord.objects.filter(crop=crop_id)
-
-    # FIXME -- handle this selection client-side via template filtering and selection
-    try:
-        seed = CropRecord.objects.filter(crop=crop_id).filter(record_type='SEED').order_by('-date')[0]
-    except Exception:
-        seed = None
-    try:
-        harvest = CropRecord.objects.filter(crop=crop_id).filter(record_type='HARVEST').order_by('-date')[0]
-    except Exception:
-        harvest = None
-    try:
-        trash = CropRecord.objects.filter(crop=crop_id).filter(record_type='TRASH').order_by('-date')[0]
-    except Exception:
-        trash = None
+    timeline = CropTimeline.for_crop(crop)
+    all_records = timeline.history
+    # Trays are seeded as they go into germination, so the seed record is the GERM record (there is no SEED type)
+    seed = timeline.latest('GERM')
+    harvest = timeline.latest('HARVEST')
+    trash = timeline.latest('TRASH')
 
     record_types = [record[1] for record in CropRecord.RECORD_TYPES]  # This returns a list of all the readable crop record types
     crop_record_form = CropRecordForm(initial={'date': datetime.now().strftime("%m/%d/%Y")})
@@ -273,16 +300,19 @@ def slot_detail(request, slot_id):
     """GET: Displays the details of current crop in the slot and all the buttons used to control a tray in the greenhouse.
     Provides buttons and forms to perform tray actions.This is the page that people using the barcode scanner are going to
      see as they're working all day, so it needs to feel like a control panel."""
-    slot = Slot.objects.get(id=slot_id)
+    return render_slot(request, get_object_or_404(slots_for_display(), id=slot_id))
+
+
+def render_slot(request, slot):
+    """Render the slot page of slot."""
+    slot_id = slot.id
     current_crop = slot.current_crop
     barcode = slot.barcode
-    open_slots = Slot.objects.filter(current_crop=None)
+    open_slots = nearest_free_slots(slot)
     crop_attributes = get_crop_attributes_list(current_crop)
-    all_records = CropRecord.objects.filter(crop=current_crop)
-    try:
-        water = CropRecord.objects.filter(crop=current_crop).filter(record_type='WATER').order_by('-date')[0]
-    except Exception:
-        water = None
+    timeline = CropTimeline.for_crop(current_crop)
+    all_records = timeline.history
+    water = timeline.latest('WATER')
     if current_crop:
         notes = current_crop.notes
     else:
@@ -349,6 +379,56 @@ def water_crop(request, slot_id):
     return redirect(slot_detail, slot_id=slot_id)
 
 
+@login_required
+def batch_action(request):
+    """GET: Displays the batch mode form, where the operator scans many trays to water, trash or harvest at once.
+    POST: Applies the action to every scanned slot and displays a summary."""
+    result = None
+    if request.method == 'POST':
+        form = BatchActionForm(request.POST)
+        if form.is_valid():
+            result = apply_batch_action(form.cleaned_data['action'], split_barcodes(form.cleaned_data['barcodes']),
+                                        form.cleaned_data['reason'])
+            if result.action in REMOVAL_ACTIONS:
+                upload_crops_to_sheets(Crop.objects.filter(id__in=[slot.current_crop_id for slot in result.slots]))
+            form = BatchActionForm(initial={'action': result.action})
+    else:
+        form = BatchActionForm()
+    return render(request, "golden_trays/batch_action.html", context={"batch_action_form": form, "result": result})
+
+
+@login_required
+def ingest_scans(request):
+    """POST: Apply the scans a tablet queued while offline, sent as JSON: {"events": [{"key", "barcode", "action",
+    "scanned_at", "reason"}, ...]}. Responds with the outcome of every event."""
+    if request.method != 'POST':
+        return HttpResponseBadRequest("POST the queued scan events.")
+    try:
+        events = json.loads(request.body)['events']
+    except (ValueError, KeyError, TypeError):
+        return HttpResponseBadRequest("Expected a JSON object with a list of events.")
+    if not isinstance(events, list) or len(events) > MAX_EVENTS:
+        return HttpResponseBadRequest("Send a list of at most %d events." % MAX_EVENTS)
+    results = ingest_scan_events(events)
+    applied = [result['key'] for result in results if result['outcome'] == APPLIED]
+    if applied:
+        removed = ScanEvent.objects.filter(key__in=applied, action__in=REMOVAL_ACTIONS).values('crop_id')
+        upload_crops_to_sheets(Crop.objects.filter(id__in=removed))
+    return JsonResponse({'results': results})
+
+
+@login_required
+def slot_labels(request):
+    """GET: Streams a PDF of label sheets for every labelled slot, or for the racks given as 'rack'."""
+    try:
+        racks = [int(rack) for rack in request.GET.getlist('rack')]
+    except ValueError:
+        return HttpResponseBadRequest("'rack' must be a number.")
+    response = StreamingHttpResponse(iter_pdf(slot_barcodes(racks)), content_type='application/pdf')
+    response['Content-Disposition'] = 'inline; filename="slot-labels.pdf"'
+    return response
+
+
 @login_required
 def search_crop(request):
     """GET: Go to the crop page based on the input of crop id or barcode"""
@@ -387,29 +467,46 @@ def update_crop_record(request, record_id):
 
 @login_required
 def parse_barcode(request, barcode_text):
-    slot = get_object_or_404(Slot, barcode=barcode_text)
-    return redirect(slot_detail, slot_id=slot.id)
+    """GET: Redirect to the page of the slot labelled barcode_text."""
+    try:
+        return redirect(slot_detail, slot_id=scanned_slot(barcode_text).id)
+    except InvalidBarcode as error:
+        return HttpResponseBadRequest("Misread barcode, scan it again. " + str(error))
+
+
+@login_required
+def scan_barcode(request, barcode_text):
+    """GET: Render the page of the slot labelled barcode_text, without a redirect. This is where the scanner goes."""
+    try:
+        return render_slot(request, scanned_slot(barcode_text))
+    except InvalidBarcode as error:
+        return HttpResponseBadRequest("Misread barcode, scan it again. " + str(error))
+
+
+def scanned_slot(barcode_text):
+    slot = slot_for_barcode(barcode_text)
+    if slot is None:
+        raise Http404("No slot is labelled " + barcode_text)
+    return slot
 
 
 @login_required
 def add_barcodes(request):
-    """GET: All slots """
-    if request.method == 'GET':
-        slot_list = Slot.objects.all()
-        initial_dict = {}
-        for slot in slot_list:
-            initial_dict["Slot " + str(slot.id)] = slot.barcode
-        form = AddBarcodesForm(initial=initial_dict)
-        return render(request, "golden_trays/add_barcodes.html",
-                      context={"slot_list": slot_list,
-                               "add_barcodes_to_slots_form": form})
+    """GET: Lists the slots and their barcodes a page at a time, with a form to import barcodes from a barcodes.txt
+    file or pasted text.
+    POST: Assigns the imported barcodes to the slots and shows how many changed."""
+    changed, errors = None, []
     if request.method == 'POST':
-        slot_list = Slot.objects.all()
-        form = AddBarcodesForm(request.POST)
+        form = ImportBarcodesForm(request.POST, request.FILES)
         if form.is_valid():
-            # form.cleaned_data = form.clean_barcode()
-            for slot in slot_list:
-                slot.barcode = form.cleaned_data.pop('Slot '+str(slot.id))
-                slot.save()
-        return redirect(golden_trays_home)
-
+            try:
+                slot_ids = Slot.objects.order_by('id').values_list('id', flat=True)
+                changed = assign_barcodes(parse_assignments(form.cleaned_data['text'], slot_ids))
+                form = ImportBarcodesForm()
+            except BarcodeImportError as error:
+                errors = error.errors
+    else:
+        form = ImportBarcodesForm()
+    page = Paginator(Slot.objects.order_by('id'), SLOTS_PER_PAGE).get_page(request.GET.get('page'))
+    return render(request, "golden_trays/add_barcodes.html",
+                  context={"import_barcodes_form": form, "page": page, "changed": changed, "errors": errors})
@@ -1,8 +1,11 @@
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 import os
+from django.db.models import Prefetch
+from golden_trays.models import CropRecord
+from golden_trays.timeline import CropTimeline
 
-def upload_data_to_sheets(crop):
+def open_sheet():
     # Set up to be able to access google sheet
     scope = ["https://spreadsheets.google.com/feeds", 'https://www.googleapis.com/auth/spreadsheets',"https://www.googleapis.com/auth/drive.file","https://www.googleapis.com/auth/drive"]
 
@@ -24,8 +27,11 @@ def upload_data_to_sheets(crop):
 
     client = gspread.authorize(creds)
 
-    sheet = client.open("GoldenTrayData").sheet1  # open sheet
+    return client.open("GoldenTrayData").sheet1  # open sheet
 
+
+def crop_row(crop, timeline=None):
+    """Return the sheet row of crop."""
     # Date Planted, Crop Variety, Days in Germ (or date out of germ), Days in Grow (date in grow),
     # ... light type, light distance, substrate type, density?, yield, leaf wingspan, notes
 
@@ -36,8 +42,11 @@ def upload_data_to_sheets(crop):
     crop_link = "https://bostonmicrogreens.herokuapp.com/crop/%d/" % crop.id
     full_hyperlink = '=HYPERLINK("' + crop_link + '", "' + crop.variety.name + '")'
 
+    # The crop's records, fetched once for all the dates below
+    timeline = timeline or CropTimeline.for_crop(crop)
+
     row.append(crop.variety.name)  # Variety
-    row.append(crop.grow_date.strftime("%m/%d/%y"))  # Date Planted
+    row.append(timeline.grow_date.strftime("%m/%d/%y") if timeline.grow_date else "")  # Date Planted
     row.append(crop.days_in_germ())  # Germ Days
     row.append(crop.days_in_grow())  # Grow Days
     row.append(crop.crop_yield)  # Crop Yield
@@ -48,8 +57,7 @@ def upload_data_to_sheets(crop):
     row.append(crop_link)  # Crop URL
 
     # Add the list of all the dates that the crop was watered
-    water_records = crop.croprecord_set.filter(record_type='WATER')
-    water_dates = ','.join([record.date.strftime("%m/%d/%y") for record in water_records])
+    water_dates = ','.join([water_date.strftime("%m/%d/%y") for water_date in timeline.dates('WATER')])
     row.append(water_dates)  # Dates Watered
 
     # Then iterate through all the attributes
@@ -57,7 +65,22 @@ def upload_data_to_sheets(crop):
     for attribute in crop_attributes:
         row.append(attribute.name)
 
+    return row
+
+
+def upload_data_to_sheets(crop, timeline=None):
     # Finally add the row of data to the sheet
-    sheet.append_row(row)
+    open_sheet().append_row(crop_row(crop, timeline))
+
+
+def upload_crops_to_sheets(crops):
+    """Add the rows of a queryset of crops to the sheet with a single request. The crops' varieties, records and
+    attributes are read with three queries however many crops there are."""
+    crops = crops.select_related('variety').prefetch_related(
+        Prefetch('crop_records', queryset=CropRecord.objects.order_by('date', 'id')), 'attributes')
+    rows = [crop_row(crop, CropTimeline(crop.crop_records.all())) for crop in crops]
+    if rows:
+        sheet = open_sheet()
+        sheet.spreadsheet.values_append(sheet.title, {'valueInputOption': 'RAW'}, {'values': rows})
 
 
@@ -0,0 +1,47 @@
+"""Versioned cache namespaces.
+
+Cached values are stored under keys that include their namespace's current version, so invalidating a namespace is a
+single increment and every key built from the old version simply stops being read (and ages out of the cache).
+"""
+from uuid import uuid4
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'version:{}'
+
+
+def version(namespace):
+    """Return the current version of namespace."""
+    key = VERSION_KEY.format(namespace)
+    current = cache.get(key)
+    if current is None:
+        # Start from an unpredictable value so a version that was evicted can't come back and revive old entries
+        cache.add(key, uuid4().int % 10 ** 12, None)
+        current = cache.get(key)
+    return current
+
+
+def versions(namespaces):
+    """Return {namespace: version} for many namespaces with one cache read (plus one per namespace not seen yet)."""
+    keys = {VERSION_KEY.format(namespace): namespace for namespace in namespaces}
+    found = cache.get_many(keys)
+    return {namespace: found[key] if key in found else version(namespace) for key, namespace in keys.items()}
+
+
+def versioned_key(namespace, *parts):
+    """Return the cache key for parts in the current version of namespace."""
+    return ":".join([namespace, str(version(namespace))] + [str(part) for part in parts])
+
+
+def invalidate(*namespaces):
+    """Bump the version of each namespace, orphaning everything cached in it. Inside a transaction the versions are
+    bumped again once it commits, so data a concurrent request cached before the commit isn't read either."""
+    def bump():
+        for namespace in namespaces:
+            try:
+                cache.incr(VERSION_KEY.format(namespace))
+            except ValueError:
+                version(namespace)  # Not set yet, so nothing can be cached under it
+    bump()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(bump)
@@ -18,12 +18,18 @@ from django.urls import path, include
 from django.views.generic import TemplateView
 from inventory import views
 import golden_trays.urls
+import orders.urls
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', views.homepage, name="home"),
     path('inventory/', views.inventory_home, name='inventory_home'),
     path('inventory/overview/', views.inventory_overview, name='inventory_overview'),
+    path('inventory/overview/chart', views.inventory_chart_data, name='inventory_chart_data'),
+    path('inventory/as_of', views.inventory_history_snapshot, name='inventory_history_snapshot'),
+    path('inventory/forecast', views.inventory_forecast, name='inventory_forecast'),
+    path('inventory/actions', views.inventory_action_history, name='inventory_action_history'),
+    path('inventory/actions/export', views.inventory_action_export, name='inventory_action_export'),
     path('inventory/seed/', views.inventory_seed, name='inventory_seed'),
     path('inventory/harvest/bulk/', views.inventory_harvest_bulk, name='inventory_harvest_bulk'),
     path('inventory/harvest/variety/', views.inventory_harvest_variety, name='inventory_harvest_variety'),
@@ -34,6 +40,7 @@ urlpatterns = [
     path('growhouse_settings/', views.growhouse_settings, name="growhouse_settings"),
     path('crop/new/autofill', views.variety_autofill, name="variety_autofill"),
     path('crop/add_variety', views.add_variety, name="add_variety"),
+    path('growhouse_settings/capacity', views.rack_capacity, name="rack_capacity"),
     path('slot/set_qty', views.set_total_slot_quantity, name="set_total_slot_quantity"),
     path('sanitation_records/', views.sanitation_records, name='sanitation_records'),
     path('environment_data', views.environment_data, name="environment_data"),
@@ -44,5 +51,6 @@ urlpatterns = [
 urlpatterns += [
     path('accounts/', include('django.contrib.auth.urls')),
     path('logout/', TemplateView.as_view(template_name="registration/logout.html")),
-    path('', include(golden_trays.urls))
+    path('', include(golden_trays.urls)),
+    path('', include(orders.urls))
 ]
@@ -2,10 +2,20 @@ from django.contrib import admin
 from inventory.models import Variety, SanitationRecord, WeekdayRequirement, InventoryAction, KillReason, CropGroup
 from orders.models import TrayType, MicrogreenSize, Order, Product, LiveCropProduct, HarvestedCropProduct
 
+
+class InventoryActionAdmin(admin.ModelAdmin):
+    """Inventory actions are an append-only ledger, so the admin can only view them."""
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 admin.site.register(Variety)
 admin.site.register(SanitationRecord)
 admin.site.register(WeekdayRequirement)
-admin.site.register(InventoryAction)
+admin.site.register(InventoryAction, InventoryActionAdmin)
 admin.site.register(KillReason)
 admin.site.register(CropGroup)
 admin.site.register(Product)
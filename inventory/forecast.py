@@ -0,0 +1,77 @@
+"""Forecast of the trays that will reach harvest readiness each day.
+
+Trays become ready lead_time days after they are seeded. The forecast combines the trays already in house (the
+snapshot kept by inventory.ledger) with the trays the weekly plan will seed from tomorrow on, and bins both into a
+variety x day matrix with NumPy, so a six month forecast costs the same two or three queries as a one week one.
+Forecasts are cached until the in house trays, the plan or a variety's lead time change.
+"""
+from datetime import date, timedelta
+import numpy as np
+from django.core.cache import cache
+from grow_app.caching import version, versioned_key
+from inventory.histogram import load_in_house_arrays
+from inventory.ledger import IN_HOUSE_NAMESPACE
+from inventory.models import InHouseGroup, Variety
+from inventory.plan import PLAN_NAMESPACE, plan_array
+
+DEFAULT_WEEKS = 4
+
+
+def ready_matrix(lead_times, variety_index, ages, quantities, plan, first_weekday, days):
+    """Return a (len(lead_times), days) matrix of the trays of each variety that become ready on each day.
+
+    lead_times holds each variety's days to grow. The trays in house are given as the variety_index, ages (in days)
+    and quantities arrays of load_in_house_arrays(); trays that are already ready count on day 0. plan is a
+    (7, len(lead_times)) matrix of trays to seed on each weekday, starting with first_weekday, the weekday of day 0.
+    Plan seedings are counted from day 1, since today's seeding is recorded in house."""
+    variety_count = len(lead_times)
+    size = variety_count * days
+
+    # Trays in house
+    offsets = np.maximum(lead_times[variety_index] - ages, 0)
+    due = offsets < days
+    ready = np.bincount(variety_index[due] * days + offsets[due], weights=quantities[due], minlength=size)
+
+    # Trays the plan will seed
+    seed_days = np.arange(1, days)
+    seeded = plan[(first_weekday + seed_days) % 7]
+    offsets = seed_days[:, np.newaxis] + lead_times[np.newaxis, :]
+    cells = np.arange(variety_count)[np.newaxis, :] * days + offsets
+    due = offsets < days
+    ready += np.bincount(cells[due], weights=seeded[due], minlength=size)
+
+    return ready.astype(np.int64).reshape(variety_count, days)
+
+
+def build_forecast(weeks=DEFAULT_WEEKS, today=None):
+    """Forecast the next weeks (starting today) from the database. Returns (variety_names, ready) where ready is the
+    ready_matrix() of the varieties that have a lead time, in variety_names order."""
+    today = today or date.today()
+    varieties = list(Variety.objects.filter(lead_time__isnull=False).order_by('name')
+                     .values_list('id', 'name', 'lead_time'))
+    variety_ids = [variety_id for variety_id, name, lead_time in varieties]
+    lead_times = np.array([lead_time for variety_id, name, lead_time in varieties], dtype=np.int64)
+
+    rows = InHouseGroup.objects.filter(variety_id__in=variety_ids).values_list('variety_id', 'seed_date', 'quantity')
+    variety_index, ages, quantities = load_in_house_arrays(rows, variety_ids, today)
+
+    plan = plan_array(variety_ids)
+    ready = ready_matrix(lead_times, variety_index, ages, quantities, plan, today.weekday(), weeks * 7)
+    return [name for variety_id, name, lead_time in varieties], ready
+
+
+def forecast(weeks=DEFAULT_WEEKS, today=None):
+    """Return build_forecast(weeks, today), cached until the trays in house, the plan or the varieties change."""
+    today = today or date.today()
+    key = versioned_key(IN_HOUSE_NAMESPACE, 'forecast', version(PLAN_NAMESPACE), today.isoformat(), weeks)
+    result = cache.get(key)
+    if result is None:
+        result = build_forecast(weeks, today)
+        cache.set(key, result)
+    return result
+
+
+def forecast_dates(weeks=DEFAULT_WEEKS, today=None):
+    """Return the dates of the forecast's columns."""
+    today = today or date.today()
+    return [today + timedelta(days=day) for day in range(weeks * 7)]
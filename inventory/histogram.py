@@ -0,0 +1,59 @@
+"""Age-bucket histogram of the trays in house.
+
+The in house groups are pulled once as (variety, seed date, quantity) arrays and binned with NumPy, so any breakdown
+(three buckets or a bucket per day for two months) costs the same single query.
+"""
+from datetime import date
+import numpy as np
+from inventory.models import InHouseGroup
+
+
+def parse_breakdown(text):
+    """Parse a comma separated breakdown such as "10,20,30" into a sorted list of distinct positive day counts.
+    Raises ValueError if the text isn't a valid breakdown."""
+    days = sorted(set(int(day) for day in text.split(",") if day.strip()))
+    if not days or days[0] <= 0:
+        raise ValueError("A breakdown needs at least one positive number of days.")
+    return days
+
+
+def bucket_labels(breakdown):
+    """Return the chart legend label for each of the len(breakdown) + 1 age buckets."""
+    labels = ["< " + str(days) + " days" for days in breakdown]
+    labels.append(str(breakdown[-1]) + "+ days")
+    return labels
+
+
+def load_in_house_arrays(rows, variety_ids, today=None):
+    """Convert (variety_id, seed_date, quantity) rows into the arrays age_histogram() bins.
+
+    Returns (variety_index, ages, quantities) where variety_index is each row's position in variety_ids and ages
+    are in days. Rows for varieties not in variety_ids are dropped."""
+    today = (today or date.today()).toordinal()
+    position = {variety_id: i for i, variety_id in enumerate(variety_ids)}
+    rows = [row for row in rows if row[0] in position]
+    variety_index = np.fromiter((position[row[0]] for row in rows), dtype=np.int64, count=len(rows))
+    ages = today - np.fromiter((row[1].toordinal() for row in rows), dtype=np.int64, count=len(rows))
+    quantities = np.fromiter((row[2] for row in rows), dtype=np.int64, count=len(rows))
+    return variety_index, ages, quantities
+
+
+def age_histogram(variety_index, ages, quantities, breakdown, variety_count):
+    """Return a (variety_count, len(breakdown) + 1) matrix with the number of trays of each variety in each age
+    bucket. Bucket i holds ages in [breakdown[i-1], breakdown[i]); the last bucket is open ended. Groups with a
+    negative age (seeded in the future) aren't counted."""
+    bucket_count = len(breakdown) + 1
+    seeded = ages >= 0
+    buckets = np.digitize(ages[seeded], breakdown)
+    cells = variety_index[seeded] * bucket_count + buckets
+    counts = np.bincount(cells, weights=quantities[seeded], minlength=variety_count * bucket_count)
+    return counts.astype(np.int64).reshape(variety_count, bucket_count)
+
+
+def in_house_histogram(variety_ids, breakdown, rows=None, today=None):
+    """Bin the in house groups of the given varieties by age. rows can be passed in when the caller has already
+    fetched InHouseGroup (variety_id, seed_date, quantity) rows, otherwise they are fetched with one query."""
+    if rows is None:
+        rows = InHouseGroup.objects.values_list('variety_id', 'seed_date', 'quantity')
+    variety_index, ages, quantities = load_in_house_arrays(rows, variety_ids, today)
+    return age_histogram(variety_index, ages, quantities, breakdown, len(variety_ids))
@@ -0,0 +1,112 @@
+"""Filtered, keyset-paginated access to the InventoryAction ledger.
+
+Pages are ordered newest first on (date, id) and continue from a cursor rather than an offset, so every page costs
+the same index range scan no matter how deep into the history it is. Each page loads its varieties with a join and
+its kill reasons with one prefetch query, so the number of queries doesn't grow with the page size.
+"""
+import csv
+from dateutil import parser
+from django.db.models import Q
+from inventory.models import InventoryAction
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+EXPORT_CHUNK_SIZE = 2000
+
+CSV_HEADER = ['id', 'date', 'action_type', 'variety', 'seed_date', 'quantity', 'harvest_yield', 'kill_reasons', 'note']
+
+
+def parse_cursor(cursor):
+    """Parse a "YYYY-MM-DD:id" cursor into a (date, id) tuple. Raises ValueError if the cursor is malformed."""
+    day, separator, action_id = cursor.rpartition(":")
+    if not separator:
+        raise ValueError("Invalid cursor: " + cursor)
+    return parser.isoparse(day).date(), int(action_id)
+
+
+def format_cursor(action):
+    """Return the cursor that continues a page after action."""
+    return action.date.isoformat() + ":" + str(action.id)
+
+
+def filtered_actions(variety=None, action_type=None, start=None, end=None):
+    """Return the InventoryActions matching the given filters, newest first. variety is a variety name and start and
+    end are inclusive dates; filters that are None aren't applied."""
+    actions = InventoryAction.objects.order_by('-date', '-id')
+    if variety is not None:
+        actions = actions.filter(variety__name=variety)
+    if action_type is not None:
+        actions = actions.filter(action_type=action_type)
+    if start is not None:
+        actions = actions.filter(date__gte=start)
+    if end is not None:
+        actions = actions.filter(date__lte=end)
+    return actions
+
+
+def action_page(actions, after=None, limit=PAGE_SIZE):
+    """Return (page, next_cursor) for the actions queryset: at most limit actions that come after the (date, id)
+    cursor, with their variety and kill reasons loaded, and the cursor of the following page (None on the last)."""
+    if after is not None:
+        day, action_id = after
+        actions = actions.filter(Q(date__lt=day) | Q(date=day, id__lt=action_id))
+    page = list(actions.select_related('variety').prefetch_related('kill_reasons')[:limit + 1])
+    if len(page) > limit:
+        return page[:limit], format_cursor(page[limit - 1])
+    return page, None
+
+
+def iter_actions(actions, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield every action in the actions queryset, fetching chunk_size at a time by keyset so only one chunk is held
+    in memory."""
+    after = None
+    while True:
+        page, cursor = action_page(actions, after, chunk_size)
+        yield from page
+        if cursor is None:
+            return
+        after = (page[-1].date, page[-1].id)
+
+
+def describe(action):
+    """Return a one line description of an action, such as "Harvested: 3 trays of Basil."."""
+    text = action.get_action_type_display() + ": " + str(action.quantity) + " trays of " + action.variety.name
+    if action.action_type == 'KILL':
+        text += " because of " + ", ".join(reason.name for reason in action.kill_reasons.all())
+    return text + "."
+
+
+def action_json(action):
+    """Return the JSON representation of an action used by the history API."""
+    return {'id': action.id,
+            'date': action.date.isoformat(),
+            'action_type': action.action_type,
+            'variety': action.variety.name,
+            'seed_date': action.seed_date.isoformat() if action.seed_date else None,
+            'quantity': action.quantity,
+            'harvest_yield': action.harvest_yield,
+            'kill_reasons': [reason.name for reason in action.kill_reasons.all()],
+            'note': action.note,
+            'description': describe(action)}
+
+
+def action_csv_row(action):
+    """Return the CSV_HEADER columns of an action."""
+    return [action.id, action.date.isoformat(), action.action_type, action.variety.name,
+            action.seed_date.isoformat() if action.seed_date else "", action.quantity,
+            "" if action.harvest_yield is None else action.harvest_yield,
+            ";".join(reason.name for reason in action.kill_reasons.all()), action.note or ""]
+
+
+class Echo:
+    """File-like object whose write() returns what it's given, so csv.writer can format rows for streaming."""
+    def write(self, value):
+        return value
+
+
+def csv_lines(actions):
+    """Yield the CSV export of the actions queryset line by line, header first."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for action in iter_actions(actions):
+        yield writer.writerow(action_csv_row(action))
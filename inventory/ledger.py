@@ -0,0 +1,335 @@
+"""Every change to the number of trays in house goes through this module, so that the CropGroup, its InventoryAction
+and the in house snapshot (InHouseGroup/InHouseTotal) are always written together in one transaction."""
+from datetime import date, timedelta
+import json
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max, Q, Sum
+from django.db.models.functions import Coalesce
+from grow_app.caching import invalidate
+from inventory.models import CropGroup, InventoryAction, InventoryCheckpoint, InHouseGroup, InHouseTotal
+
+# Cache namespace of everything derived from the trays in house, invalidated by every snapshot write
+IN_HOUSE_NAMESPACE = 'inventory-in-house'
+# Rows per UPDATE when crop groups are rewritten in bulk
+BATCH_SIZE = 500
+
+
+class NotEnoughTrays(Exception):
+    """Raised when a harvest or kill asks for more trays than its crop group holds. available is the number of trays
+    in the crop group, or None if there is no crop group for that variety and seed date."""
+    def __init__(self, available):
+        super().__init__(available)
+        self.available = available
+
+
+def increment(model, delta, **lookup):
+    """Add delta to the quantity of the model row matching lookup with a single UPDATE, creating the row if needed."""
+    if model.objects.filter(**lookup).update(quantity=F('quantity') + delta):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(quantity=delta, **lookup)
+    except IntegrityError:
+        # Another request created the row in the meantime
+        model.objects.filter(**lookup).update(quantity=F('quantity') + delta)
+
+
+class BatchRejected(Exception):
+    """Raised when some lines of a batch can't be applied, in which case none of the batch is written. shortfalls
+    maps the index of each failing line to the trays available for it (None if its crop group doesn't exist)."""
+    def __init__(self, shortfalls):
+        super().__init__(shortfalls)
+        self.shortfalls = shortfalls
+
+
+def locked_rows(model, fields, keys):
+    """Lock and return the model rows whose values for fields are one of the keys tuples, keyed the same way, with
+    one SELECT ... FOR UPDATE."""
+    candidates = model.objects.select_for_update().filter(**{field + '__in': {key[i] for key in keys}
+                                                              for i, field in enumerate(fields)})
+    rows = {}
+    for row in candidates:
+        key = tuple(getattr(row, field) for field in fields)
+        if key in keys:
+            rows[key] = row
+    return rows
+
+
+def bulk_increment(model, fields, deltas):
+    """Add each delta to the quantity of the model row whose values for fields match its key in three queries,
+    creating the rows that don't exist yet. deltas maps key tuples to changes, e.g. {(variety_id, seed_date): 3}.
+    The rows are locked before they are read so concurrent changes can't be lost."""
+    model.objects.bulk_create([model(quantity=0, **dict(zip(fields, key))) for key in deltas], ignore_conflicts=True)
+    rows = locked_rows(model, fields, deltas)
+    for key, row in rows.items():
+        row.quantity += deltas[key]
+    model.objects.bulk_update(rows.values(), ['quantity'])
+
+
+def bulk_update_snapshot(deltas):
+    """Apply deltas, a mapping of (variety_id, seed_date) to changes in trays, to the in house snapshot with a
+    constant number of queries."""
+    totals = {}
+    for (variety_id, seed_date), delta in deltas.items():
+        totals[(variety_id,)] = totals.get((variety_id,), 0) + delta
+    bulk_increment(InHouseGroup, ('variety_id', 'seed_date'), deltas)
+    bulk_increment(InHouseTotal, ('variety_id',), totals)
+    if any(delta < 0 for delta in deltas.values()):
+        InHouseGroup.objects.filter(variety_id__in=[key[0] for key in totals], quantity__lte=0).delete()
+    invalidate(IN_HOUSE_NAMESPACE)
+
+
+def update_snapshot(variety_id, seed_date, delta):
+    """Add delta trays to the in house snapshot of a variety and seed date. Must be called inside the transaction
+    that changes the matching CropGroup."""
+    if not delta:
+        return
+    increment(InHouseGroup, delta, variety_id=variety_id, seed_date=seed_date)
+    increment(InHouseTotal, delta, variety_id=variety_id)
+    if delta < 0:
+        # Emptied groups are dropped so the snapshot only ever holds what is actually in house
+        InHouseGroup.objects.filter(variety_id=variety_id, seed_date=seed_date, quantity__lte=0).delete()
+    invalidate(IN_HOUSE_NAMESPACE)
+
+
+def record_seed(variety, seed_date, quantity):
+    """Add quantity trays to the variety's CropGroup for seed_date and record the SEED action."""
+    with transaction.atomic():
+        increment(CropGroup, quantity, variety_id=variety.id, seed_date=seed_date)
+        action = InventoryAction.objects.create(variety=variety, date=seed_date, seed_date=seed_date,
+                                                action_type='SEED', quantity=quantity)
+        update_snapshot(variety.id, seed_date, quantity)
+    return action
+
+
+def record_seeding(seed_date, quantities):
+    """Seed a whole seeding sheet at once. quantities maps each Variety to the number of trays seeded on seed_date.
+
+    The crop groups, SEED actions and snapshot are written with bulk queries in one transaction, so the number of
+    queries doesn't depend on the number of varieties. seed_date must be a date."""
+    deltas = {(variety.id, seed_date): quantity for variety, quantity in quantities.items() if quantity}
+    if not deltas:
+        return []
+    with transaction.atomic():
+        bulk_increment(CropGroup, ('variety_id', 'seed_date'), deltas)
+        actions = InventoryAction.objects.bulk_create([
+            InventoryAction(variety_id=variety_id, date=seed_date, seed_date=seed_date, action_type='SEED',
+                            quantity=quantity) for (variety_id, seed_date), quantity in deltas.items()])
+        bulk_update_snapshot(deltas)
+    return actions
+
+
+def record_removals(lines, action_type, date, harvest_yield=None, kill_reasons=()):
+    """Harvest or kill a batch of lines, (variety_id, seed_date, quantity) tuples, all or nothing.
+
+    A line with a seed_date (a date) comes out of that crop group. A line whose seed_date is None is allocated to the
+    variety's oldest non-empty crop groups first. Every crop group involved is loaded and locked in one query and
+    each line is checked against what is left of them. If any line asks for more trays than are available
+    BatchRejected is raised with every failing line and nothing is written. Otherwise the decrements, one action per
+    crop group each line touched and the snapshot are written with bulk queries in one transaction.
+
+    harvest_yield is split between the actions in proportion to their trays; kill_reasons are added to every action.
+    Returns the new actions."""
+    if not lines:
+        return []
+    exact = {(variety_id, seed_date) for variety_id, seed_date, quantity in lines if seed_date is not None}
+    oldest_first = {variety_id for variety_id, seed_date, quantity in lines if seed_date is None}
+    with transaction.atomic():
+        crop_groups = CropGroup.objects.select_for_update().filter(
+            Q(variety_id__in=oldest_first, quantity__gt=0) |
+            Q(variety_id__in={key[0] for key in exact}, seed_date__in={key[1] for key in exact})).order_by('seed_date')
+        remaining = {}
+        by_variety = {}
+        for crop_group in crop_groups:
+            key = (crop_group.variety_id, crop_group.seed_date)
+            remaining[key] = crop_group
+            by_variety.setdefault(crop_group.variety_id, []).append(crop_group)
+
+        # Lines with a seed date get their own crop group before the oldest-first lines share out what is left
+        taken = []
+        shortfalls = {}
+        order = sorted(range(len(lines)), key=lambda i: lines[i][1] is None)
+        for i in order:
+            variety_id, seed_date, quantity = lines[i]
+            if seed_date is not None:
+                crop_group = remaining.get((variety_id, seed_date))
+                if crop_group is None or crop_group.quantity < quantity:
+                    shortfalls[i] = crop_group.quantity if crop_group else None
+                    continue
+                allocation = [(crop_group, quantity)]
+            else:
+                available = sum(crop_group.quantity for crop_group in by_variety.get(variety_id, []))
+                if available < quantity:
+                    shortfalls[i] = available
+                    continue
+                allocation = []
+                left = quantity
+                for crop_group in by_variety[variety_id]:
+                    if left == 0:
+                        break
+                    if crop_group.quantity > 0:
+                        allocation.append((crop_group, min(crop_group.quantity, left)))
+                        left -= allocation[-1][1]
+            for crop_group, trays in allocation:
+                crop_group.quantity -= trays
+                taken.append((crop_group, trays))
+        if shortfalls:
+            raise BatchRejected(shortfalls)
+
+        CropGroup.objects.bulk_update({crop_group for crop_group, trays in taken}, ['quantity'])
+        total = sum(trays for crop_group, trays in taken)
+        actions = [InventoryAction(variety_id=crop_group.variety_id, action_type=action_type, date=date,
+                                   seed_date=crop_group.seed_date, quantity=trays,
+                                   harvest_yield=harvest_yield * trays / total if harvest_yield is not None else None)
+                   for crop_group, trays in taken]
+        if kill_reasons:
+            # Kill reasons need the actions' ids, which bulk_create doesn't return on every database
+            for action in actions:
+                action.save()
+            InventoryAction.kill_reasons.through.objects.bulk_create([
+                InventoryAction.kill_reasons.through(inventoryaction_id=action.id, killreason_id=reason.id)
+                for action in actions for reason in kill_reasons])
+        else:
+            actions = InventoryAction.objects.bulk_create(actions)
+        deltas = {}
+        for crop_group, trays in taken:
+            key = (crop_group.variety_id, crop_group.seed_date)
+            deltas[key] = deltas.get(key, 0) - trays
+        bulk_update_snapshot(deltas)
+    return actions
+
+
+def record_removal(variety, seed_date, quantity, action_type, date, harvest_yield=None, kill_reasons=()):
+    """Take quantity trays of variety seeded on seed_date out of house and record the HARVEST or KILL action.
+
+    The availability check and the decrement are a single conditional UPDATE, so concurrent harvests of the same
+    crop group can't overdraw it or overwrite each other. Raises NotEnoughTrays if the group doesn't hold quantity
+    trays, in which case nothing is written.
+
+    If seed_date is None the trays are taken from the variety's oldest crop groups first, recording one action per
+    crop group, and the last action is returned."""
+    if seed_date is None:
+        try:
+            actions = record_removals([(variety.id, None, quantity)], action_type, date, harvest_yield, kill_reasons)
+        except BatchRejected as e:
+            raise NotEnoughTrays(e.shortfalls[0])
+        return actions[-1]
+    with transaction.atomic():
+        crop_groups = CropGroup.objects.filter(variety=variety, seed_date=seed_date)
+        if not crop_groups.filter(quantity__gte=quantity).update(quantity=F('quantity') - quantity):
+            raise NotEnoughTrays(crop_groups.values_list('quantity', flat=True).first())
+        action = InventoryAction.objects.create(variety=variety, action_type=action_type, date=date,
+                                                seed_date=seed_date, quantity=quantity, harvest_yield=harvest_yield)
+        if kill_reasons:
+            action.kill_reasons.add(*kill_reasons)
+        update_snapshot(variety.id, seed_date, -quantity)
+    return action
+
+
+def replay(groups, actions):
+    """Fold a queryset of InventoryActions into groups, a mapping of (variety_id, seed_date) to trays in house, using
+    two grouped queries. Returns the number of trays that had to be allocated to the oldest groups first because
+    their HARVEST or KILL action was recorded before actions carried a seed date."""
+    seeds = actions.filter(action_type='SEED').annotate(day=Coalesce('seed_date', 'date')) \
+        .values('variety_id', 'day').annotate(total=Sum('quantity')).order_by()
+    for row in seeds:
+        key = (row['variety_id'], row['day'])
+        groups[key] = groups.get(key, 0) + (row['total'] or 0)
+
+    legacy_removals = {}
+    removals = actions.exclude(action_type='SEED').values('variety_id', 'seed_date') \
+        .annotate(total=Sum('quantity')).order_by()
+    for row in removals:
+        if row['seed_date'] is None:
+            legacy_removals[row['variety_id']] = row['total'] or 0
+        else:
+            key = (row['variety_id'], row['seed_date'])
+            groups[key] = groups.get(key, 0) - (row['total'] or 0)
+
+    unattributed = 0
+    for variety_id, remaining in legacy_removals.items():
+        unattributed += remaining
+        for key in sorted(key for key in groups if key[0] == variety_id):
+            if remaining <= 0:
+                break
+            taken = min(groups[key], remaining)
+            if taken > 0:
+                groups[key] -= taken
+                remaining -= taken
+    return unattributed
+
+
+def latest_checkpoint(as_of=None):
+    """Return the most recent InventoryCheckpoint taken at or before as_of (or at all), or None."""
+    checkpoints = InventoryCheckpoint.objects.order_by('-as_of', '-last_action_id')
+    if as_of is not None:
+        checkpoints = checkpoints.filter(as_of__lte=as_of)
+    return checkpoints.first()
+
+
+def inventory_as_of(as_of=None, last_action_id=None):
+    """Work out what was in house at the end of as_of (or now) from the ledger alone.
+
+    Replays start from the latest checkpoint, so only the actions dated after it, plus any back-dated actions
+    recorded since it was taken, are read. Both are range scans on the (date, id) index. Returns (groups,
+    unattributed), see replay()."""
+    checkpoint = latest_checkpoint(as_of)
+    if checkpoint is None:
+        groups = {}
+        actions = InventoryAction.objects.all()
+    else:
+        groups = checkpoint.load()
+        actions = InventoryAction.objects.filter(Q(date__gt=checkpoint.as_of) |
+                                                 Q(date__lte=checkpoint.as_of, id__gt=checkpoint.last_action_id))
+    if as_of is not None:
+        actions = actions.filter(date__lte=as_of)
+    if last_action_id is not None:
+        actions = actions.filter(id__lte=last_action_id)
+    unattributed = replay(groups, actions)
+    return {key: quantity for key, quantity in groups.items() if quantity}, unattributed
+
+
+def create_checkpoint(as_of=None):
+    """Checkpoint the ledger at the end of as_of, yesterday by default so that today's actions are still replayed.
+    Built from the previous checkpoint, so taking one regularly keeps both checkpoints and replays cheap."""
+    as_of = as_of or date.today() - timedelta(days=1)
+    with transaction.atomic():
+        last_action_id = InventoryAction.objects.aggregate(last=Max('id'))['last'] or 0
+        groups, unattributed = inventory_as_of(as_of, last_action_id)
+        state = {}
+        for (variety_id, seed_date), quantity in groups.items():
+            state.setdefault(str(variety_id), {})[seed_date.isoformat()] = quantity
+        return InventoryCheckpoint.objects.create(as_of=as_of, last_action_id=last_action_id, state=json.dumps(state))
+
+
+def rebuild_crop_groups(groups):
+    """Rewrite CropGroup quantities to match groups, a mapping of (variety_id, seed_date) to trays in house, with one
+    read and bulk writes of the groups that change."""
+    with transaction.atomic():
+        changed, existing = [], set()
+        for crop_group in CropGroup.objects.all():
+            existing.add((crop_group.variety_id, crop_group.seed_date))
+            quantity = max(groups.get((crop_group.variety_id, crop_group.seed_date), 0), 0)
+            if crop_group.quantity != quantity:
+                crop_group.quantity = quantity
+                changed.append(crop_group)
+        CropGroup.objects.bulk_update(changed, ['quantity'], batch_size=BATCH_SIZE)
+        CropGroup.objects.bulk_create([CropGroup(variety_id=variety_id, seed_date=seed_date, quantity=quantity)
+                                       for (variety_id, seed_date), quantity in groups.items()
+                                       if quantity > 0 and (variety_id, seed_date) not in existing])
+
+
+def rebuild_snapshot(groups):
+    """Replace the in house snapshot with groups, a mapping of (variety_id, seed_date) to trays in house."""
+    groups = {key: quantity for key, quantity in groups.items() if quantity > 0}
+    totals = {}
+    for (variety_id, seed_date), quantity in groups.items():
+        totals[variety_id] = totals.get(variety_id, 0) + quantity
+    with transaction.atomic():
+        InHouseGroup.objects.all().delete()
+        InHouseTotal.objects.all().delete()
+        InHouseGroup.objects.bulk_create([InHouseGroup(variety_id=variety_id, seed_date=seed_date, quantity=quantity)
+                                          for (variety_id, seed_date), quantity in groups.items()])
+        InHouseTotal.objects.bulk_create([InHouseTotal(variety_id=variety_id, quantity=quantity)
+                                          for variety_id, quantity in totals.items()])
+        invalidate(IN_HOUSE_NAMESPACE)
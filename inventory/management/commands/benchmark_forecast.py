@@ -0,0 +1,45 @@
+from time import perf_counter
+import numpy as np
+from django.core.management.base import BaseCommand
+from inventory.capacity import occupancy_intervals, sweep_occupancy
+from inventory.forecast import ready_matrix
+
+
+class Command(BaseCommand):
+    help = "Time the harvest readiness forecast and the rack capacity simulation on synthetic crop groups and plans " \
+           "(no database access)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--weeks', type=int, default=26, help="Number of weeks to forecast.")
+        parser.add_argument('--varieties', type=int, default=35, help="Number of varieties.")
+        parser.add_argument('--groups', type=int, default=1000, help="Number of crop groups in house.")
+        parser.add_argument('--repeat', type=int, default=20, help="Number of timed runs.")
+
+    def handle(self, *args, **options):
+        varieties = options['varieties']
+        groups = options['groups']
+        random = np.random.RandomState(0)
+        lead_times = random.randint(7, 30, size=varieties)
+        variety_index = random.randint(0, varieties, size=groups)
+        ages = random.randint(0, 30, size=groups)
+        quantities = random.randint(1, 30, size=groups)
+        plan = random.randint(0, 20, size=(7, varieties))
+
+        days = options['weeks'] * 7
+
+        def forecast():
+            return ready_matrix(lead_times, variety_index, ages, quantities, plan, 0, days).sum()
+
+        def capacity():
+            intervals = occupancy_intervals(lead_times, variety_index, ages, quantities, plan, 0, days)
+            return sweep_occupancy(*intervals, days).max()
+
+        for name, run, unit in [("forecast", forecast, "trays ready"), ("capacity", capacity, "peak slots")]:
+            timings = []
+            for _ in range(options['repeat']):
+                start = perf_counter()
+                result = run()
+                timings.append(perf_counter() - start)
+            self.stdout.write("%s, %d weeks x %d varieties: best %.2f ms, median %.2f ms over %d runs (%d %s)" % (
+                name, options['weeks'], varieties, min(timings) * 1000, float(np.median(timings)) * 1000,
+                len(timings), result, unit))
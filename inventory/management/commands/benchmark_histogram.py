@@ -0,0 +1,33 @@
+from time import perf_counter
+import numpy as np
+from django.core.management.base import BaseCommand
+from inventory.histogram import age_histogram
+
+
+class Command(BaseCommand):
+    help = "Time the in house age histogram on synthetic crop groups (no database access)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--groups', type=int, default=100000, help="Number of crop groups to bin.")
+        parser.add_argument('--varieties', type=int, default=35, help="Number of varieties.")
+        parser.add_argument('--repeat', type=int, default=20, help="Number of timed runs per breakdown.")
+
+    def handle(self, *args, **options):
+        groups = options['groups']
+        varieties = options['varieties']
+        random = np.random.RandomState(0)
+        variety_index = random.randint(0, varieties, size=groups)
+        ages = random.randint(-5, 400, size=groups)
+        quantities = random.randint(1, 30, size=groups)
+
+        breakdowns = [("3 buckets", [10, 20, 30]),
+                      ("daily for 60 days", list(range(1, 61))),
+                      ("daily for a year", list(range(1, 366)))]
+        for name, breakdown in breakdowns:
+            timings = []
+            for _ in range(options['repeat']):
+                start = perf_counter()
+                histogram = age_histogram(variety_index, ages, quantities, breakdown, varieties)
+                timings.append(perf_counter() - start)
+            self.stdout.write("%s: best %.2f ms, median %.2f ms over %d runs (%d trays binned)" % (
+                name, min(timings) * 1000, float(np.median(timings)) * 1000, len(timings), histogram.sum()))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from dateutil import parser as date_parser
+from inventory.ledger import create_checkpoint
+
+
+class Command(BaseCommand):
+    help = "Checkpoint the inventory ledger so replays start from here. Meant to be run daily by a scheduler."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--as-of', help="Date to checkpoint at the end of (defaults to yesterday).")
+
+    def handle(self, *args, **options):
+        as_of = date_parser.parse(options['as_of']).date() if options['as_of'] else None
+        checkpoint = create_checkpoint(as_of)
+        self.stdout.write(self.style.SUCCESS("Checkpointed the inventory as of %s (through action %d)."
+                                             % (checkpoint.as_of, checkpoint.last_action_id)))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from inventory.ledger import inventory_as_of, rebuild_crop_groups, rebuild_snapshot
+from inventory.models import CropGroup, InHouseGroup, Variety
+
+
+class Command(BaseCommand):
+    help = "Rebuild the in house inventory snapshot from the InventoryAction ledger and report any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without rewriting the snapshot.")
+        parser.add_argument('--crop-groups', action='store_true',
+                            help="Also rewrite the CropGroup quantities from the ledger.")
+
+    def handle(self, *args, **options):
+        ledger, unattributed = inventory_as_of()
+        ledger = {key: quantity for key, quantity in ledger.items() if quantity > 0}
+        snapshot = {(row['variety_id'], row['seed_date']): row['quantity']
+                    for row in InHouseGroup.objects.values('variety_id', 'seed_date', 'quantity')}
+        crop_groups = {(row['variety_id'], row['seed_date']): row['total']
+                       for row in CropGroup.objects.values('variety_id', 'seed_date').annotate(total=Sum('quantity'))
+                       if row['total']}
+        names = dict(Variety.objects.values_list('id', 'name'))
+
+        drift = 0
+        for key in sorted(set(ledger) | set(snapshot) | set(crop_groups), key=lambda k: (names.get(k[0], ''), k[1])):
+            expected = ledger.get(key, 0)
+            if snapshot.get(key, 0) != expected or crop_groups.get(key, 0) != expected:
+                drift += 1
+                self.stdout.write("%s seeded %s: ledger %d, snapshot %d, crop group %d" % (
+                    names.get(key[0], key[0]), key[1], expected, snapshot.get(key, 0), crop_groups.get(key, 0)))
+
+        if unattributed:
+            self.stdout.write("%d harvested or killed trays had no seed date and were taken from the oldest groups."
+                              % unattributed)
+        if drift:
+            self.stdout.write(self.style.WARNING("Found drift in %d crop group(s)." % drift))
+        else:
+            self.stdout.write(self.style.SUCCESS("No drift found."))
+
+        if not options['dry_run']:
+            rebuild_snapshot(ledger)
+            self.stdout.write(self.style.SUCCESS("Rebuilt the snapshot from %d crop group(s)." % len(ledger)))
+            if options['crop_groups']:
+                rebuild_crop_groups(ledger)
+                self.stdout.write(self.style.SUCCESS("Rebuilt the crop groups from the ledger."))
@@ -0,0 +1,62 @@
+from datetime import date
+from threading import Lock, Thread
+from uuid import uuid4
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from inventory.ledger import NotEnoughTrays, record_removal, record_seed
+from inventory.models import CropGroup, InHouseTotal, InventoryAction, Variety
+
+
+class Command(BaseCommand):
+    help = "Fire parallel single tray harvests at one crop group, then check that the crop group, the snapshot and " \
+           "the ledger still agree. This writes to the configured database, so run it against a local one."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help="Number of concurrent harvesters.")
+        parser.add_argument('--harvests', type=int, default=25, help="Harvests attempted by each harvester.")
+        parser.add_argument('--trays', type=int, default=300, help="Trays seeded before the harvests start.")
+        parser.add_argument('--keep', action='store_true', help="Keep the test variety and its actions afterwards.")
+
+    def handle(self, *args, **options):
+        variety = Variety.objects.create(name="Stress test " + uuid4().hex[:8])
+        seed_date = date.today()
+        record_seed(variety, seed_date, options['trays'])
+        outcomes = {'harvested': 0, 'refused': 0}
+        lock = Lock()
+
+        def harvester():
+            try:
+                for _ in range(options['harvests']):
+                    try:
+                        record_removal(variety, seed_date, 1, 'HARVEST', seed_date)
+                        outcome = 'harvested'
+                    except NotEnoughTrays:
+                        outcome = 'refused'
+                    with lock:
+                        outcomes[outcome] += 1
+            finally:
+                connection.close()
+
+        threads = [Thread(target=harvester) for _ in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        try:
+            quantity = CropGroup.objects.get(variety=variety, seed_date=seed_date).quantity
+            snapshot = InHouseTotal.objects.get(variety=variety).quantity
+            harvested = InventoryAction.objects.filter(variety=variety, action_type='HARVEST') \
+                .aggregate(total=Sum('quantity'))['total'] or 0
+            self.stdout.write("%d harvests succeeded and %d were refused." % (outcomes['harvested'], outcomes['refused']))
+            self.stdout.write("Crop group: %d, snapshot: %d, ledger: %d seeded - %d harvested."
+                              % (quantity, snapshot, options['trays'], harvested))
+            expected = options['trays'] - outcomes['harvested']
+            if harvested != outcomes['harvested'] or not quantity == snapshot == expected or quantity < 0:
+                raise CommandError("The crop group, snapshot and ledger don't agree.")
+            self.stdout.write(self.style.SUCCESS("The crop group, snapshot and ledger agree."))
+        finally:
+            if not options['keep']:
+                InventoryAction.objects.filter(variety=variety).delete()
+                variety.delete()
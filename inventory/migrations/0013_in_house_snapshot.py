@@ -0,0 +1,55 @@
+# Generated by Django 2.2.28 on 2026-10-18 08:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_snapshot(apps, schema_editor):
+    """Seed the in house snapshot from the current non-empty CropGroups."""
+    CropGroup = apps.get_model('inventory', 'CropGroup')
+    InHouseGroup = apps.get_model('inventory', 'InHouseGroup')
+    InHouseTotal = apps.get_model('inventory', 'InHouseTotal')
+    totals = {}
+    groups = []
+    for row in CropGroup.objects.exclude(quantity=0).values('variety_id', 'seed_date').annotate(total=models.Sum('quantity')):
+        groups.append(InHouseGroup(variety_id=row['variety_id'], seed_date=row['seed_date'], quantity=row['total']))
+        totals[row['variety_id']] = totals.get(row['variety_id'], 0) + row['total']
+    InHouseGroup.objects.bulk_create(groups)
+    InHouseTotal.objects.bulk_create([InHouseTotal(variety_id=variety_id, quantity=quantity)
+                                      for variety_id, quantity in totals.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_auto_20191017_1526'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventoryaction',
+            name='seed_date',
+            field=models.DateField(null=True),
+        ),
+        migrations.CreateModel(
+            name='InHouseTotal',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=0)),
+                ('variety', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='in_house_total', to='inventory.Variety')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='InHouseGroup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seed_date', models.DateField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('variety', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='in_house_groups', to='inventory.Variety')),
+            ],
+            options={
+                'unique_together': {('variety', 'seed_date')},
+            },
+        ),
+        migrations.RunPython(populate_snapshot, migrations.RunPython.noop),
+    ]
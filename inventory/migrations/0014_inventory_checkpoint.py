@@ -0,0 +1,33 @@
+# Generated by Django 2.2.28 on 2026-10-18 08:45
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0013_in_house_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateField(db_index=True)),
+                ('last_action_id', models.IntegerField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('state', models.TextField()),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='inventoryaction',
+            name='date',
+            field=models.DateField(default=datetime.date.today),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryaction',
+            index=models.Index(fields=['date', 'id'], name='inventory_i_date_8f8a59_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.2.28 on 2026-10-18 08:47
+
+from django.db import migrations, models
+
+
+def merge_duplicate_crop_groups(apps, schema_editor):
+    """Fold CropGroups that share a variety and seed date into one before they are made unique."""
+    CropGroup = apps.get_model('inventory', 'CropGroup')
+    duplicates = CropGroup.objects.values('variety_id', 'seed_date') \
+        .annotate(count=models.Count('id'), total=models.Sum('quantity')).filter(count__gt=1)
+    for row in duplicates:
+        crop_groups = CropGroup.objects.filter(variety_id=row['variety_id'], seed_date=row['seed_date']).order_by('id')
+        keep = crop_groups.first()
+        crop_groups.exclude(id=keep.id).delete()
+        CropGroup.objects.filter(id=keep.id).update(quantity=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0014_inventory_checkpoint'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_crop_groups, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='cropgroup',
+            unique_together={('variety', 'seed_date')},
+        ),
+    ]
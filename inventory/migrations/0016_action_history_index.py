@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-18 08:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0015_unique_crop_group'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventoryaction',
+            index=models.Index(fields=['variety', 'date', 'id'], name='inventory_i_variety_b5e21a_idx'),
+        ),
+    ]
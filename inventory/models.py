@@ -1,3 +1,5 @@
+from datetime import date, datetime
+import json
 from django.db import models
 
 class Variety(models.Model):
@@ -36,6 +38,26 @@ class CropGroup(models.Model):
     quantity = models.IntegerField(default=0)
     seed_date = models.DateField()
 
+    class Meta:
+        unique_together = ['variety', 'seed_date']
+
+
+class InHouseGroup(models.Model):
+    """Materialized snapshot of the trays of a variety with a given seed date that are still in house. Kept in step
+    with CropGroup by inventory.ledger; rows are deleted once they reach zero so reads never scan emptied groups."""
+    variety = models.ForeignKey(Variety, on_delete=models.CASCADE, related_name='in_house_groups')
+    seed_date = models.DateField()
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['variety', 'seed_date']
+
+
+class InHouseTotal(models.Model):
+    """Materialized snapshot of the total number of trays of a variety that are in house."""
+    variety = models.OneToOneField(Variety, on_delete=models.CASCADE, related_name='in_house_total')
+    quantity = models.IntegerField(default=0)
+
 
 class WeekdayRequirement(models.Model):
     DAYS_OF_WEEK = (
@@ -60,6 +82,8 @@ class KillReason(models.Model):
     name = models.CharField(max_length=200)
 
 class InventoryAction(models.Model):
+    """Append-only ledger entry for a change to the trays in house. CropGroup quantities can always be rebuilt by
+    replaying these (see inventory.ledger); mistakes are corrected by recording new actions, never by editing."""
     ACTION_TYPES = (
         ('SEED', 'Seeded'),
         ('HARVEST', 'Harvested'),
@@ -67,10 +91,39 @@ class InventoryAction(models.Model):
     )
 
     variety = models.ForeignKey(Variety, on_delete=models.DO_NOTHING)
-    date = models.DateField(auto_now_add=True)
+    date = models.DateField(default=date.today)
     action_type = models.CharField(max_length=10, choices=ACTION_TYPES)
+    seed_date = models.DateField(null=True)  # Seed date of the CropGroup the action was applied to
     quantity = models.IntegerField(default=0, null=True)
     data = models.CharField(max_length=1000, null=True) # encode as a JSON with json.dumps({k:v,...})
     harvest_yield = models.FloatField(null=True)
     note = models.CharField(max_length=200, null=True)
-    kill_reasons = models.ManyToManyField(KillReason, null=True) # on_delete=models.CASCADE
\ No newline at end of file
+    kill_reasons = models.ManyToManyField(KillReason, null=True) # on_delete=models.CASCADE
+
+    class Meta:
+        indexes = [models.Index(fields=['date', 'id']), models.Index(fields=['variety', 'date', 'id'])]
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("Inventory actions can't be changed once they are recorded.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Inventory actions can't be deleted once they are recorded.")
+
+
+class InventoryCheckpoint(models.Model):
+    """The trays in house at the end of as_of, folded from every InventoryAction up to last_action_id. Ledger replays
+    start from the latest checkpoint instead of the first action."""
+    as_of = models.DateField(db_index=True)
+    last_action_id = models.IntegerField()
+    created = models.DateTimeField(auto_now_add=True)
+    state = models.TextField() # encode as a JSON with json.dumps({variety_id: {seed_date: quantity}})
+
+    def load(self):
+        """Return the checkpointed state as a mapping of (variety_id, seed_date) to trays in house."""
+        groups = {}
+        for variety_id, seed_dates in json.loads(self.state).items():
+            for seed_date, quantity in seed_dates.items():
+                groups[(int(variety_id), datetime.strptime(seed_date, "%Y-%m-%d").date())] = quantity
+        return groups
\ No newline at end of file
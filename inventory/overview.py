@@ -0,0 +1,58 @@
+"""Aggregate queries that back the inventory overview page.
+
+Everything the overview shows (per-variety crop groups, tray totals and the age-bucket chart matrix) is built from
+two queries over the in house snapshot maintained by inventory.ledger, so the cost depends on the number of varieties
+and non-empty groups rather than on the whole CropGroup history.
+"""
+from django.db.models.functions import Coalesce
+from inventory.histogram import bucket_labels, in_house_histogram
+from inventory.models import InHouseGroup, Variety
+
+# Date range breakdown (d1, d2, ... dn), a tuple so that it can't be changed through a caller
+# Break into dn+1 groups of crops < di days old
+# eg. [0, 10 d/o), [10, 20 d/o), [20, 30 d/o), [30, inf d/o)
+DEFAULT_BREAKDOWN = (10, 20, 30)
+
+
+def alphanumeric_name(name):
+    """Strip the characters out of a variety name that can't be used in an HTML id."""
+    return name.replace(" ", "-").replace(":", "").replace(",", "")
+
+
+def variety_totals():
+    """Return one .values() row per variety, ordered by name, with the total number of trays in house."""
+    return Variety.objects.order_by('name').values('id', 'name', total_trays=Coalesce('in_house_total__quantity', 0))
+
+
+def in_house_crop_groups():
+    """Return the in house crop groups as (variety_id, seed_date, quantity) tuples, oldest first."""
+    return InHouseGroup.objects.order_by('seed_date').values_list('variety_id', 'seed_date', 'quantity')
+
+
+def build_overview(breakdown=DEFAULT_BREAKDOWN, today=None):
+    """Build the context for the inventory overview in two queries, for any age breakdown.
+
+    Returns a tuple of (in_house, chart_series, variety_list) where in_house maps each variety name to its totals and
+    crop groups, and chart_series holds one Highcharts series per age bucket."""
+    totals = list(variety_totals())
+    groups = list(in_house_crop_groups())
+
+    crop_groups = {}
+    for variety_id, seed_date, quantity in groups:
+        crop_groups.setdefault(variety_id, []).append({'seed_date': seed_date, 'quantity': quantity})
+
+    in_house = {}
+    variety_list = []
+    for row in totals:
+        variety_list.append(row['name'])
+        in_house[row['name']] = {'name': row['name'],
+                                 'name_alphanumeric': alphanumeric_name(row['name']),
+                                 'total_trays': row['total_trays'],
+                                 'crop_groups': crop_groups.get(row['id'], [])}
+
+    histogram = in_house_histogram([row['id'] for row in totals], breakdown, rows=groups, today=today)
+    chart_series = []
+    for i, label in enumerate(bucket_labels(breakdown)):
+        chart_series.append({'name': label, 'data': histogram[:, i].tolist()})
+
+    return in_house, chart_series, variety_list
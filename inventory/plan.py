@@ -0,0 +1,81 @@
+"""The weekly seeding plan: how many trays of each variety to seed on each day of the week.
+
+The whole 7 day x variety WeekdayRequirement grid is read with one query, any missing cells are created with one
+bulk insert, and each weekday's column is cached until the plan (or the list of varieties) next changes.
+"""
+import numpy as np
+from django.core.cache import cache
+from grow_app.caching import invalidate, versioned_key
+from inventory.models import Variety, WeekdayRequirement
+
+PLAN_NAMESPACE = 'inventory-plan'
+WEEKDAYS = range(7)
+
+
+def plan_matrix():
+    """Return the full plan as {plant_day: [(variety_id, variety_name, quantity), ...]} with every day of the week
+    and every variety (ordered by name), creating the missing WeekdayRequirements with a quantity of 0."""
+    rows = Variety.objects.order_by('name').values_list('id', 'name', 'weekdayrequirement__plant_day',
+                                                        'weekdayrequirement__quantity')
+    names = {}
+    quantities = {}
+    for variety_id, name, plant_day, quantity in rows:
+        names[variety_id] = name
+        if plant_day is not None:
+            quantities[(int(plant_day), variety_id)] = quantity
+
+    missing = [WeekdayRequirement(variety_id=variety_id, plant_day=str(day), quantity=0)
+               for day in WEEKDAYS for variety_id in names if (day, variety_id) not in quantities]
+    if missing:
+        WeekdayRequirement.objects.bulk_create(missing, ignore_conflicts=True)
+
+    return {day: [(variety_id, name, quantities.get((day, variety_id), 0)) for variety_id, name in names.items()]
+            for day in WEEKDAYS}
+
+
+def weekday_plan(plant_day):
+    """Return the plan for one day of the week as [(variety_id, variety_name, quantity), ...], ordered by variety
+    name. A cache miss rebuilds and caches every day of the week at once."""
+    plant_day = int(plant_day)
+    plan = cache.get(versioned_key(PLAN_NAMESPACE, plant_day))
+    if plan is None:
+        matrix = plan_matrix()
+        cache.set_many({versioned_key(PLAN_NAMESPACE, day): matrix[day] for day in WEEKDAYS})
+        plan = matrix[plant_day]
+    return plan
+
+
+def plan_array(variety_ids):
+    """Return the plan as a (7, len(variety_ids)) array of trays to seed on each weekday, columns in variety_ids
+    order."""
+    position = {variety_id: i for i, variety_id in enumerate(variety_ids)}
+    plan = np.zeros((7, len(variety_ids)), dtype=np.int64)
+    for day in WEEKDAYS:
+        for variety_id, name, quantity in weekday_plan(day):
+            if variety_id in position:
+                plan[day, position[variety_id]] = quantity
+    return plan
+
+
+def invalidate_plan():
+    """Drop the cached plan (and the forecasts built from it) so the next read rebuilds it from the database."""
+    invalidate(PLAN_NAMESPACE)
+
+
+def save_plan(plant_day, quantities):
+    """Set the plan for one day of the week from {variety_id: quantity}, updating the changed WeekdayRequirements
+    with one bulk update and creating any that are missing."""
+    plant_day = int(plant_day)
+    plan = WeekdayRequirement.objects.filter(plant_day=str(plant_day), variety_id__in=quantities)
+    changed = []
+    missing = dict(quantities)
+    for requirement in plan:
+        quantity = missing.pop(requirement.variety_id)
+        if requirement.quantity != quantity:
+            requirement.quantity = quantity
+            changed.append(requirement)
+    WeekdayRequirement.objects.bulk_update(changed, ['quantity'])
+    WeekdayRequirement.objects.bulk_create([WeekdayRequirement(variety_id=variety_id, plant_day=str(plant_day),
+                                                               quantity=quantity)
+                                            for variety_id, quantity in missing.items()], ignore_conflicts=True)
+    invalidate_plan()
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from inventory.models import Variety, WeekdayRequirement
+from inventory.plan import invalidate_plan
+
+
+@receiver([post_save, post_delete], sender=Variety)
+@receiver([post_save, post_delete], sender=WeekdayRequirement)
+def plan_changed(sender, **kwargs):
+    """Drop the cached weekly plan whenever a variety or one of its WeekdayRequirements is saved or deleted, including
+    edits made through the admin."""
+    invalidate_plan()
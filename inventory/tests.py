@@ -1,8 +1,36 @@
-from django.test import TestCase
-from golden_trays.models import Crop, Slot, CropRecord
-from inventory.models import Variety
+from django.test import TestCase, TransactionTestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from unittest import skipIf
+from unittest.mock import patch
+from golden_trays.models import Crop, Slot, CropRecord, ScanEvent, CropAttribute, CropAttributeOption
+from golden_trays.forms import EditCropForm, NewCropForm
+from golden_trays.timeline import CropTimeline
+from golden_trays.barcodes import InvalidBarcode, SlotAddress, decode, encode
+from golden_trays.free_slots import nearest_free_slots
+from golden_trays.slot_lookup import slot_for_barcode
+from golden_trays.batch import apply_batch_action, split_barcodes
+from golden_trays.scan_ingest import ingest_scan_events
+from golden_trays.provisioning import SlotCollision, provision_slots
+from golden_trays.barcode_import import BarcodeImportError, assign_barcodes, parse_assignments
+from django.core.files.uploadedfile import SimpleUploadedFile
+from barcode import code128
+from barcode.labels import LETTER_30, iter_pdf, iter_svg_pages
+from golden_trays.barcodes import iter_barcodes
+from google_sheets.upload_to_sheet import upload_crops_to_sheets
+from inventory.models import Variety, CropGroup, InHouseGroup, InHouseTotal, InventoryAction, KillReason, WeekdayRequirement
+from inventory.overview import build_overview
+from inventory.plan import plan_matrix, weekday_plan
+from inventory.forecast import build_forecast, forecast
+from inventory.capacity import simulate_capacity
+from inventory.ledger import record_seed, record_removal, create_checkpoint, inventory_as_of, NotEnoughTrays, \
+    record_removals, record_seeding, rebuild_crop_groups
 from django.contrib.auth.models import User
 from django.test import Client
+from django.core.cache import cache
+from django.core.management import call_command
+from io import StringIO
+from datetime import date, timedelta
 
 
 def login_the_test_user(test_case):
@@ -26,18 +54,23 @@ class HomePageTest(TestCase):
     def test_increase_number_of_trays(self):
         # There are zero total slots before we set slot quantity
         self.assertEqual(0, Slot.objects.count())
-        # We hit the set slot qty url
-        self.client.post("/slot/set_qty", data={"quantity": 50})
-        # Afterwards there is a positive number of total slots
+        # We hit the set slot qty url to add 2 racks of 5 rows of 5 slots
+        response = self.client.post("/slot/set_qty", data={"racks": 2, "rows": 5, "slots": 5})
+        self.assertEqual(response.status_code, 302)
+        # Afterwards there are that many slots, labelled with their location
         self.assertEqual(Slot.objects.count(), 50)
-        
-    def test_decrease_number_of_trays(self):
+        self.assertTrue(Slot.objects.filter(barcode=encode('G', 2, 5, 5)).exists())
+
+    def test_bad_rack_sizes_add_nothing(self):
         # There are five total slots in the database
-        slot = [Slot.objects.create() for i in range(5)]
-        # We hit the set slot qty url telling it to only have 3 total slots
-        response = self.client.post("/slot/set_qty", data={"quantity": 3})
-        # And we get an error saying we can't
-        self.assertEqual(response.status_code, 400)
+        for position in range(1, 6):
+            Slot.objects.create(barcode=encode('G', 1, 1, position))
+        # A row of 100 slots doesn't fit in a barcode, and the number of racks must be a number
+        for data in ({"racks": 1, "rows": 1, "slots": 100}, {"racks": "two", "rows": 5, "slots": 5}):
+            response = self.client.post("/slot/set_qty", data=data)
+            # And we get an error saying we can't, with no slots added
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(Slot.objects.count(), 5)
 
 
 class NewCropTest(TestCase):
@@ -310,4 +343,948 @@ class CropRecordTest(TestCase):
         self.client.get(f'/record/1/delete')
         record_list = CropRecord.objects.filter(crop=self.basil)
         # We can see that the length of the record list is now zero
-        self.assertEqual(0, len(record_list))
\ No newline at end of file
+        self.assertEqual(0, len(record_list))
+
+class InventoryOverviewTest(TestCase):
+    """Unit test that the inventory overview is built from a constant number of queries."""
+
+    def setUp(self):
+        self.today = date(2019, 10, 20)
+        self.basil = Variety.objects.create(name="Basil")
+        self.radish = Variety.objects.create(name="Radish")
+        record_seed(self.basil, self.today, 4)
+        record_seed(self.basil, self.today - timedelta(days=10), 2)
+        record_seed(self.radish, self.today - timedelta(days=35), 3)
+        # A crop group that has been fully harvested
+        record_seed(self.basil, self.today - timedelta(days=45), 1)
+        record_removal(self.basil, self.today - timedelta(days=45), 1, 'HARVEST', self.today)
+
+        self.client = Client()
+        login_the_test_user(self)
+
+    def test_overview_totals_and_buckets(self):
+        in_house, chart_series, variety_list = build_overview(today=self.today)
+        self.assertEqual(variety_list, ["Basil", "Radish"])
+        self.assertEqual(in_house["Basil"]["total_trays"], 6)
+        self.assertEqual(in_house["Radish"]["total_trays"], 3)
+        # Empty crop groups are left out of the per-variety list
+        self.assertEqual([group["quantity"] for group in in_house["Basil"]["crop_groups"]], [2, 4])
+        # Each seed date lands in exactly one age bucket
+        self.assertEqual([series["name"] for series in chart_series], ["< 10 days", "< 20 days", "< 30 days", "30+ days"])
+        self.assertEqual([series["data"] for series in chart_series], [[4, 0], [2, 0], [0, 0], [0, 3]])
+
+    def test_query_count_does_not_grow_with_varieties(self):
+        for i in range(20):
+            variety = Variety.objects.create(name="Variety " + str(i))
+            record_seed(variety, self.today, i + 1)
+        with self.assertNumQueries(2):
+            build_overview(today=self.today)
+
+    def test_uses_correct_template(self):
+        response = self.client.get("/inventory/overview/")
+        self.assertTemplateUsed(response, "inventory/inventory_overview.html")
+
+    def test_custom_breakdown(self):
+        in_house, chart_series, variety_list = build_overview(breakdown=list(range(1, 61)), today=self.today)
+        self.assertEqual(len(chart_series), 61)
+        self.assertEqual(chart_series[0]["data"], [4, 0])  # Seeded today
+        self.assertEqual(chart_series[10]["data"], [2, 0])  # Seeded 10 days ago
+        self.assertEqual(chart_series[35]["data"], [0, 3])  # Seeded 35 days ago
+
+    def test_chart_data_endpoint(self):
+        response = self.client.get("/inventory/overview/chart", data={"breakdown": "7,14"})
+        self.assertEqual([series["name"] for series in response.json()["series"]], ["< 7 days", "< 14 days", "14+ days"])
+        self.assertEqual(len(response.json()["colors"]), 3)
+        # An invalid breakdown falls back to the default one
+        response = self.client.get("/inventory/overview/chart", data={"breakdown": "-3,abc"})
+        self.assertEqual(len(response.json()["series"]), 4)
+        self.assertEqual(response.json()["colors"][0], '#70ef94')
+        # The default breakdown asked for explicitly gets the default colors too
+        response = self.client.get("/inventory/overview/chart", data={"breakdown": "10,20,30"})
+        self.assertEqual(response.json()["colors"], ['#70ef94', '#efdc70', '#f4a802', '#f43a02'])
+
+
+class InHouseSnapshotTest(TestCase):
+    """Unit test that the in house snapshot follows the inventory views and can be rebuilt from the ledger."""
+
+    def setUp(self):
+        self.basil = Variety.objects.create(name="Basil")
+        self.client = Client()
+        login_the_test_user(self)
+
+    def test_views_update_snapshot(self):
+        self.client.post("/inventory/seed/", data={"day": "2019-10-01", "form-plan-Basil-quantity": "5"})
+        self.assertEqual(InHouseGroup.objects.get(variety=self.basil).quantity, 5)
+        self.assertEqual(InHouseTotal.objects.get(variety=self.basil).quantity, 5)
+        self.client.post("/inventory/harvest/variety/", data={"form-harvest-variety": "Basil",
+                                                               "form-harvest-date": "2019-10-11",
+                                                               "form-harvest-quantity": "5",
+                                                               "form-harvest-yield": "",
+                                                               "form-harvest-seed-date": "2019-10-01"})
+        # The emptied group leaves the snapshot, and the total follows the CropGroup
+        self.assertFalse(InHouseGroup.objects.exists())
+        self.assertEqual(InHouseTotal.objects.get(variety=self.basil).quantity, 0)
+        self.assertEqual(CropGroup.objects.get(variety=self.basil).quantity, 0)
+
+    def test_rebuild_reports_and_repairs_drift(self):
+        record_seed(self.basil, date(2019, 10, 1), 5)
+        record_removal(self.basil, date(2019, 10, 1), 2, 'KILL', date(2019, 10, 5))
+        InHouseGroup.objects.update(quantity=7)
+        out = StringIO()
+        call_command("rebuild_inventory_snapshot", stdout=out)
+        self.assertIn("ledger 3, snapshot 7, crop group 3", out.getvalue())
+        self.assertEqual(InHouseGroup.objects.get(variety=self.basil).quantity, 3)
+        self.assertEqual(InHouseTotal.objects.get(variety=self.basil).quantity, 3)
+
+
+class InventoryLedgerTest(TestCase):
+    """Unit test that the trays in house can be rebuilt from the inventory ledger, from the latest checkpoint."""
+
+    def setUp(self):
+        self.basil = Variety.objects.create(name="Basil")
+        self.seed_date = date(2019, 10, 1)
+        record_seed(self.basil, self.seed_date, 5)
+        record_removal(self.basil, self.seed_date, 2, 'HARVEST', date(2019, 10, 5))
+        self.client = Client()
+        login_the_test_user(self)
+
+    def test_inventory_as_of_date(self):
+        self.assertEqual(inventory_as_of(date(2019, 9, 30))[0], {})
+        self.assertEqual(inventory_as_of(date(2019, 10, 4))[0], {(self.basil.id, self.seed_date): 5})
+        self.assertEqual(inventory_as_of()[0], {(self.basil.id, self.seed_date): 3})
+
+    def test_replay_from_checkpoint(self):
+        checkpoint = create_checkpoint(date(2019, 10, 3))
+        self.assertEqual(checkpoint.load(), {(self.basil.id, self.seed_date): 5})
+        # A kill back-dated to before the checkpoint is still picked up by later replays
+        record_removal(self.basil, self.seed_date, 1, 'KILL', date(2019, 10, 2))
+        with self.assertNumQueries(3):
+            groups, unattributed = inventory_as_of(date(2019, 10, 4))
+        self.assertEqual(groups, {(self.basil.id, self.seed_date): 4})
+        self.assertEqual(inventory_as_of()[0], {(self.basil.id, self.seed_date): 2})
+        self.assertEqual(CropGroup.objects.get(variety=self.basil).quantity, 2)
+
+    def test_rebuild_crop_groups_in_bulk(self):
+        for day in range(2, 12):
+            CropGroup.objects.create(variety=self.basil, seed_date=date(2019, 10, day), quantity=1)
+        groups = {(self.basil.id, date(2019, 10, day)): 4 for day in range(1, 16)}
+        with self.assertNumQueries(5):  # Savepoint, crop groups, one UPDATE of the 11 changed, insert, release
+            rebuild_crop_groups(groups)
+        self.assertEqual(dict(((self.basil.id, group.seed_date), group.quantity) for group in CropGroup.objects.all()),
+                         groups)
+
+    def test_actions_are_append_only(self):
+        action = InventoryAction.objects.get(action_type='SEED')
+        action.quantity = 50
+        self.assertRaises(ValueError, action.save)
+        self.assertRaises(ValueError, action.delete)
+
+    def test_as_of_endpoint(self):
+        response = self.client.get("/inventory/as_of", data={"date": "2019-10-04"})
+        self.assertEqual(response.json(), {"Basil": {"2019-10-01": 5}})
+        self.assertEqual(self.client.get("/inventory/as_of", data={"date": "not a date"}).status_code, 400)
+
+
+class AtomicRemovalTest(TestCase):
+    """Unit test that harvests and kills check availability in the same update that takes the trays out."""
+
+    def setUp(self):
+        self.basil = Variety.objects.create(name="Basil")
+        self.seed_date = date(2019, 10, 1)
+        record_seed(self.basil, self.seed_date, 3)
+
+    def test_refused_removal_writes_nothing(self):
+        self.assertRaises(NotEnoughTrays, record_removal, self.basil, self.seed_date, 5, 'HARVEST', self.seed_date)
+        # Nothing is written when there aren't enough trays
+        self.assertEqual(CropGroup.objects.get(variety=self.basil).quantity, 3)
+        self.assertEqual(InventoryAction.objects.filter(action_type='HARVEST').count(), 0)
+
+    def test_not_enough_trays_reports_availability(self):
+        try:
+            record_removal(self.basil, self.seed_date, 5, 'HARVEST', self.seed_date)
+        except NotEnoughTrays as e:
+            self.assertEqual(e.available, 3)
+        try:
+            record_removal(self.basil, date(2019, 9, 1), 1, 'HARVEST', self.seed_date)
+        except NotEnoughTrays as e:
+            self.assertIsNone(e.available)
+
+    def test_seeding_adds_to_existing_group(self):
+        record_seed(self.basil, self.seed_date, 2)
+        self.assertEqual(CropGroup.objects.get(variety=self.basil).quantity, 5)
+
+
+@skipIf(connection.vendor == 'sqlite', "SQLite serializes writers, run against PostgreSQL to exercise the race")
+class ConcurrentHarvestTest(TransactionTestCase):
+    """Stress test that parallel harvests of the same crop group never lose an update."""
+
+    def test_parallel_harvests_match_ledger(self):
+        out = StringIO()
+        call_command("stress_test_harvests", threads=16, harvests=25, trays=300, stdout=out)
+        self.assertIn("agree", out.getvalue())
+
+
+class BulkSeedingTest(TestCase):
+    """Unit test that a whole seeding sheet is committed with a constant number of queries."""
+
+    def setUp(self):
+        self.seed_date = date(2019, 10, 1)
+        self.varieties = [Variety.objects.create(name="Variety " + str(i)) for i in range(35)]
+        self.client = Client()
+        login_the_test_user(self)
+
+    def seeding_query_count(self, varieties):
+        with CaptureQueriesContext(connection) as queries:
+            record_seeding(self.seed_date, {variety: 2 for variety in varieties})
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_varieties(self):
+        record_seed(self.varieties[0], self.seed_date, 1)
+        self.assertEqual(self.seeding_query_count(self.varieties[:3]), self.seeding_query_count(self.varieties))
+        self.assertEqual(CropGroup.objects.get(variety=self.varieties[0]).quantity, 5)
+        self.assertEqual(CropGroup.objects.get(variety=self.varieties[34]).quantity, 2)
+        self.assertEqual(InHouseTotal.objects.get(variety=self.varieties[0]).quantity, 5)
+        self.assertEqual(InventoryAction.objects.filter(action_type='SEED', seed_date=self.seed_date).count(), 39)
+
+    def test_seed_view_commits_sheet(self):
+        self.client.post("/inventory/seed/", data={"day": "2019-10-01", "form-plan-Variety-1-quantity": "3",
+                                                   "form-plan-Variety-2-quantity": "", "form-plan-Variety-3-quantity": "4"})
+        self.assertEqual(dict(CropGroup.objects.values_list('variety__name', 'quantity')),
+                         {"Variety 1": 3, "Variety 3": 4})
+        self.assertEqual(InHouseGroup.objects.count(), 2)
+
+
+class BulkHarvestTest(TestCase):
+    """Unit test that a bulk harvest is applied all or nothing."""
+
+    def setUp(self):
+        self.basil = Variety.objects.create(name="Basil")
+        self.radish = Variety.objects.create(name="Radish")
+        self.kale = Variety.objects.create(name="Kale")
+        record_seed(self.basil, date(2019, 10, 1), 5)
+        record_seed(self.radish, date(2019, 10, 2), 2)
+        self.client = Client()
+        login_the_test_user(self)
+
+    def harvest(self, basil, radish, kale):
+        return self.client.post("/inventory/harvest/bulk/", data={
+            "form-harvest-date": "2019-10-12",
+            "form-harvest-Basil-quantity": basil, "form-harvest-Basil-seed-date": "2019-10-01",
+            "form-harvest-Radish-quantity": radish, "form-harvest-Radish-seed-date": "2019-10-02",
+            "form-harvest-Kale-quantity": kale, "form-harvest-Kale-seed-date": "2019-10-03"})
+
+    def test_invalid_line_rejects_whole_batch(self):
+        response = self.harvest("3", "4", "1")
+        # Every failing line is reported together
+        self.assertContains(response, "There are only 2 Radishs for 2019-10-02")
+        self.assertContains(response, "The Kale you were trying to harvest don&#39;t exist")
+        # And the valid line wasn't applied either
+        self.assertEqual(CropGroup.objects.get(variety=self.basil).quantity, 5)
+        self.assertFalse(InventoryAction.objects.filter(action_type='HARVEST').exists())
+
+    def test_valid_batch_is_applied(self):
+        response = self.harvest("3", "2", "")
+        self.assertRedirects(response, "/inventory/overview/")
+        self.assertEqual(CropGroup.objects.get(variety=self.basil).quantity, 2)
+        self.assertEqual(CropGroup.objects.get(variety=self.radish).quantity, 0)
+        self.assertEqual(list(InHouseGroup.objects.values_list('variety__name', 'quantity')), [("Basil", 2)])
+        self.assertEqual(InventoryAction.objects.filter(action_type='HARVEST', date=date(2019, 10, 12)).count(), 2)
+
+
+class OldestFirstRemovalTest(TestCase):
+    """Unit test that harvests and kills without a seed date take the oldest trays first."""
+
+    def setUp(self):
+        self.basil = Variety.objects.create(name="Basil")
+        record_seed(self.basil, date(2019, 10, 1), 2)
+        record_seed(self.basil, date(2019, 10, 3), 4)
+        record_seed(self.basil, date(2019, 10, 5), 3)
+
+    def test_spans_seed_dates_oldest_first(self):
+        record_removals([(self.basil.id, None, 5)], 'HARVEST', date(2019, 10, 12), harvest_yield=10)
+        self.assertEqual(list(CropGroup.objects.order_by('seed_date').values_list('seed_date', 'quantity')),
+                         [(date(2019, 10, 1), 0), (date(2019, 10, 3), 1), (date(2019, 10, 5), 3)])
+        # One action per crop group touched, with the yield split between them
+        self.assertEqual(list(InventoryAction.objects.filter(action_type='HARVEST').order_by('seed_date')
+                              .values_list('seed_date', 'quantity', 'harvest_yield')),
+                         [(date(2019, 10, 1), 2, 4.0), (date(2019, 10, 3), 3, 6.0)])
+        self.assertEqual(list(InHouseGroup.objects.order_by('seed_date').values_list('seed_date', 'quantity')),
+                         [(date(2019, 10, 3), 1), (date(2019, 10, 5), 3)])
+
+    def test_exact_lines_are_taken_before_oldest_first_lines(self):
+        record_removals([(self.basil.id, None, 3), (self.basil.id, date(2019, 10, 1), 2)], 'KILL', date(2019, 10, 12))
+        self.assertEqual(list(CropGroup.objects.order_by('seed_date').values_list('quantity', flat=True)), [0, 1, 3])
+
+    def test_shortfall_writes_nothing(self):
+        with self.assertRaises(NotEnoughTrays) as e:
+            record_removal(self.basil, None, 10, 'KILL', date(2019, 10, 12))
+        self.assertEqual(e.exception.available, 9)
+        self.assertEqual(sum(CropGroup.objects.values_list('quantity', flat=True)), 9)
+        self.assertFalse(InventoryAction.objects.filter(action_type='KILL').exists())
+
+
+class ActionHistoryTest(TestCase):
+    """Unit test the inventory action history API and CSV export."""
+
+    def setUp(self):
+        self.basil = Variety.objects.create(name="Basil")
+        self.radish = Variety.objects.create(name="Radish")
+        self.mold = KillReason.objects.create(name="Mold")
+        for day in range(1, 8):
+            record_seed(self.basil, date(2019, 10, day), 2)
+            record_seed(self.radish, date(2019, 10, day), 1)
+        record_removal(self.basil, date(2019, 10, 1), 1, 'KILL', date(2019, 10, 9), kill_reasons=[self.mold])
+        self.client = Client()
+        login_the_test_user(self)
+
+    def test_pages_follow_the_cursor(self):
+        seen = []
+        cursor = None
+        while True:
+            data = {'variety': 'Basil', 'limit': 3}
+            if cursor:
+                data['after'] = cursor
+            page = self.client.get("/inventory/actions", data=data).json()
+            seen += [action['id'] for action in page['actions']]
+            cursor = page['next']
+            if cursor is None:
+                break
+        expected = list(InventoryAction.objects.filter(variety=self.basil).order_by('-date', '-id')
+                        .values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        query_counts = []
+        for limit in (2, 15):
+            with CaptureQueriesContext(connection) as queries:
+                page = self.client.get("/inventory/actions", data={'limit': limit}).json()
+            self.assertEqual(len(page['actions']), limit)
+            query_counts.append(len(queries))
+        self.assertEqual(query_counts[0], query_counts[1])
+        self.assertEqual(page['actions'][0]['kill_reasons'], ["Mold"])
+        self.assertEqual(page['actions'][0]['description'], "Killed: 1 trays of Basil because of Mold.")
+
+    def test_filters(self):
+        page = self.client.get("/inventory/actions", data={'type': 'SEED', 'variety': 'Radish',
+                                                           'start': '2019-10-03', 'end': '2019-10-04'}).json()
+        self.assertEqual([action['date'] for action in page['actions']], ['2019-10-04', '2019-10-03'])
+        self.assertEqual(self.client.get("/inventory/actions", data={'type': 'WATER'}).status_code, 400)
+        self.assertEqual(self.client.get("/inventory/actions", data={'after': 'nonsense'}).status_code, 400)
+
+    def test_csv_export(self):
+        response = self.client.get("/inventory/actions/export", data={'type': 'KILL'})
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "id,date,action_type,variety,seed_date,quantity,harvest_yield,kill_reasons,note")
+        self.assertEqual(lines[1].split(",")[1:], ['2019-10-09', 'KILL', 'Basil', '2019-10-01', '1', '', 'Mold', ''])
+        self.assertEqual(len(lines), 2)
+
+
+class WeeklyPlanTest(TestCase):
+    """Unit test the cached weekly seeding plan."""
+
+    def setUp(self):
+        cache.clear()
+        self.basil = Variety.objects.create(name="Basil")
+        self.radish = Variety.objects.create(name="Radish")
+        WeekdayRequirement.objects.create(variety=self.basil, plant_day='2', quantity=4)
+        self.client = Client()
+        login_the_test_user(self)
+
+    def test_matrix_fills_missing_cells(self):
+        with self.assertNumQueries(2):
+            matrix = plan_matrix()
+        self.assertEqual(matrix[2], [(self.basil.id, "Basil", 4), (self.radish.id, "Radish", 0)])
+        self.assertEqual(WeekdayRequirement.objects.count(), 14)
+        with self.assertNumQueries(1):
+            plan_matrix()
+
+    def test_plan_is_cached_until_saved(self):
+        weekday_plan(2)
+        with self.assertNumQueries(0):
+            self.assertEqual(weekday_plan(5), [(self.basil.id, "Basil", 0), (self.radish.id, "Radish", 0)])
+        response = self.client.post("/inventory/plan/", data={'day': '2', 'form-plan-Basil-quantity': '6',
+                                                              'form-plan-Radish-quantity': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get("/inventory/plan/autofill", data={'day': '2'}).json(),
+                         {'Basil-quantity': 6, 'Radish-quantity': 1})
+
+    def test_admin_edit_invalidates_plan(self):
+        weekday_plan(2)
+        requirement = WeekdayRequirement.objects.get(variety=self.radish, plant_day='2')
+        requirement.quantity = 3
+        requirement.save()
+        self.assertEqual(weekday_plan(2)[1], (self.radish.id, "Radish", 3))
+        Variety.objects.create(name="Kale")
+        self.assertEqual([name for variety_id, name, quantity in weekday_plan(2)], ["Basil", "Kale", "Radish"])
+
+
+class ForecastTest(TestCase):
+    """Unit test the harvest readiness forecast."""
+
+    def setUp(self):
+        cache.clear()
+        self.today = date(2019, 10, 14)  # A Monday
+        self.basil = Variety.objects.create(name="Basil", lead_time=10)
+        self.radish = Variety.objects.create(name="Radish", lead_time=3)
+        Variety.objects.create(name="Kale")  # No lead time, so not forecast
+        record_seed(self.basil, date(2019, 10, 1), 4)  # Already ready
+        record_seed(self.basil, date(2019, 10, 10), 2)
+        WeekdayRequirement.objects.create(variety=self.radish, plant_day='1', quantity=5)
+
+    def test_forecast_combines_in_house_trays_and_plan(self):
+        names, ready = build_forecast(weeks=2, today=self.today)
+        self.assertEqual(names, ["Basil", "Radish"])
+        self.assertEqual(ready.shape, (2, 14))
+        self.assertEqual(ready[0, 0], 4)
+        self.assertEqual(ready[0, 6], 2)
+        self.assertEqual(ready[0].sum(), 6)
+        # Radish seeded on Tuesdays 2019-10-15 and 2019-10-22 is ready 3 days later
+        self.assertEqual(list(ready[1].nonzero()[0]), [4, 11])
+        self.assertEqual(ready[1, 4], 5)
+
+    def test_forecast_is_cached_until_inventory_changes(self):
+        forecast(weeks=2, today=self.today)
+        with self.assertNumQueries(0):
+            forecast(weeks=2, today=self.today)
+        record_seed(self.radish, date(2019, 10, 14), 1)
+        names, ready = forecast(weeks=2, today=self.today)
+        self.assertEqual(ready[1, 3], 1)
+        self.basil.lead_time = 14
+        self.basil.save()
+        names, ready = forecast(weeks=2, today=self.today)
+        self.assertEqual(ready[0, 10], 2)
+
+
+class RackCapacityTest(TestCase):
+    """Unit test the rack capacity simulation."""
+
+    def setUp(self):
+        cache.clear()
+        self.today = date(2019, 10, 14)  # A Monday
+        self.basil = Variety.objects.create(name="Basil", lead_time=10)
+        self.radish = Variety.objects.create(name="Radish", lead_time=3)
+        record_seed(self.basil, date(2019, 10, 10), 2)  # Ready on day 6
+        record_seed(self.radish, date(2019, 10, 1), 1)  # Overdue, harvested today
+        WeekdayRequirement.objects.create(variety=self.radish, plant_day='1', quantity=3)
+        for i in range(4):
+            Slot.objects.create(barcode="G0010101" + str(i))
+
+    def test_occupancy_and_over_capacity_days(self):
+        simulation = simulate_capacity(weeks=1, today=self.today)
+        # Radish seeded on Tuesday (day 1) occupies days 1 to 3
+        self.assertEqual(simulation['occupied'], [3, 5, 5, 5, 2, 2, 0])
+        self.assertEqual(simulation['capacity'], 4)
+        self.assertEqual(simulation['over'], [date(2019, 10, 15), date(2019, 10, 16), date(2019, 10, 17)])
+
+    def test_endpoint(self):
+        self.client = Client()
+        login_the_test_user(self)
+        data = self.client.get("/growhouse_settings/capacity", data={'weeks': 2}).json()
+        self.assertEqual(len(data['occupied']), 14)
+        self.assertEqual(data['capacity'], 4)
+
+
+class CropLifecycleDatesTest(TestCase):
+    """Unit test that Crop lifecycle dates follow its CropRecords and are read without queries."""
+
+    def setUp(self):
+        self.crop = Crop.objects.create(variety=Variety.objects.create(name="Basil"))
+        CropRecord.objects.create(crop=self.crop, record_type='GERM', date=date(2019, 10, 1))
+        self.grow = CropRecord.objects.create(crop=self.crop, record_type='GROW', date=date(2019, 10, 4))
+
+    def test_dates_follow_records(self):
+        crop = Crop.objects.get(id=self.crop.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(crop.germ_date, date(2019, 10, 1))
+            self.assertEqual(crop.days_in_germ(), 3)
+            self.assertIsNone(crop.harvest_date)
+        CropRecord.objects.create(crop=self.crop, record_type='HARVEST', date=date(2019, 10, 12))
+        # A second GERM record no longer hides the date, the latest one wins
+        CropRecord.objects.create(crop=self.crop, record_type='GERM', date=date(2019, 10, 2))
+        self.grow.delete()
+        crop.refresh_from_db()
+        self.assertEqual((crop.germ_date, crop.grow_date, crop.harvest_date),
+                         (date(2019, 10, 2), None, date(2019, 10, 12)))
+
+    def test_saving_a_stale_crop_keeps_its_dates(self):
+        stale = Crop.objects.get(id=self.crop.id)
+        apply_batch_action('HARVEST', [Slot.objects.create(barcode="G0010101", current_crop=self.crop).barcode],
+                           today=date(2019, 10, 12))
+        CropRecord.objects.create(crop=self.crop, record_type='GERM', date=date(2019, 10, 2))
+        stale.notes = "Edited"
+        stale.save()
+        self.crop.refresh_from_db()
+        self.assertEqual((self.crop.notes, self.crop.germ_date, self.crop.harvest_date),
+                         ("Edited", date(2019, 10, 2), date(2019, 10, 12)))
+
+    def test_edited_record_updates_dates(self):
+        self.grow.record_type = 'WATER'
+        self.grow.save()
+        self.crop.refresh_from_db()
+        self.assertIsNone(self.crop.grow_date)
+
+
+class CropTimelineTest(TestCase):
+    """Unit test that a crop's history is read with one CropRecord query."""
+
+    def setUp(self):
+        self.crop = Crop.objects.create(variety=Variety.objects.create(name="Basil"))
+        self.slot = Slot.objects.create(barcode="G00101011", current_crop=self.crop)
+        for day, record_type in [(1, 'GERM'), (4, 'GROW'), (5, 'WATER'), (7, 'WATER'), (12, 'HARVEST')]:
+            CropRecord.objects.create(crop=self.crop, record_type=record_type, date=date(2019, 10, day))
+        self.client = Client()
+        login_the_test_user(self)
+
+    def test_timeline(self):
+        with self.assertNumQueries(1):
+            timeline = CropTimeline.for_crop(self.crop)
+        self.assertEqual([record.record_type for record in timeline.history], ['GERM', 'GROW', 'WATER', 'WATER',
+                                                                               'HARVEST'])
+        self.assertEqual(timeline.last_watered, date(2019, 10, 7))
+        self.assertEqual(timeline.count('WATER'), 2)
+        self.assertEqual(timeline.dates('WATER'), [date(2019, 10, 5), date(2019, 10, 7)])
+        self.assertIsNone(timeline.trash_date)
+
+    def test_pages_fetch_records_once(self):
+        for url in ["/crop/%d/" % self.crop.id, "/slot/%d/" % self.slot.id]:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            record_queries = [query for query in queries if 'FROM "golden_trays_croprecord"' in query['sql']]
+            self.assertEqual(len(record_queries), 1)
+
+
+class RackMapTest(TestCase):
+    """Unit test the cached rack map page."""
+
+    def setUp(self):
+        cache.clear()
+        self.basil = Variety.objects.create(name="Basil")
+        for rack in (1, 2):
+            for row in (1, 2):
+                for position in (1, 2, 3):
+                    Slot.objects.create(barcode=encode('G', rack, row, position))
+        self.client = Client()
+        login_the_test_user(self)
+
+    def slot_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/golden_trays/rack_map")
+        self.assertEqual(response.status_code, 200)
+        return response, [query for query in queries if 'FROM "golden_trays_slot"' in query['sql']]
+
+    def test_constant_queries_and_fragment_cache(self):
+        response, queries = self.slot_queries()
+        self.assertEqual(len(queries), 2)  # The rack list and the grid
+        self.assertContains(response, 'id="rack-2"')
+        Slot.objects.create(barcode=encode('G', 3, 1, 1))
+        Slot.objects.create(barcode=encode('G', 3, 1, 2))
+        response, queries = self.slot_queries()
+        self.assertEqual(len(queries), 2)
+        response, queries = self.slot_queries()
+        self.assertEqual(len(queries), 0)
+
+    def test_slot_change_invalidates_its_rack(self):
+        self.slot_queries()
+        crop = Crop.objects.create(variety=self.basil)
+        CropRecord.objects.create(crop=crop, record_type='GERM', date=date.today() - timedelta(days=2))
+        slot = Slot.objects.get(barcode=encode('G', 2, 1, 3))
+        slot.current_crop = crop
+        slot.save()
+        response, queries = self.slot_queries()
+        self.assertEqual(len(queries), 1)  # Only the grid, for rack 2
+        self.assertContains(response, "Germ, 2d")
+
+    def test_barcode_codec(self):
+        self.assertEqual(encode('G', 1, 2, 3), "G00102038")
+        for barcode in ("G00102038", "G0010203", "G001020345"):  # Checked, legacy, and legacy with a slot id
+            self.assertEqual(decode(barcode), SlotAddress('G', 1, 2, 3))
+        for barcode in ("", "G00102", "X0010203", "G00102a3", "G00102039", "G00120038"):
+            with self.assertRaises(InvalidBarcode):
+                decode(barcode)
+
+
+class FreeSlotLookupTest(TestCase):
+    """Unit test the nearest free slot and typeahead lookups."""
+
+    def setUp(self):
+        crop = Crop.objects.create(variety=Variety.objects.create(name="Basil"))
+        for rack in (1, 2):
+            for row in (1, 2, 3):
+                for position in (1, 2, 3):
+                    Slot.objects.create(barcode=encode('G', rack, row, position))
+        self.slot = Slot.objects.get(barcode=encode('G', 1, 2, 2))
+        self.slot.current_crop = crop
+        self.slot.save()
+        Slot.objects.create(barcode="LEGACY1")
+        self.client = Client()
+        login_the_test_user(self)
+
+    def test_location_is_parsed_from_barcode(self):
+        self.assertEqual((self.slot.rack, self.slot.row, self.slot.position), (1, 2, 2))
+        self.assertIsNone(Slot.objects.get(barcode="LEGACY1").rack)
+
+    def test_nearest_free_slots(self):
+        slots = self.client.get("/slot/free", data={'near': self.slot.id, 'limit': 6}).json()['slots']
+        self.assertEqual([(slot['rack'], slot['row'], slot['position']) for slot in slots],
+                         [(1, 2, 1), (1, 2, 3), (1, 1, 2), (1, 3, 2), (1, 1, 1), (1, 1, 3)])
+        with self.assertNumQueries(1):  # The slot's rack holds enough slots within a row of it
+            self.assertEqual(len(nearest_free_slots(self.slot, limit=6)), 6)
+        Slot.objects.create(barcode=encode('G', 40, 9, 9))
+        # The rows around the slot's row then the whole rack, for racks 1, 2 and 40, each found with one seek (racks
+        # 3 to 39 have no empty slots, so they're never read), and one more seek finding no further rack
+        with self.assertNumQueries(10):
+            slots = nearest_free_slots(self.slot, limit=20)
+        self.assertEqual([(slot.rack, slot.row, slot.position) for slot in slots[7:10]],
+                         [(1, 3, 3), (2, 2, 2), (2, 2, 1)])
+        self.assertEqual((len(slots), slots[-1].rack), (18, 40))
+
+    def test_typeahead(self):
+        slots = self.client.get("/slot/free", data={'q': "G00202", 'limit': 2}).json()['slots']
+        self.assertEqual([slot['barcode'] for slot in slots], [encode('G', 2, 2, 1), encode('G', 2, 2, 2)])
+        self.assertEqual(self.client.get("/slot/free", data={'limit': 'all'}).status_code, 400)
+
+
+class BarcodeCacheTest(TestCase):
+    """Unit test that scanned barcodes are resolved from the cache and that the cache follows slot changes."""
+
+    def setUp(self):
+        cache.clear()
+        self.slot = Slot.objects.create(barcode="G0010101")
+        self.client = Client()
+        login_the_test_user(self)
+
+    def test_cached_barcode_costs_one_query(self):
+        self.assertEqual(slot_for_barcode("G0010101"), self.slot)
+        with self.assertNumQueries(1):
+            self.assertEqual(slot_for_barcode("G0010101"), self.slot)
+
+    def test_unknown_barcode_is_cached(self):
+        self.assertIsNone(slot_for_barcode("NOT_A_SLOT"))
+        with self.assertNumQueries(0):
+            self.assertIsNone(slot_for_barcode("NOT_A_SLOT"))
+        self.assertEqual(self.client.get('/scan/NOT_A_SLOT/').status_code, 404)
+
+    def test_misread_scans_are_rejected_without_a_query(self):
+        for barcode in ("G00102039", "G00101", "NOT A SLOT", "x" * 51):
+            with self.assertNumQueries(0), self.assertRaises(InvalidBarcode):
+                slot_for_barcode(barcode)
+        self.assertEqual(self.client.get('/scan/G00102039/').status_code, 400)
+
+    def test_relabelled_and_new_slots_are_found(self):
+        slot_for_barcode("G0010101")
+        slot_for_barcode("G0010102")
+        self.slot.barcode = "G0010102"
+        self.slot.save()
+        self.assertIsNone(slot_for_barcode("G0010101"))
+        self.assertEqual(slot_for_barcode("G0010102"), self.slot)
+        new_slot = Slot.objects.create(barcode="G0010101")
+        self.assertEqual(slot_for_barcode("G0010101"), new_slot)
+        new_slot.delete()
+        self.assertIsNone(slot_for_barcode("G0010101"))
+
+    def test_scan_renders_slot_page(self):
+        response = self.client.get('/scan/G0010101/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['slot_id'], self.slot.id)
+
+
+class BatchActionTest(TestCase):
+    """Unit test that batch mode applies an action to every scanned slot with a fixed number of queries."""
+
+    def setUp(self):
+        self.variety = Variety.objects.create(name="Basil")
+        self.slots = []
+        for position in range(1, 6):
+            crop = Crop.objects.create(variety=self.variety, notes="")
+            self.slots.append(Slot.objects.create(barcode=encode('G', 1, 1, position), current_crop=crop))
+        Slot.objects.create(barcode="G0010106")
+        self.client = Client()
+        login_the_test_user(self)
+
+    def test_split_barcodes(self):
+        self.assertEqual(split_barcodes("G0010101\nG0010102 G0010101\n\n"), ["G0010101", "G0010102"])
+
+    def test_water_many_slots(self):
+        barcodes = [slot.barcode for slot in self.slots] + ["G0010106", "NOT_A_SLOT"]
+        with self.assertNumQueries(4):  # Savepoint, slots, records, release
+            result = apply_batch_action('WATER', barcodes)
+        self.assertEqual(len(result.slots), 5)
+        self.assertEqual(result.empty, ["G0010106"])
+        self.assertEqual(result.unknown, ["NOT_A_SLOT"])
+        self.assertEqual(CropRecord.objects.filter(record_type='WATER').count(), 5)
+        self.assertEqual(Slot.objects.filter(current_crop__isnull=False).count(), 5)
+
+    def test_trash_and_harvest_empty_slots(self):
+        trashed = self.slots[0].current_crop
+        apply_batch_action('TRASH', [self.slots[0].barcode], reason="mold")
+        result = apply_batch_action('HARVEST', [slot.barcode for slot in self.slots], today=date(2020, 1, 2))
+        self.assertEqual(len(result.slots), 4)
+        self.assertEqual(result.empty, [self.slots[0].barcode])
+        self.assertEqual(Slot.objects.filter(current_crop__isnull=False).count(), 0)
+        trashed.refresh_from_db()
+        self.assertEqual(trashed.notes, " TRASHED: mold")
+        self.assertEqual(set(Crop.objects.exclude(id=trashed.id).values_list('harvest_date', flat=True)),
+                         {date(2020, 1, 2)})
+
+    def test_batch_view(self):
+        with patch('golden_trays.views.upload_crops_to_sheets') as upload:
+            response = self.client.post('/slot/batch', data={'action': 'TRASH', 'reason': "pests",
+                                                             'barcodes': "%s\n%s\nG0010109\nG00101019" % (
+                                                                 self.slots[0].barcode, self.slots[1].barcode)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['result'].slots), 2)
+        self.assertEqual(response.context['result'].unknown, ["G0010109", "G00101019"])
+        self.assertEqual(upload.call_count, 1)
+        self.assertEqual(CropRecord.objects.filter(record_type='TRASH').count(), 2)
+
+    def test_sheet_rows_take_a_fixed_number_of_queries(self):
+        option = CropAttributeOption.objects.create(name="LED", attribute_group=CropAttribute.objects.create(
+            name="Light"))
+        for slot in self.slots:
+            slot.current_crop.attributes.add(option)
+            CropRecord.objects.create(crop=slot.current_crop, record_type='GROW', date=date(2020, 1, 1))
+        result = apply_batch_action('HARVEST', [slot.barcode for slot in self.slots])
+        with patch('google_sheets.upload_to_sheet.open_sheet') as open_sheet:
+            with self.assertNumQueries(3):  # Crops and varieties, records, attributes
+                upload_crops_to_sheets(Crop.objects.filter(id__in=[slot.current_crop_id for slot in result.slots]))
+        rows = open_sheet().spreadsheet.values_append.call_args[0][2]['values']
+        self.assertEqual(len(rows), 5)
+        self.assertEqual((rows[0][1], rows[0][-1]), ("01/01/20", "LED"))
+
+
+class ScanIngestTest(TestCase):
+    """Unit test that queued offline scans are applied once, in the order they were scanned."""
+
+    def setUp(self):
+        variety = Variety.objects.create(name="Basil")
+        self.crop = Crop.objects.create(variety=variety, notes="")
+        self.slot = Slot.objects.create(barcode="G0010101", current_crop=self.crop)
+        self.client = Client()
+        login_the_test_user(self)
+
+    def event(self, key, action, scanned_at, barcode="G0010101"):
+        return {'key': key, 'barcode': barcode, 'action': action, 'scanned_at': scanned_at}
+
+    def test_events_are_applied_in_scan_order(self):
+        results = ingest_scan_events([self.event("b", 'HARVEST', "2020-01-03T10:00:00-05:00"),
+                                      self.event("a", 'WATER', "2020-01-02T10:00:00-05:00"),
+                                      self.event("c", 'WATER', "2020-01-04T10:00:00-05:00"),
+                                      self.event("d", 'WATER', "2020-01-04T10:00:00", barcode="NOPE"),
+                                      {'key': "e", 'action': 'WATER'}])
+        self.assertEqual([result['outcome'] for result in results], ['applied', 'applied', 'empty', 'unknown', 'invalid'])
+        self.assertEqual(list(CropRecord.objects.order_by('date').values_list('record_type', 'date')),
+                         [('WATER', date(2020, 1, 2)), ('HARVEST', date(2020, 1, 3))])
+        self.crop.refresh_from_db()
+        self.assertEqual(self.crop.harvest_date, date(2020, 1, 3))
+        self.assertIsNone(Slot.objects.get(id=self.slot.id).current_crop)
+        self.assertEqual(ScanEvent.objects.get(key="a").crop, self.crop)
+
+    def test_resent_events_are_not_applied_again(self):
+        events = [self.event("a", 'WATER', "2020-01-02T10:00:00-05:00"),
+                  self.event("a", 'WATER', "2020-01-02T10:00:00-05:00")]
+        self.assertEqual([result['outcome'] for result in ingest_scan_events(events)], ['applied', 'duplicate'])
+        self.assertEqual([result['outcome'] for result in ingest_scan_events(events)], ['duplicate', 'duplicate'])
+        self.assertEqual(CropRecord.objects.count(), 1)
+        self.assertEqual(ScanEvent.objects.count(), 1)
+
+    def test_ingest_view(self):
+        response = self.client.post('/scan/ingest', content_type='application/json',
+                                    data={'events': [self.event("a", 'WATER', "2020-01-02T10:00:00Z")]})
+        self.assertEqual(response.json(), {'results': [{'key': "a", 'outcome': 'applied'}]})
+        self.assertEqual(self.client.post('/scan/ingest', content_type='application/json',
+                                          data={'events': "a"}).status_code, 400)
+        misread = self.event("b", 'WATER', "2020-01-02T10:00:00Z", barcode="G00101019")
+        self.assertEqual(ingest_scan_events([misread]), [{'key': "b", 'outcome': 'invalid'}])
+        self.assertFalse(ScanEvent.objects.filter(key="b").exists())
+
+    def test_harvests_are_uploaded_with_a_fixed_number_of_queries(self):
+        events = []
+        for position in range(1, 4):
+            crop = Crop.objects.create(variety=self.crop.variety, notes="")
+            barcode = encode('G', 2, 1, position)
+            Slot.objects.create(barcode=barcode, current_crop=crop)
+            CropRecord.objects.create(crop=crop, record_type='GROW', date=date(2020, 1, 1))
+            events.append(self.event(barcode, 'HARVEST', "2020-01-02T10:00:00Z", barcode=barcode))
+        with patch('google_sheets.upload_to_sheet.open_sheet') as open_sheet, \
+                CaptureQueriesContext(connection) as queries:
+            self.client.post('/scan/ingest', content_type='application/json', data={'events': events})
+        rows = open_sheet().spreadsheet.values_append.call_args[0][2]['values']
+        self.assertEqual([row[1] for row in rows], ["01/01/20"] * 3)
+        record_reads = [query for query in queries.captured_queries
+                        if query['sql'].startswith('SELECT') and 'FROM "golden_trays_croprecord"' in query['sql']]
+        self.assertEqual(len(record_reads), 1)
+
+
+class SlotProvisioningTest(TestCase):
+    """Unit test that racks of slots are added in bulk with location barcodes."""
+
+    def setUp(self):
+        self.client = Client()
+        login_the_test_user(self)
+
+    def test_racks_follow_the_last_rack(self):
+        Slot.objects.create(barcode="G002010105")  # Id suffixed barcode
+        with self.assertNumQueries(5):  # Savepoint, last rack, collisions, insert, release
+            barcodes = provision_slots(racks=2, rows=4, positions=16)
+        self.assertEqual(len(barcodes), 128)
+        self.assertEqual((barcodes[0], barcodes[-1]), (encode('G', 3, 1, 1), encode('G', 4, 4, 16)))
+        self.assertEqual(Slot.objects.filter(rack=4, row=4, position=16).get().barcode, "G00404160")
+
+    def test_collisions_add_nothing(self):
+        Slot.objects.create(barcode="G001020305")
+        with self.assertRaises(SlotCollision) as raised:
+            provision_slots(racks=1, rows=2, positions=2, first_rack=1)
+        self.assertEqual(raised.exception.barcodes, ["G001020305"])
+        self.assertEqual(Slot.objects.count(), 1)
+
+    def test_set_slot_quantity_view(self):
+        response = self.client.post("/slot/set_qty", data={"racks": 1, "rows": 2, "slots": 3})
+        self.assertRedirects(response, "/growhouse_settings/")
+        self.assertEqual(Slot.objects.count(), 6)
+        self.assertEqual(self.client.post("/slot/set_qty", data={"racks": 1, "rows": 100, "slots": 3}).status_code,
+                         400)
+        self.assertEqual(Slot.objects.count(), 6)
+
+
+class BarcodeImportTest(TestCase):
+    """Unit test that barcodes are imported in bulk, validated together and only written where they change."""
+
+    def setUp(self):
+        self.slots = [Slot.objects.create(barcode="OLD%d" % number) for number in range(4)]
+        self.ids = [slot.id for slot in self.slots]
+        self.client = Client()
+        login_the_test_user(self)
+
+    def test_parse_bare_barcodes_and_pairs(self):
+        self.assertEqual(parse_assignments("G0010101\n\nG0010102\n", self.ids),
+                         {self.ids[0]: "G0010101", self.ids[1]: "G0010102"})
+        self.assertEqual(parse_assignments("%d, G0010101\n%d\tG0010102" % (self.ids[2], self.ids[3]), self.ids),
+                         {self.ids[2]: "G0010101", self.ids[3]: "G0010102"})
+        with self.assertRaises(BarcodeImportError):
+            parse_assignments("A\nB\nC\nD\nE", self.ids)
+        with self.assertRaises(BarcodeImportError):
+            parse_assignments("%d G0010101\nG0010102" % self.ids[0], self.ids)
+
+    def test_only_changed_slots_are_written(self):
+        assignments = {self.ids[0]: "OLD0", self.ids[1]: "OLD2", self.ids[2]: "OLD1", self.ids[3]: "G0010101"}
+        with self.assertNumQueries(5):  # Savepoint, slots, placeholders, barcodes, release
+            changed = assign_barcodes(assignments)
+        self.assertEqual(sorted(slot.id for slot in changed), self.ids[1:])
+        self.assertEqual(dict(Slot.objects.values_list('id', 'barcode')), assignments)
+        self.assertEqual(Slot.objects.get(id=self.ids[3]).rack, 1)
+
+    def test_conflicts_write_nothing(self):
+        with self.assertRaises(BarcodeImportError) as raised:
+            assign_barcodes({self.ids[0]: "OLD1", self.ids[2]: "NEW", self.ids[3]: "NEW", 999: "OTHER"})
+        self.assertEqual(raised.exception.errors, ["Barcode NEW is given to more than one slot."])
+        with self.assertRaises(BarcodeImportError) as raised:
+            assign_barcodes({self.ids[0]: "OLD1", 999: "OTHER"})
+        self.assertEqual(raised.exception.errors, ["There is no slot 999.",
+                                                   "Barcode OLD1 already belongs to slot %d." % self.ids[1]])
+        self.assertEqual(Slot.objects.get(id=self.ids[0]).barcode, "OLD0")
+
+    def test_too_long_barcodes_are_rejected(self):
+        too_long = "G" * 51
+        with self.assertRaises(BarcodeImportError) as raised:
+            parse_assignments("G0010101\n%s" % too_long, self.ids)
+        self.assertEqual(raised.exception.errors, ["Line 2: the barcode is longer than 50 characters."])
+        with self.assertRaises(BarcodeImportError) as raised:
+            assign_barcodes({self.ids[0]: too_long})
+        self.assertEqual(raised.exception.errors, ["Slot %d: the barcode is longer than 50 characters." % self.ids[0]])
+        response = self.client.post('/golden_trays/add_barcodes', data={'barcodes': "%d %s" % (self.ids[0], too_long)})
+        self.assertEqual(response.context['errors'], ["Line 1: the barcode is longer than 50 characters."])
+        self.assertEqual(Slot.objects.get(id=self.ids[0]).barcode, "OLD0")
+
+    def test_unscannable_barcodes_are_rejected(self):
+        with self.assertRaises(BarcodeImportError) as raised:
+            assign_barcodes({self.ids[0]: "G00101015", self.ids[1]: "G12", self.ids[2]: encode('G', 1, 1, 1)})
+        self.assertEqual(raised.exception.errors, ["Slot %d: Wrong check digit: 'G00101015'" % self.ids[0],
+                                                   "Slot %d: Not a slot barcode: 'G12'" % self.ids[1]])
+        self.assertEqual(Slot.objects.get(id=self.ids[2]).barcode, "OLD2")
+
+    def test_import_file(self):
+        upload = SimpleUploadedFile("barcodes.txt", b"G0010101\nG0010102\nG0010103\nG0010104\n")
+        response = self.client.post('/golden_trays/add_barcodes', data={'barcodes_file': upload})
+        self.assertEqual(len(response.context['changed']), 4)
+        self.assertEqual(Slot.objects.get(id=self.ids[3]).barcode, "G0010104")
+        response = self.client.get('/golden_trays/add_barcodes')
+        self.assertEqual(len(response.context['page']), 4)
+
+
+class LabelSheetTest(TestCase):
+    """Unit test the Code 128 encoding and the label sheets streamed from it."""
+
+    def test_code128_symbols(self):
+        # Start B, "G", "0", switch to code set C, "01" x 3, check symbol
+        self.assertEqual(code128.symbols("G0010101"), [104, 39, 16, 99, 1, 1, 1, 75])
+        self.assertEqual(code128.symbols("PJJ123C")[-1], 55)
+        self.assertEqual(code128.module_count("G0010101"), 11 * 8 + 13)
+        with self.assertRaises(ValueError):
+            code128.symbols("é")
+
+    def test_barcodes_are_read_a_page_at_a_time(self):
+        consumed = []
+
+        def barcodes():
+            for barcode in iter_barcodes('G', 2, 4, 16):
+                consumed.append(barcode)
+                yield barcode
+
+        pages = iter_svg_pages(barcodes())
+        self.assertIn(encode('G', 1, 1, 1), next(pages))
+        self.assertEqual(len(consumed), 30)
+        self.assertEqual(len(list(pages)), 4)
+
+    def test_pdf_cross_references(self):
+        pdf = b"".join(iter_pdf(iter_barcodes('G', 1, 4, 16), LETTER_30))
+        self.assertTrue(pdf.startswith(b"%PDF-1.4") and pdf.endswith(b"%%EOF\n"))
+        xref = int(pdf.rsplit(b"startxref\n", 1)[1].split()[0])
+        entries = pdf[xref:].split(b"\n")[3:3 + 9]  # 3 pages of 2 objects, catalog, pages and font
+        for number, entry in enumerate(entries, 1):
+            self.assertTrue(pdf[int(entry[:10]):].startswith(b"%d 0 obj" % number))
+        self.assertIn(b"/Count 3", pdf)
+
+    def test_slot_labels_view(self):
+        Slot.objects.create(barcode="G0010101")
+        Slot.objects.create(barcode="G0020101")
+        self.client = Client()
+        login_the_test_user(self)
+        response = self.client.get('/golden_trays/labels.pdf', data={'rack': 2})
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn(b"/Count 1", b"".join(response.streaming_content))
+
+
+class CropAttributeSchemaTest(TestCase):
+    """Unit test that the crop forms are built from the cached attributes, and that the cache follows changes."""
+
+    def setUp(self):
+        cache.clear()
+        self.light = CropAttribute.objects.create(name="Light")
+        CropAttributeOption.objects.create(attribute_group=self.light, name="LED")
+        CropAttributeOption.objects.create(attribute_group=self.light, name="T5")
+        CropAttribute.objects.create(name="Substrate")
+        self.client = Client()
+        login_the_test_user(self)
+
+    def test_forms_cost_no_queries_once_cached(self):
+        with self.assertNumQueries(1):
+            form = NewCropForm()
+        self.assertEqual(list(form.fields['Light'].choices), [("LED", "LED"), ("T5", "T5")])
+        self.assertEqual(list(form.fields['Substrate'].choices), [])
+        with self.assertNumQueries(0):
+            NewCropForm()
+            EditCropForm()
+
+    def test_changes_invalidate_the_schema(self):
+        NewCropForm()
+        self.client.post('/crop/add_option', data={'attribute_group': self.light.id, 'name': "HPS"})
+        self.assertIn(("HPS", "HPS"), NewCropForm().fields['Light'].choices)
+        self.client.post('/crop/add_attribute', data={'name': "Tray"})
+        self.assertIn('Tray', NewCropForm().fields)
+        # As the admin does
+        self.light.name = "Lights"
+        self.light.save()
+        self.assertIn('Lights', NewCropForm().fields)
+        CropAttributeOption.objects.get(name="T5").delete()
+        self.assertNotIn(("T5", "T5"), NewCropForm().fields['Lights'].choices)
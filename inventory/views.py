@@ -1,8 +1,18 @@
-from django.http import JsonResponse
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
 from inventory.models import WeekdayRequirement, InventoryAction, CropGroup, LiveCropInventory
 from inventory.forms import *
+from inventory.overview import alphanumeric_name, build_overview, DEFAULT_BREAKDOWN
+from inventory.plan import save_plan, weekday_plan
+from inventory.forecast import forecast, forecast_dates, DEFAULT_WEEKS
+from inventory.capacity import simulate_capacity
+from inventory.histogram import parse_breakdown
+from inventory.history import action_json, action_page, csv_lines, describe, filtered_actions, parse_cursor, \
+    MAX_PAGE_SIZE, PAGE_SIZE
+from inventory.ledger import BatchRejected, NotEnoughTrays, inventory_as_of, record_removal, record_removals, \
+    record_seeding
 from golden_trays.forms import *
+from golden_trays.provisioning import provision_slots
 from orders.models import LiveCropProduct, MicrogreenSize, TrayType, Product, HarvestedCropProduct
 from datetime import date, datetime, timedelta
 from dateutil import parser
@@ -26,32 +36,12 @@ def growhouse_settings(request):
 
 @login_required
 def set_total_slot_quantity(request):
-    """POST: Update the number of total Slot objects, redirect to homepage."""
-    phase = "G"  # Phase will always be grow since we are on tracking golden trays in grow
-    racks = int(request.POST["racks"])
-    rows = int(request.POST["rows"])
-    slots = int(request.POST["slots"])
-    #current_slot_count = Slot.objects.count()
-    if Slot.objects.count() > 0:
-        try:
-            last_slot = Slot.objects.filter(barcode__startswith=phase).order_by("-barcode")[0]
-            next_index = int(str(last_slot.barcode)[1:4]) + 1
-        except IndexError:
-            next_index = 1
-    else:
-        next_index = 1
-
-    for ra in range(next_index, next_index + racks):
-        print("Adding rack ", ra)
-        for ro in range(1, rows + 1):
-            for sl in range(1, slots + 1):
-                barcode = phase + str(ra).zfill(3) + str(ro).zfill(2) + str(sl).zfill(2)
-                # Create slot object.
-                slot = Slot.objects.create()
-                # Add slot id to make barcode unique.
-                slot.barcode = barcode + str(slot.id).zfill(2)
-                slot.save()
-
+    """POST: Add racks of Slot objects, redirect to homepage."""
+    try:
+        provision_slots(int(request.POST["racks"]), int(request.POST["rows"]), int(request.POST["slots"]))
+    except (KeyError, ValueError) as error:
+        # InvalidBarcode and SlotCollision included
+        return HttpResponseBadRequest(str(error))
     return redirect(growhouse_settings)
 
 
@@ -108,65 +98,29 @@ def inventory_home(request):
     return render(request, "inventory/inventory_home.html")
 
 
+def requested_breakdown(request):
+    """Read the age breakdown for the inventory chart from the 'breakdown' GET parameter, e.g. ?breakdown=7,14,21.
+    Falls back to the default breakdown if none or an invalid one was given."""
+    try:
+        return parse_breakdown(request.GET.get('breakdown', ''))
+    except ValueError:
+        return DEFAULT_BREAKDOWN
+
+
+def chart_colors(breakdown):
+    if tuple(breakdown) == DEFAULT_BREAKDOWN:
+        return ['#70ef94', '#efdc70', '#f4a802', '#f43a02']
+    return getChartColors((112, 239, 148), (244, 58, 2), len(breakdown) + 1)
+
+
 @login_required
 def inventory_overview(request):
-    in_house = {}
-    variety_list = []
-    for variety in Variety.objects.all().order_by('name'):
-        crop_groups = []
-        in_house[variety.name] = {}
-        variety_list.append(variety.name)
-        variety_alphanumeric = variety.name.replace(" ", "-").replace(":", "").replace(",", "")
-        total_trays = 0
-        for crop_group in CropGroup.objects.filter(variety=variety).exclude(quantity=0).order_by('seed_date'):
-            crop_groups.append(crop_group)
-            total_trays += crop_group.quantity
-        in_house[variety.name]['total_trays'] = total_trays
-        in_house[variety.name]['name'] = variety.name
-        in_house[variety.name]['name_alphanumeric'] = variety_alphanumeric
-        in_house[variety.name]['crop_groups'] = crop_groups
-
-    # Date range breakdown [d1, d2, ... dn]
-    # Break into dn+1 groups of crops < di days old
-    # eg. [0, 4 d/o), [4, 14 d/o), [14, inf d/o)
-    breakdown = [10, 20, 30]
-    colors = ['#70ef94', '#efdc70', '#f4a802', '#f43a02'] # getChartColors((0, 255, 0), (255, 0, 0) ,len(breakdown) + 1)
-    chart_series = []
-    start_date = date.today()
-    for x in range(0, len(breakdown) + 1):
-        data = []
-        category_dict = {}
-        if x != len(breakdown):
-            end_date = start_date # set end date to previous start date
-            start_date = date.today() - timedelta(days=breakdown[x]-1)
-            category_dict['name'] = "< " + str(breakdown[x]) + " days"
-        else:
-            end_date = start_date
-            category_dict = {'name': str(breakdown[len(breakdown) - 1]) + "+ days", 'data': []}
-        for v in Variety.objects.all().order_by('name'):
-            count = 0
-            if x == len(breakdown):
-                for cg in CropGroup.objects.filter(variety=v, seed_date__lte=end_date):
-                    count += cg.quantity
-            else:
-                for cg in CropGroup.objects.filter(variety=v, seed_date__range=[start_date, end_date]):
-                    count += cg.quantity
-            data.append(count)
-        category_dict['data'] = data
-        chart_series.append(category_dict)
+    breakdown = requested_breakdown(request)
+    in_house, chart_series, variety_list = build_overview(breakdown)
+    colors = chart_colors(breakdown)
     # Recent Inventory Actions
-    recent_actions = InventoryAction.objects.all().order_by('-date')[:5]
-    actions_display = []
-    for action in recent_actions:
-        if action.action_type == 'SEED':
-            text = "Seeded: " + str(action.quantity) + " trays of " + action.variety.name + "."
-        if action.action_type == 'HARVEST':
-            text = "Harvested: " + str(action.quantity) + " trays of " + action.variety.name + "."
-        if action.action_type == 'KILL':
-            reasons = ", ".join(list(action.kill_reasons.values_list('name', flat=True)))
-            print(reasons)
-            text = "Killed: " + str(action.quantity) + " trays of " + action.variety.name + " because of " + reasons + "."
-        actions_display.append((action, text))
+    recent_actions, cursor = action_page(filtered_actions(), limit=5)
+    actions_display = [(action, describe(action)) for action in recent_actions]
 
     return render(request, 'inventory/inventory_overview.html', context={'in_house': in_house,
                                                                          'chart_series': chart_series,
@@ -175,6 +129,103 @@ def inventory_overview(request):
                                                                          'recent_actions': actions_display})
 
 
+@login_required
+def inventory_chart_data(request):
+    """GET: Return the stacked inventory chart series as JSON for the breakdown given by the 'breakdown' parameter."""
+    breakdown = requested_breakdown(request)
+    in_house, chart_series, variety_list = build_overview(breakdown)
+    return JsonResponse({'categories': variety_list, 'series': chart_series, 'colors': chart_colors(breakdown)})
+
+
+@login_required
+def inventory_history_snapshot(request):
+    """GET: Return the trays in house at the end of the day given by the 'date' parameter (or now) as JSON, rebuilt
+    from the inventory ledger."""
+    try:
+        day = parser.parse(request.GET['date']).date() if request.GET.get('date') else None
+    except ValueError:
+        return HttpResponseBadRequest("Invalid date: " + request.GET['date'])
+    groups, unattributed = inventory_as_of(day)
+    names = dict(Variety.objects.values_list('id', 'name'))
+    data = {}
+    for (variety_id, seed_date), quantity in sorted(groups.items()):
+        if quantity > 0:
+            data.setdefault(names[variety_id], {})[seed_date.isoformat()] = quantity
+    return JsonResponse(data)
+
+
+@login_required
+def inventory_forecast(request):
+    """GET: Return the number of trays of each variety forecast to be ready on each of the next 'weeks' weeks' days,
+    from the trays in house and the weekly plan, as JSON."""
+    try:
+        weeks = min(max(int(request.GET.get('weeks', DEFAULT_WEEKS)), 1), 52)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid number of weeks: " + request.GET['weeks'])
+    variety_names, ready = forecast(weeks)
+    return JsonResponse({'dates': [day.isoformat() for day in forecast_dates(weeks)],
+                         'series': [{'name': name, 'data': row.tolist()} for name, row in zip(variety_names, ready)]})
+
+
+@login_required
+def rack_capacity(request):
+    """GET: Return the number of slots the trays in house and the weekly plan will occupy on each of the next 'weeks'
+    weeks' days, the number of slots and the days on which the racks will be over capacity, as JSON."""
+    try:
+        weeks = min(max(int(request.GET.get('weeks', 52)), 1), 104)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid number of weeks: " + request.GET['weeks'])
+    simulation = simulate_capacity(weeks)
+    return JsonResponse({'capacity': simulation['capacity'],
+                         'dates': [day.isoformat() for day in simulation['dates']],
+                         'occupied': simulation['occupied'],
+                         'over': [day.isoformat() for day in simulation['over']]})
+
+
+def requested_actions(request):
+    """Return the InventoryActions matching the 'variety', 'type', 'start' and 'end' GET parameters. Raises
+    ValueError if a parameter is invalid."""
+    action_type = request.GET.get('type') or None
+    if action_type is not None and action_type not in dict(InventoryAction.ACTION_TYPES):
+        raise ValueError("Invalid action type: " + action_type)
+    start = parser.parse(request.GET['start']).date() if request.GET.get('start') else None
+    end = parser.parse(request.GET['end']).date() if request.GET.get('end') else None
+    return filtered_actions(request.GET.get('variety') or None, action_type, start, end)
+
+
+@login_required
+def inventory_action_history(request):
+    """GET: Return a page of inventory actions, newest first, as JSON. Accepts the 'variety', 'type', 'start' and
+    'end' filters, 'limit' and the 'after' cursor returned as 'next' by the previous page."""
+    try:
+        actions = requested_actions(request)
+        after = parse_cursor(request.GET['after']) if request.GET.get('after') else None
+        limit = min(max(int(request.GET.get('limit', PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    page, cursor = action_page(actions, after, limit)
+    return JsonResponse({'actions': [action_json(action) for action in page], 'next': cursor})
+
+
+@login_required
+def inventory_action_export(request):
+    """GET: Stream every inventory action matching the history filters as a CSV file."""
+    try:
+        actions = requested_actions(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    response = StreamingHttpResponse(csv_lines(actions), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="inventory_actions.csv"'
+    return response
+
+
+def plan_variety_list(plant_day):
+    """Return the (variety, alphanumeric name) pairs the seeding and planning forms list, from the cached plan for
+    plant_day so that every variety has a WeekdayRequirement."""
+    return [({'id': variety_id, 'name': name}, alphanumeric_name(name))
+            for variety_id, name, quantity in weekday_plan(plant_day)]
+
+
 # One-time function to make all LiveCropInventories from LiveCropProducts
 def make_live_crop_inventory():
     for lcp in LiveCropProduct.objects.all():
@@ -202,37 +253,25 @@ def getChartColors(start_color, end_color, n):
 def inventory_seed(request):
     if request.method == 'GET':
         day = date.today()
-        variety_list = []
-        for v in Variety.objects.all():
-            if len(WeekdayRequirement.objects.filter(plant_day=day.weekday()).filter(variety=v)) == 0:
-                WeekdayRequirement.objects.create(variety=v, plant_day=day.weekday(), quantity=0)
-            variety_name_no_spaces = v.name.replace(" ", "-").replace(":", "").replace(",", "")
-            variety_list.append((v, variety_name_no_spaces))
+        variety_list = plan_variety_list(day.weekday())
         return render(request, 'inventory/inventory_seed.html', context={'variety_list': variety_list, 'day': day.isoformat()})
     
     if request.method == 'POST':
         try:
             # Try to get the date from the form
-            seed_date = parser.parse(request.POST.get('day'))
+            seed_date = parser.parse(request.POST.get('day')).date()
         except TypeError:
-            seed_date = datetime.today()
+            seed_date = date.today()
             pass
+        quantities = {}
         for v in Variety.objects.all():
             try:
                 quantity = request.POST['form-plan-' + v.name.replace(" ", "-").replace(":", "").replace(",", "") + '-quantity']
-                quantity = 0 if len(quantity) == 0 else int(quantity)
-                if quantity:
-                    try:
-                        in_house = CropGroup.objects.get(variety=v, seed_date=seed_date)
-                    except CropGroup.DoesNotExist:
-                        in_house = CropGroup.objects.create(variety=v, seed_date=seed_date)
-                    in_house.quantity += quantity
-                    in_house.save()
-                    # data = json.dumps({'quantity': quantity})
-                    var_obj = Variety.objects.get(name=v)
-                    InventoryAction.objects.create(variety=var_obj, date=seed_date, action_type='SEED', quantity=quantity)
+                quantities[v] = 0 if len(quantity) == 0 else int(quantity)
             except KeyError:
                 pass # In case there's a variety inconsistency
+        # Commit the whole seeding sheet in one transaction
+        record_seeding(seed_date, quantities)
         
         # Redirect the user to the inventory overview page
         return redirect(inventory_overview)
@@ -258,18 +297,12 @@ def inventory_kill(request):
             if len(quantity) != 0 and int(quantity) > 0:
                 quantity = int(quantity)
                 try:
-                    in_house = CropGroup.objects.get(variety=var_obj, seed_date=date_seeded)
-                    if quantity <= in_house.quantity:
-                        in_house.quantity = in_house.quantity - quantity
-                        in_house.save()
-                        inventory_action = InventoryAction.objects.create(variety=var_obj, action_type='KILL',
-                                                                          date=day, quantity=quantity)
-                        for kill_reason in reasons:
-                            inventory_action.kill_reasons.add(kill_reason)
-                        inventory_action.save()
-                    else:
-                        message = "There are only " + str(in_house.quantity) + " " + variety + "s for " \
-                                  + date_seeded \
+                    # A blank seed date takes the oldest trays first
+                    record_removal(var_obj, date_seeded or None, quantity, 'KILL', day, kill_reasons=reasons)
+                except NotEnoughTrays as e:
+                    if e.available is not None:
+                        message = "There are only " + str(e.available) + " " + variety + "s" \
+                                  + (" for " + date_seeded if date_seeded else "") \
                                   + " in your database and you were trying to harvest " + str(quantity) \
                                   + ". Check your "
                         return render(request, 'inventory/inventory_kill.html',
@@ -278,7 +311,6 @@ def inventory_kill(request):
                                                'date_seeded': date_seeded, 'quantity': quantity,
                                                'selected_variety': variety,
                                                'selected_reasons': reasons, 'error': message})
-                except CropGroup.DoesNotExist:
                     message = "The crop(s) you were trying to kill don't exist in your database. Check your "
                     return render(request, 'inventory/inventory_kill.html', context={'variety_list': Variety.objects.all().order_by('name'),
                                                                                      'reason_list': KillReason.objects.all(),
@@ -318,28 +350,19 @@ def inventory_plan(request, plant_day=None):
         (6, 'Sunday'),
     )
     if request.method == 'GET':
-        variety_list = []
-        for v in Variety.objects.all():
-            if len(WeekdayRequirement.objects.filter(plant_day=plant_day).filter(variety=v)) == 0:
-                WeekdayRequirement.objects.create(variety=v, plant_day=plant_day, quantity=0)
-            variety_name_no_spaces = v.name.replace(" ", "-").replace(":", "").replace(",", "")
-            variety_list.append((v, variety_name_no_spaces))
+        variety_list = plan_variety_list(plant_day)
         return render(request, 'inventory/inventory_recurring.html', context={'day': plant_day, 'weekdays': DAYS_OF_WEEK, 'variety_list': variety_list})
     
     if request.method == 'POST':
-        print(str(request.POST))
-        variety_list = []
-        for v in Variety.objects.all():
+        day = int(request.POST.get('day', plant_day))
+        quantities = {}
+        for variety_id, name, quantity in weekday_plan(day):
             try:
-                day = int(request.POST['day'])
-                quantity = int(request.POST['form-plan-' + v.name.replace(" ", "-").replace(":","").replace(",", "") + '-quantity'])
-                plan = WeekdayRequirement.objects.get(variety=v, plant_day=day)
-                plan.quantity = quantity
-                plan.save()
-                variety_name_no_spaces = v.name.replace(" ", "-").replace(":", "").replace(",", "")
-                variety_list.append((v, variety_name_no_spaces))
+                quantities[variety_id] = int(request.POST['form-plan-' + alphanumeric_name(name) + '-quantity'])
             except KeyError:
                 pass # In case there's a variety inconsistency
+        save_plan(day, quantities)
+        variety_list = plan_variety_list(day)
         # Redirect the user to the weekly planning page
         return render(request, 'inventory/inventory_recurring.html', context={'day': day, 'weekdays': DAYS_OF_WEEK, 'variety_list': variety_list})
 
@@ -354,52 +377,56 @@ def inventory_harvest_bulk(request): # numbers of trays for multiple varieties
         return render(request, 'inventory/inventory_harvest_bulk.html', context={'variety_list': variety_list, 'date':today})
     
     if request.method == 'POST':
-        # Save the current state of the form in case of error later on
+        h_date = request.POST.get('form-harvest-date', today)
+        # Check every line of the form before anything is harvested
         variety_list = []
+        lines = []
+        line_rows = []
+        errors = []
         for v in Variety.objects.all().order_by('name'):
             try:
                 quantity = request.POST['form-harvest-' + v.name + '-quantity']
                 seed_date = request.POST['form-harvest-' + v.name + '-seed-date']
-                variety_list.append({'name': v.name, 'quantity': quantity, 'date': seed_date})
             except KeyError:
-                pass  # In case there's a variety inconsistency
-
-        for v in Variety.objects.all().order_by('name'):
+                continue # In case there's a variety inconsistency
+            row = {'name': v.name, 'quantity': quantity, 'date': seed_date, 'error': None}
+            variety_list.append(row)
             try:
-                h_date = request.POST['form-harvest-date']
-                quantity = request.POST['form-harvest-' + v.name + '-quantity']
-                seed_date = request.POST['form-harvest-' + v.name + '-seed-date']
-                # If a harvest quantity was given and its not zero
-                if len(quantity) != 0 and int(quantity) > 0 and len(seed_date) != 0:
-                    quantity = int(quantity)
+                quantity = 0 if len(quantity) == 0 else int(quantity)
+            except ValueError:
+                row['error'] = "Please enter a whole number of " + v.name + " trays."
+            if row['error'] is None and quantity > 0:
+                # If seed_date was not given, take the oldest trays first
+                if len(seed_date) == 0:
+                    lines.append((v.id, None, quantity))
+                    line_rows.append(row)
+                else:
                     try:
-                        # Update the CropGroup size
-                        in_house = CropGroup.objects.get(variety=v, seed_date=seed_date)
-                        if quantity <= in_house.quantity:
-                            in_house.quantity = in_house.quantity - quantity if quantity <= in_house.quantity else 0
-                            in_house.save()
-                            # Create InventoryAction, only if quantity != 0
-                            InventoryAction.objects.create(variety=v, date=h_date, action_type='HARVEST', quantity=quantity)
-                        else:
-                            message = "There are only " + str(in_house.quantity) + " " + v.name + "s for " + seed_date \
-                                      + " in your database and you were trying to harvest " + str(quantity) \
-                                      + ". Check your "
-                            return render(request, 'inventory/inventory_harvest_bulk.html',
-                                          context={'variety_list': variety_list, 'date': h_date,
-                                                   'error': message})
-                    except CropGroup.DoesNotExist:
-                        message = "The crop(s) you were trying to harvest don't exist in your database. Check your "
-                        return render(request, 'inventory/inventory_harvest_bulk.html',
-                                      context={'variety_list': variety_list, 'date': h_date, 'error': message})
-
-                # If seed_date was not given, throw error
-                elif len(quantity) != 0 and int(quantity) > 0 and len(seed_date) == 0:
-                    message = "A seed date must be provided for " + v.name + ". Check your "
-                    return render(request, 'inventory/inventory_harvest_bulk.html',
-                                  context={'variety_list': variety_list, 'date': h_date, 'error': message})
-            except KeyError:
-                pass # In case there's a variety inconsistency
-        
+                        lines.append((v.id, parser.parse(seed_date).date(), quantity))
+                        line_rows.append(row)
+                    except ValueError:
+                        row['error'] = seed_date + " is not a valid seed date for " + v.name + "."
+            if row['error'] is not None:
+                errors.append(row['error'])
+
+        if not errors:
+            try:
+                record_removals(lines, 'HARVEST', h_date)
+            except BatchRejected as e:
+                for i, available in sorted(e.shortfalls.items()):
+                    row = line_rows[i]
+                    if available is None:
+                        row['error'] = "The " + row['name'] + " you were trying to harvest don't exist in your database."
+                    else:
+                        row['error'] = "There are only " + str(available) + " " + row['name'] + "s" \
+                                       + (" for " + row['date'] if row['date'] else "") + " in your database and you were trying to harvest " + str(lines[i][2]) + "."
+                    errors.append(row['error'])
+
+        if errors:
+            # Nothing was harvested, show every problem at once
+            return render(request, 'inventory/inventory_harvest_bulk.html',
+                          context={'variety_list': variety_list, 'date': h_date, 'errors': errors})
+
         # Redirect the user to the inventory overview page
         return redirect(inventory_overview)
 
@@ -422,20 +449,16 @@ def inventory_harvest_variety(request): # Numbers of trays and yield for a singl
             if len(quantity) != 0 and int(quantity) > 0:
                 quantity = int(quantity)
                 try:
-                    in_house = CropGroup.objects.get(variety=var_obj, seed_date=seed_date)
-                    if quantity <= in_house.quantity:
-                        in_house.quantity = in_house.quantity - quantity
-                        in_house.save()
-                        if quantity:
-                            InventoryAction.objects.create(variety=var_obj, action_type='HARVEST', quantity=quantity, date=h_date, harvest_yield=h_yield)
-                    else:
-                        message = "There are only " + str(in_house.quantity) + " " + variety + "s for " + seed_date \
-                                  + " in your database and you were trying to harvest " + str(quantity) + ". Check your "
+                    # A blank seed date takes the oldest trays first
+                    record_removal(var_obj, seed_date or None, quantity, 'HARVEST', h_date, harvest_yield=h_yield)
+                except NotEnoughTrays as e:
+                    if e.available is not None:
+                        message = "There are only " + str(e.available) + " " + variety + "s" \
+                                  + (" for " + seed_date if seed_date else "") + " in your database and you were trying to harvest " + str(quantity) + ". Check your "
                         return render(request, 'inventory/inventory_harvest_variety.html',
                                       context={'variety_list': Variety.objects.all().order_by('name'), 'date': h_date,
                                                'seed_date': seed_date, 'yield': h_yield, 'quantity': quantity,
                                                'selected_variety': variety, 'error': message})
-                except CropGroup.DoesNotExist:
                     message = "The crop(s) you were trying to harvest don't exist in your database. Check your "
                     return render(request, 'inventory/inventory_harvest_variety.html',
                                   context={'variety_list': Variety.objects.all().order_by('name'), 'date': h_date,
@@ -468,11 +491,10 @@ def inventory_harvest_single(request): # One tray, with detailed records
             h_yield = request.POST['form-harvest-yield']
             h_yield = 0 if len(h_yield) == 0 else float(h_yield)
             var_obj = Variety.objects.get(name=variety)
-            in_house = CropGroup.objects.get(variety=var_obj, seed_date=seed_date)
-            in_house.quantity = in_house.quantity - 1 if 1 <= in_house.quantity else 0
-            in_house.save()
-            # data = json.dumps({'quantity': 1, 'yield': h_yield})
-            InventoryAction.objects.create(variety=var_obj, action_type='HARVEST', quantity=1, date=h_date, harvest_yield=h_yield)
+            try:
+                record_removal(var_obj, seed_date or None, 1, 'HARVEST', h_date, harvest_yield=h_yield)
+            except NotEnoughTrays:
+                pass # Only record the harvest if there is a tray left to take out of the crop group
         except KeyError as e:
             print (e)
             pass # In case there's a variety inconsistency
@@ -488,15 +510,8 @@ def weekday_autofill(request):
     if day not in ["0", "1", "2", "3", "4", "5", "6"]:
         day = parser.parse(day).weekday()
     data = {}
-    for v in Variety.objects.all():
-        if len(WeekdayRequirement.objects.filter(plant_day=day).filter(variety=v)) == 0:
-            WeekdayRequirement.objects.create(variety=v, plant_day=day, quantity=0)
-        try:
-            plan = WeekdayRequirement.objects.get(variety=v, plant_day=day)
-            data[v.name + '-quantity'] = plan.quantity
-        except Exception as e:
-            print (e)
-            pass
+    for variety_id, name, quantity in weekday_plan(day):
+        data[name + '-quantity'] = quantity
     return JsonResponse(data)
 
 
@@ -0,0 +1,101 @@
+"""Back-scheduling of seedings from the open orders.
+
+Open orders (those delivering today or later) are totalled by variety and delivery date in one grouped query,
+whatever their number. Each delivery is met first from the trays in house that will be ready by then, and the rest
+is seeded lead_time days before the delivery. The result is a per-day seeding plan the seeding sheet can prefill.
+
+A live crop product needs one tray. A harvested crop product needs its weight divided by the variety's average
+harvest yield per tray (harvest yields are assumed to be recorded in the unit of HarvestedCropProduct.weight), or
+one tray if the variety has never been harvested with a yield.
+"""
+from datetime import date, timedelta
+from math import ceil
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from inventory.models import InHouseGroup, InventoryAction, Variety
+from orders.models import Order
+
+
+def open_order_totals(today):
+    """Return the open orders totalled by variety and delivery date as .values() rows with the number of live crop
+    orders ('live'), the number of harvested crop orders ('harvested') and their total weight ('weight')."""
+    return (Order.objects.filter(delivery_date__gte=today)
+            .values(variety_id=Coalesce('product__livecropproduct__variety', 'product__harvestedcropproduct__variety'))
+            .filter(variety_id__isnull=False)
+            .values('variety_id', 'delivery_date')
+            .annotate(live=Count('id', filter=Q(product__livecropproduct__isnull=False)),
+                      harvested=Count('id', filter=Q(product__harvestedcropproduct__isnull=False)),
+                      weight=Sum('product__harvestedcropproduct__weight'))
+            .order_by('variety_id', 'delivery_date'))
+
+
+def yields_per_tray():
+    """Return each variety's average harvest yield per tray, {variety_id: yield}, from its HARVEST actions."""
+    rows = (InventoryAction.objects.filter(action_type='HARVEST', harvest_yield__gt=0, quantity__gt=0)
+            .values('variety_id').annotate(total_yield=Sum('harvest_yield'), trays=Sum('quantity')))
+    return {row['variety_id']: row['total_yield'] / row['trays'] for row in rows}
+
+
+def trays_needed(row, yield_per_tray):
+    """Return the number of trays an open_order_totals() row needs."""
+    if not row['harvested']:
+        return row['live']
+    if yield_per_tray is None:
+        return row['live'] + row['harvested']
+    return row['live'] + ceil(row['weight'] / yield_per_tray)
+
+
+def back_schedule(demand, ready, lead_time, today):
+    """Schedule one variety. demand is a list of (delivery_date, trays) and ready a list of (ready_date, trays) for
+    the trays in house, both sorted by date. Returns (seedings, late) where seedings is a list of (seed_date, trays)
+    and late is the number of those trays that are seeded today but still won't be ready by their delivery."""
+    seedings = {}
+    late = 0
+    available = 0
+    next_ready = 0
+    for delivery_date, trays in demand:
+        # Trays in house that are ready by this delivery can be used for it
+        while next_ready < len(ready) and ready[next_ready][0] <= delivery_date:
+            available += ready[next_ready][1]
+            next_ready += 1
+        used = min(available, trays)
+        available -= used
+        trays -= used
+        if trays:
+            seed_date = delivery_date - timedelta(days=lead_time)
+            if seed_date < today:
+                seed_date = today
+                late += trays
+            seedings[seed_date] = seedings.get(seed_date, 0) + trays
+    return sorted(seedings.items()), late
+
+
+def seeding_schedule(today=None):
+    """Back-schedule every open order with a constant number of queries. Returns (schedule, late) where schedule maps
+    each seed date to {variety_id: trays} and late maps variety ids to the trays that can't be ready in time even if
+    seeded today. Varieties without a lead time can't be scheduled and are left out."""
+    today = today or date.today()
+    lead_times = dict(Variety.objects.filter(lead_time__isnull=False).values_list('id', 'lead_time'))
+    yields = yields_per_tray()
+
+    demand = {}
+    for row in open_order_totals(today):
+        if row['variety_id'] in lead_times:
+            trays = trays_needed(row, yields.get(row['variety_id']))
+            demand.setdefault(row['variety_id'], []).append((row['delivery_date'], trays))
+
+    ready = {}
+    in_house = (InHouseGroup.objects.filter(variety_id__in=demand)
+                .values_list('variety_id', 'seed_date', 'quantity').order_by('seed_date'))
+    for variety_id, seed_date, quantity in in_house:
+        ready.setdefault(variety_id, []).append((seed_date + timedelta(days=lead_times[variety_id]), quantity))
+
+    schedule = {}
+    late = {}
+    for variety_id, deliveries in demand.items():
+        seedings, late_trays = back_schedule(deliveries, ready.get(variety_id, []), lead_times[variety_id], today)
+        for seed_date, trays in seedings:
+            schedule.setdefault(seed_date, {})[variety_id] = trays
+        if late_trays:
+            late[variety_id] = late_trays
+    return schedule, late
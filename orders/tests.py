@@ -1,3 +1,58 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from django.contrib.auth.models import User
+from django.test import Client, TestCase
+from inventory.ledger import record_removal, record_seed
+from inventory.models import Variety
+from orders.models import Account, HarvestedCropProduct, LiveCropProduct, MicrogreenSize, Order, TrayType
+from orders.scheduling import seeding_schedule
 
-# Create your tests here.
+
+class SeedingScheduleTest(TestCase):
+    """Unit test back-scheduling seedings from the open orders."""
+
+    def setUp(self):
+        self.today = date(2019, 10, 14)
+        self.basil = Variety.objects.create(name="Basil", lead_time=10)
+        self.radish = Variety.objects.create(name="Radish", lead_time=3)
+        size = MicrogreenSize.objects.create(name="Large")
+        self.tray = LiveCropProduct.objects.create(name="Basil tray", price=20, variety=self.basil, size=size,
+                                                   tray_type=TrayType.objects.create(name="10 inch"))
+        self.clamshell = HarvestedCropProduct.objects.create(name="Radish clamshell", price=5, variety=self.radish,
+                                                             size=size, weight=3)
+        self.account = Account.objects.create(name="Restaurant", active=True)
+
+    def order(self, product, delivery_date, count=1):
+        for _ in range(count):
+            Order.objects.create(product=product, account=self.account, delivery_date=delivery_date)
+
+    def test_orders_are_back_scheduled_by_lead_time(self):
+        self.order(self.tray, date(2019, 10, 30), 3)
+        self.order(self.tray, date(2019, 10, 1))  # Already delivered
+        schedule, late = seeding_schedule(self.today)
+        self.assertEqual(schedule, {date(2019, 10, 20): {self.basil.id: 3}})
+        self.assertEqual(late, {})
+
+    def test_trays_in_house_are_used_first(self):
+        record_seed(self.basil, date(2019, 10, 10), 2)  # Ready 2019-10-20
+        self.order(self.tray, date(2019, 10, 18), 2)  # Too soon for them
+        self.order(self.tray, date(2019, 10, 25), 3)
+        schedule, late = seeding_schedule(self.today)
+        self.assertEqual(schedule, {self.today: {self.basil.id: 2}, date(2019, 10, 15): {self.basil.id: 1}})
+        self.assertEqual(late, {self.basil.id: 2})
+
+    def test_harvested_products_use_yield_per_tray(self):
+        record_seed(self.radish, date(2019, 10, 1), 2)
+        record_removal(self.radish, date(2019, 10, 1), 2, 'HARVEST', date(2019, 10, 4), harvest_yield=16)
+        self.order(self.clamshell, date(2019, 10, 20), 5)  # 15 oz at 8 oz per tray
+        with self.assertNumQueries(4):
+            schedule, late = seeding_schedule(self.today)
+        self.assertEqual(schedule, {date(2019, 10, 17): {self.radish.id: 2}})
+
+    def test_autofill(self):
+        User.objects.create_user(username="grower", password="password")
+        client = Client()
+        client.login(username="grower", password="password")
+        day = date.today() + timedelta(days=2)
+        self.order(self.clamshell, day + timedelta(days=3))
+        response = client.get("/orders/seeding_schedule/autofill", data={'day': day.isoformat()})
+        self.assertEqual(response.json(), {'Basil-quantity': 0, 'Radish-quantity': 1})
@@ -0,0 +1,7 @@
+from django.urls import path
+from orders import views
+
+urlpatterns = [
+    path('orders/seeding_schedule', views.order_seeding_schedule, name="order_seeding_schedule"),
+    path('orders/seeding_schedule/autofill', views.order_seeding_autofill, name="order_seeding_autofill"),
+]
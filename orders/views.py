@@ -1,3 +1,38 @@
-from django.shortcuts import render
+from datetime import date
+from dateutil import parser
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponseBadRequest, JsonResponse
+from inventory.models import Variety
+from orders.scheduling import seeding_schedule
 
-# Create your views here.
+
+def requested_day(request):
+    """Return the date given by the 'day' GET parameter, or today. Raises ValueError if it isn't a date."""
+    day = request.GET.get('day')
+    return parser.parse(day).date() if day else date.today()
+
+
+@login_required
+def order_seeding_schedule(request):
+    """GET: Return the seedings needed to meet the open orders, back-scheduled from their delivery dates, as JSON."""
+    schedule, late = seeding_schedule()
+    names = dict(Variety.objects.values_list('id', 'name'))
+    return JsonResponse({'schedule': {seed_date.isoformat(): {names[variety_id]: trays
+                                                              for variety_id, trays in seedings.items()}
+                                      for seed_date, seedings in sorted(schedule.items())},
+                         'late': {names[variety_id]: trays for variety_id, trays in late.items()}})
+
+
+@login_required
+def order_seeding_autofill(request):
+    """GET: Return the trays of each variety to seed on the 'day' parameter to meet the open orders, keyed like
+    weekday_autofill so the seeding sheet can be prefilled from it."""
+    try:
+        day = requested_day(request)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid date: " + request.GET['day'])
+    schedule, late = seeding_schedule()
+    data = {}
+    for variety_id, name in Variety.objects.values_list('id', 'name'):
+        data[name + '-quantity'] = schedule.get(day, {}).get(variety_id, 0)
+    return JsonResponse(data)
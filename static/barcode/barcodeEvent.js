@@ -100,3 +100,81 @@ function barcodeDetectionIsActive() {
     return inputStartTime !== null;
 }
 
+
+/*
+ * Offline scan queue. Scan actions are kept in localStorage until the server has answered for them, so a tablet that
+ * loses Wi-Fi can keep working and send everything in one request once it's back. Every scan gets a unique key, so
+ * the server applies it once however many times it is sent.
+ */
+const scanQueueKey = "queuedScans";
+const scanIngestUrl = "/scan/ingest";
+const scanIngestLimit = 1000;  // Most events the server takes in one request
+var scanQueueFlushing = false;
+
+function queuedScans() {
+    return JSON.parse(localStorage.getItem(scanQueueKey) || "[]");
+}
+
+function newScanKey() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return Date.now().toString(36) + "-" + Math.random().toString(36).slice(2) + Math.random().toString(36).slice(2);
+}
+
+/**
+ * Add a scan action (WATER, TRASH or HARVEST on the crop in the slot labelled barcode) to the queue and try to send it.
+ */
+function queueScan(barcode, action, reason) {
+    let scans = queuedScans();
+    scans.push({key: newScanKey(), barcode: barcode, action: action, reason: reason || "",
+                scanned_at: new Date().toISOString()});
+    localStorage.setItem(scanQueueKey, JSON.stringify(scans));
+    return flushScanQueue();
+}
+
+function csrfToken() {
+    let match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+    return match ? decodeURIComponent(match[1]) : "";
+}
+
+/**
+ * Send every queued scan in one request and drop the ones the server answered for. Resolves to the server's results,
+ * or to null if the tablet is offline or the request failed, in which case the scans stay queued.
+ */
+function flushScanQueue() {
+    let scans = queuedScans().slice(0, scanIngestLimit);
+    if (scanQueueFlushing || scans.length === 0 || !navigator.onLine) {
+        return Promise.resolve(null);
+    }
+    scanQueueFlushing = true;
+    return fetch(scanIngestUrl, {
+        method: "POST",
+        credentials: "same-origin",
+        headers: {"Content-Type": "application/json", "X-CSRFToken": csrfToken()},
+        body: JSON.stringify({events: scans})
+    }).then(function (response) {
+        if (!response.ok) {
+            throw new Error("Scan ingest failed with status " + response.status);
+        }
+        return response.json();
+    }).then(function (data) {
+        let answered = new Set(data.results.map(function (result) { return result.key; }));
+        // Scans queued while the request was in flight are kept
+        let remaining = queuedScans().filter(function (scan) { return !answered.has(scan.key); });
+        localStorage.setItem(scanQueueKey, JSON.stringify(remaining));
+        if (remaining.length > 0) {
+            setTimeout(flushScanQueue, 0);
+        }
+        document.dispatchEvent(new CustomEvent("scans-flushed", {detail: data.results}));
+        return data.results;
+    }).catch(function (error) {
+        console.log("Queued scans will be sent later:", error);
+        return null;
+    }).finally(function () {
+        scanQueueFlushing = false;
+    });
+}
+
+window.addEventListener("online", flushScanQueue);
+flushScanQueue();
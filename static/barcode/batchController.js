@@ -0,0 +1,50 @@
+/**
+ * Controller for batch mode: every scan is added to the list of trays instead of opening the slot page.
+ */
+
+const batchBarcodes = document.getElementById("form-batch-barcodes");
+const batchCount = document.getElementById("batch-count");
+
+function scannedBarcodes() {
+    // Drops what the scanner typed into the list itself while it had focus
+    return batchBarcodes.value.split(/\s+/).filter(function (barcode) {
+        return barcode !== "" && !barcode.includes(scannerPrefix);
+    });
+}
+
+function updateBatchCount() {
+    batchCount.textContent = new Set(scannedBarcodes()).size;
+}
+
+document.addEventListener("barcode-scanned", function (e) {
+    if (!scannedBarcodes().includes(e.detail)) {
+        batchBarcodes.value = scannedBarcodes().concat([e.detail]).join("\n") + "\n";
+    }
+    updateBatchCount();
+});
+
+batchBarcodes.addEventListener("input", updateBatchCount);
+updateBatchCount();
+
+// Without Wi-Fi the batch is queued on the tablet and sent when it's back online
+document.getElementById("form-batch").addEventListener("submit", function (e) {
+    if (navigator.onLine) {
+        return;
+    }
+    e.preventDefault();
+    let action = document.getElementById("form-batch-action").value;
+    let reason = document.getElementById("form-batch-reason").value;
+    scannedBarcodes().forEach(function (barcode) {
+        queueScan(barcode, action, reason);
+    });
+    batchBarcodes.value = "";
+    updateBatchCount();
+    updateQueuedCount();
+});
+
+function updateQueuedCount() {
+    document.getElementById("batch-queued").textContent = queuedScans().length;
+}
+
+document.addEventListener("scans-flushed", updateQueuedCount);
+updateQueuedCount();
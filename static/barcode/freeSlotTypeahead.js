@@ -0,0 +1,20 @@
+/**
+ * Suggest empty slots whose barcode starts with what has been typed into the slot barcode input
+ */
+$(function () {
+    var input = $("#form-new-crop-barcode-input");
+    var datalist = $("#free-slots");
+    input.on("input", function () {
+        var prefix = input.val();
+        if (prefix.length < 2) {
+            return;
+        }
+        $.getJSON(input.attr("data-free-slot-url"), {q: prefix}, function (data) {
+            datalist.empty();
+            data.slots.forEach(function (slot) {
+                datalist.append($("<option>").val(slot.barcode)
+                    .text("Rack " + slot.rack + ", row " + slot.row + ", position " + slot.position));
+            });
+        });
+    });
+});
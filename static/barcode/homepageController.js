@@ -4,5 +4,5 @@
 
 document.addEventListener("barcode-scanned", function (e) {
     let barcode_text = e.detail;
-    window.location.href = "/barcode/" + barcode_text + "/"
+    window.location.href = "/scan/" + encodeURIComponent(barcode_text) + "/"
 });
\ No newline at end of file
@@ -11,7 +11,7 @@ const buttonToInputMapping = {
 document.addEventListener("barcode-scanned", function (e) {
     let barcode_text = e.detail;
     if (inputReceivingBarcodeScan === null) {
-        window.location.href = "/barcode/" + barcode_text + "/"
+        window.location.href = "/scan/" + encodeURIComponent(barcode_text) + "/"
     } else {
         let targetInput = document.getElementById(inputReceivingBarcodeScan);
         targetInput.value = e.detail;
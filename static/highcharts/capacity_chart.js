@@ -0,0 +1,45 @@
+/**
+ * Chart the slots the trays in house and the weekly plan will occupy each day against the number of slots
+ * @param url the rack_capacity JSON endpoint
+ */
+function loadCapacityChart(url) {
+    $.getJSON(url, function (data) {
+        Highcharts.chart('capacity-chart-container', {
+            chart: {
+                type: 'area'
+            },
+            title: {
+                text: 'Rack Capacity'
+            },
+            subtitle: {
+                text: data.over.length ? 'Over capacity on ' + data.over.length + ' days, first on ' + data.over[0] : ''
+            },
+            xAxis: {
+                categories: data.dates
+            },
+            yAxis: {
+                min: 0,
+                title: {
+                    text: 'Occupied Slots'
+                },
+                plotLines: [{
+                    value: data.capacity,
+                    color: '#f43a02',
+                    width: 2,
+                    label: {
+                        text: 'Capacity: ' + data.capacity
+                    }
+                }]
+            },
+            legend: {
+                enabled: false
+            },
+            series: [{
+                name: 'Occupied Slots',
+                data: data.occupied,
+                // Days over capacity are drawn red
+                zones: [{value: data.capacity + 1, color: '#70ef94'}, {color: '#f43a02'}]
+            }]
+        });
+    });
+}